@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark: catch guesses per second against an active drop
+
+Compares the previous per-message difflib.SequenceMatcher check with
+CatchMatcher on a mix of ordinary chat lines and near-miss name guesses.
+
+Usage: python benchmarks/bench_catch_matcher.py [guesses]
+"""
+
+import difflib
+import os
+import random
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+from matcher import CatchMatcher  # noqa: E402
+
+NAMES = [
+    "Zero Two", "Nezuko Kamado", "Mikasa Ackerman", "Marin Kitagawa", "Rem",
+    "Levi Ackerman", "Satoru Gojo", "Izuku Midoriya", "Ichigo Kurosaki", "Momo Yaoyorozu",
+]
+
+CHAT = [
+    "lol", "did anyone watch the new episode yesterday?", "gm everyone",
+    "who is this", "no way", "that art style looks like mappa", "brb",
+    "I think it's from attack on titan", "can someone explain the rarity system",
+    "hahaha", "ok", "this bot is addictive", "wait what series is that",
+]
+
+
+def typo(name, rng):
+    """Introduce one or two random edits into a name"""
+    chars = list(name.lower())
+    for _ in range(rng.randint(1, 2)):
+        i = rng.randrange(len(chars))
+        op = rng.choice(('swap', 'drop', 'replace'))
+        if op == 'drop' and len(chars) > 3:
+            del chars[i]
+        elif op == 'replace':
+            chars[i] = rng.choice('abcdefghijklmnopqrstuvwxyz')
+        elif i + 1 < len(chars):
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    return ''.join(chars)
+
+
+def make_guesses(count, rng):
+    guesses = []
+    for _ in range(count):
+        name = rng.choice(NAMES)
+        if rng.random() < 0.8:
+            guesses.append((name, rng.choice(CHAT)))
+        else:
+            guesses.append((name, typo(name, rng)))
+    return guesses
+
+
+def bench(label, guesses, check):
+    start = time.perf_counter()
+    hits = sum(1 for name, guess in guesses if check(name, guess))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<14} {len(guesses) / elapsed:>12,.0f} guesses/sec  ({hits} matches)")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rng = random.Random(3)
+    guesses = make_guesses(count, rng)
+
+    def difflib_check(name, guess):
+        return difflib.SequenceMatcher(None, name.lower(), guess.lower()).ratio() >= 0.7
+
+    # One matcher per drop, as the drop registry does
+    matchers = {name: CatchMatcher(name) for name in NAMES}
+
+    def matcher_check(name, guess):
+        return matchers[name].matches(guess)
+
+    bench("difflib", guesses, difflib_check)
+    bench("CatchMatcher", guesses, matcher_check)
+
+
+if __name__ == '__main__':
+    main()
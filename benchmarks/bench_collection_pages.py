@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: paging through a large collection with and without the page cache
+
+Builds a collection of 2,000 characters and pages forward and back through
+it the way the Next/Previous buttons do, first with the rendered-page cache
+cleared before every view and then with it warm. Afterwards it claims one
+more character and checks that the first page is re-rendered with it.
+
+Usage: python benchmarks/bench_collection_pages.py [characters] [passes]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+# Isolate the database before the bot modules create the global instance
+WORK_DIR = tempfile.mkdtemp(prefix='waifu_bench_')
+os.chdir(WORK_DIR)
+os.environ['DATABASE_PATH'] = os.path.join(WORK_DIR, 'bench.db')
+
+from database import db  # noqa: E402
+import main as bot  # noqa: E402
+
+USER_ID = 4242
+PAGES = 40
+
+
+def cursor_of(keyboard, direction):
+    """(page, after, before) from the Next ('n') or Previous ('p') button"""
+    for button in keyboard.inline_keyboard[0]:
+        parts = button.callback_data.split('_')
+        if parts[0] == 'collection' and parts[3] == direction:
+            cursor = bot.decode_collection_cursor(parts[4], parts[5])
+            return int(parts[2]), (cursor if direction == 'n' else None), (cursor if direction == 'p' else None)
+    return None
+
+
+async def page_through(clear_cache):
+    """Go PAGES pages forward and back again; returns page views"""
+    views = 0
+    page, after, before = 0, None, None
+    for direction in ('n', 'p'):
+        for _ in range(PAGES):
+            if clear_cache:
+                bot.collection_page_cache.clear()
+            text, keyboard, _ = await bot.build_collection_page(USER_ID, "Bench", page, after, before)
+            views += 1
+            step = cursor_of(keyboard, direction)
+            if step is None:
+                break
+            page, after, before = step
+    return views
+
+
+async def run(passes):
+    results = {}
+    for name, clear_cache in (('uncached', True), ('cached', False)):
+        bot.collection_page_cache.clear()
+        start = time.perf_counter()
+        views = 0
+        for _ in range(passes):
+            views += await page_through(clear_cache)
+        results[name] = (views, time.perf_counter() - start)
+
+    # A claim must show up on the next view of the first page
+    before_claim, _, _ = await bot.build_collection_page(USER_ID, "Bench")
+    new_id = db.add_character("Freshly Caught", "Bench Series", None, "waifu", 0)
+    db.claim_character(USER_ID, new_id, -1)
+    after_claim, _, _ = await bot.build_collection_page(USER_ID, "Bench")
+    fresh = "Freshly Caught" in after_claim and "Freshly Caught" not in before_claim
+    return results, fresh
+
+
+def main():
+    characters = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    passes = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    for i in range(characters):
+        character_id = db.add_character(f"Bench Character {i}", "Bench Series", None, "waifu", 0,
+                                        bot.VALID_RARITIES[i % len(bot.VALID_RARITIES)])
+        db.claim_character(USER_ID, character_id, -1)
+
+    results, fresh = asyncio.run(run(passes))
+    print(f"collection: {characters} characters, {passes} passes of {PAGES} pages forward and back")
+    for name, (views, elapsed) in results.items():
+        print(f"{name:<9} {views / elapsed:>10,.0f} page views/sec  ({elapsed * 1000 / views:.3f} ms/view)")
+    print(f"cache: {bot.collection_page_cache.hits} hits, {bot.collection_page_cache.misses} misses")
+    db.close()
+    if not fresh:
+        print("FAIL: claimed character missing from the re-rendered first page")
+        sys.exit(1)
+    print("claim invalidated the cached pages")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Benchmark: update throughput over many groups, sequential vs per-chat concurrent
+
+Feeds interleaved messages from 1,000 simulated groups through
+handle_group_message the way the Application does: one at a time
+(the old default) or as one task per update through
+PerChatUpdateProcessor. The fake bot sleeps on every send to stand in
+for Telegram's round trip. Drops are announced through the outbound
+queue, so that round trip no longer stalls handlers in either mode and
+the gap between the modes comes from overlapping database calls. The
+concurrent run also checks that every group's updates ran one at a time
+and in arrival order.
+
+Usage: python benchmarks/bench_concurrent_updates.py [groups] [messages_per_group] [send_latency_ms]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+# Isolate the database before the bot modules create the global instance
+WORK_DIR = tempfile.mkdtemp(prefix='waifu_bench_')
+os.chdir(WORK_DIR)
+os.environ['DATABASE_PATH'] = os.path.join(WORK_DIR, 'bench.db')
+
+from telegram.constants import ChatType  # noqa: E402
+from database import db  # noqa: E402
+from update_processor import PerChatUpdateProcessor  # noqa: E402
+from config import MAX_CONCURRENT_UPDATES  # noqa: E402
+import main as bot  # noqa: E402
+
+
+class FakeBot:
+    """Stands in for telegram.Bot; every send costs one simulated round trip"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.sent = 0
+
+    async def send_photo(self, chat_id, photo, caption=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+        return SimpleNamespace(message_id=self.sent, photo=[])
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+        return SimpleNamespace(message_id=self.sent)
+
+
+async def _reply_text(*args, **kwargs):
+    return None
+
+
+# Drop announcements leave through the rate-limited outbound queue after the
+# handler returns, so drops are counted where they are made
+drops_made = 0
+_drop_character = bot.drop_character
+
+
+async def counting_drop_character(*args, **kwargs):
+    global drops_made
+    drops_made += 1
+    return await _drop_character(*args, **kwargs)
+
+
+bot.drop_character = counting_drop_character
+
+
+def make_updates(groups, per_group):
+    """Round-robin messages across groups, each tagged with its per-group sequence"""
+    updates = []
+    for seq in range(per_group):
+        for g in range(groups):
+            updates.append(SimpleNamespace(
+                effective_chat=SimpleNamespace(id=-100000 - g, type=ChatType.SUPERGROUP),
+                effective_user=SimpleNamespace(id=1 + (seq % 97), first_name="bench"),
+                message=SimpleNamespace(text=f"message {seq}", photo=None, reply_text=_reply_text),
+                seq=seq,
+            ))
+    return updates
+
+
+class OrderRecorder:
+    """Wraps handler calls and records overlap or reordering within a chat"""
+
+    def __init__(self):
+        self.in_flight = defaultdict(int)
+        self.last_seq = defaultdict(lambda: -1)
+        self.violations = []
+
+    async def handle(self, update, context):
+        chat_id = update.effective_chat.id
+        self.in_flight[chat_id] += 1
+        if self.in_flight[chat_id] > 1:
+            self.violations.append(f"chat {chat_id}: overlapping updates")
+        if update.seq != self.last_seq[chat_id] + 1:
+            self.violations.append(f"chat {chat_id}: seq {update.seq} after {self.last_seq[chat_id]}")
+        self.last_seq[chat_id] = update.seq
+        try:
+            await bot.handle_group_message(update, context)
+        finally:
+            self.in_flight[chat_id] -= 1
+
+
+async def run_sequential(updates, latency):
+    context = SimpleNamespace(bot=FakeBot(latency))
+    recorder = OrderRecorder()
+    start = time.perf_counter()
+    for update in updates:
+        await recorder.handle(update, context)
+    return time.perf_counter() - start, drops_made, recorder.violations
+
+
+async def run_concurrent(updates, latency):
+    context = SimpleNamespace(bot=FakeBot(latency))
+    recorder = OrderRecorder()
+    processor = PerChatUpdateProcessor(MAX_CONCURRENT_UPDATES)
+    await processor.initialize()
+    start = time.perf_counter()
+    # Same shape as Application: one task per update, started in arrival order
+    tasks = [
+        asyncio.create_task(processor.process_update(update, recorder.handle(update, context)))
+        for update in updates
+    ]
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    await processor.shutdown()
+    return elapsed, drops_made, recorder.violations
+
+
+def reset_groups():
+    """Start each run from zero counters and no drops"""
+    global drops_made
+    drops_made = 0
+    db._message_counts.clear()
+    db._dirty_counts.clear()
+    for drop in db.get_active_drops():
+        db.remove_active_drop(drop['group_id'])
+
+
+def main():
+    groups = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    per_group = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 5.0) / 1000
+
+    for i in range(50):
+        gender = 'waifu' if i % 2 == 0 else 'husbando'
+        db.add_character(f"Bench Character {i}", "Bench Series", None, gender, 0, "Common")
+    updates = make_updates(groups, per_group)
+
+    results = {}
+    for name, runner in (('sequential', run_sequential), ('concurrent', run_concurrent)):
+        reset_groups()
+        results[name] = asyncio.run(runner(updates, latency))
+
+    print(f"updates: {len(updates)} across {groups} groups, {latency * 1000:.1f} ms per send")
+    failed = False
+    for name, (elapsed, drops, violations) in results.items():
+        print(f"{name:<11} {elapsed:7.3f}s  {len(updates) / elapsed:>9,.0f} updates/sec  ({drops} drops)")
+        if violations:
+            failed = True
+            print(f"  {len(violations)} ordering violations, e.g. {violations[0]}")
+    db.close()
+    if failed:
+        sys.exit(1)
+    print("per-chat order preserved")
+
+
+if __name__ == '__main__':
+    main()
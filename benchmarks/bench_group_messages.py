@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark: group messages per second through handle_group_message
+
+Runs against a throwaway database in a temporary directory, so the bot's
+real waifu_bot.db is never touched. Telegram is replaced by a fake bot.
+
+Measures the bot as it is, then again with the database opening a fresh
+rollback-journal connection for every call, as it did before persistent
+WAL connections, on a new set of groups. The second figure is the
+"before" of that change on the current code; other changes since then
+have moved more of the message path into memory, so it is higher than
+the 535 messages/sec originally measured at the baseline commit.
+
+Usage: python benchmarks/bench_group_messages.py [messages] [groups]
+"""
+
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+# Isolate the database before the bot modules create the global instance
+WORK_DIR = tempfile.mkdtemp(prefix='waifu_bench_')
+os.chdir(WORK_DIR)
+os.environ['DATABASE_PATH'] = os.path.join(WORK_DIR, 'bench.db')
+
+from telegram.constants import ChatType  # noqa: E402
+from database import db  # noqa: E402
+import main as bot  # noqa: E402
+
+
+class FakeBot:
+    """Stands in for telegram.Bot and just counts outgoing messages"""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_photo(self, chat_id, photo, caption=None, **kwargs):
+        self.sent += 1
+        return SimpleNamespace(message_id=self.sent, photo=[])
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent += 1
+        return SimpleNamespace(message_id=self.sent)
+
+
+async def _reply_text(*args, **kwargs):
+    return None
+
+
+# Drop announcements leave through the rate-limited outbound queue after the
+# handler returns, so drops are counted where they are made
+drops_made = 0
+_drop_character = bot.drop_character
+
+
+async def counting_drop_character(*args, **kwargs):
+    global drops_made
+    drops_made += 1
+    return await _drop_character(*args, **kwargs)
+
+
+bot.drop_character = counting_drop_character
+
+
+def make_update(group_id, user_id, text):
+    """Build the minimal Update shape handle_group_message reads"""
+    return SimpleNamespace(
+        effective_chat=SimpleNamespace(id=group_id, type=ChatType.SUPERGROUP),
+        effective_user=SimpleNamespace(id=user_id, first_name=f"user{user_id}"),
+        message=SimpleNamespace(text=text, photo=None, reply_text=_reply_text),
+    )
+
+
+def seed_characters(count=50):
+    for i in range(count):
+        gender = 'waifu' if i % 2 == 0 else 'husbando'
+        db.add_character(f"Bench Character {i}", "Bench Series", None, gender, 0, "Common")
+
+
+def use_per_call_connections():
+    """Make the database open a new rollback-journal connection per call"""
+    db.close()
+    conn = sqlite3.connect(db.db_path)
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.close()
+
+    def get_connection():
+        # Closed as soon as the calling method drops it
+        conn = sqlite3.connect(db.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    db.get_connection = get_connection
+
+
+async def run(messages, groups, first_group):
+    context = SimpleNamespace(bot=FakeBot())
+    updates = [
+        make_update(first_group - (i % groups), 1 + (i % 97), f"hello there number {i}")
+        for i in range(messages)
+    ]
+
+    global drops_made
+    drops_made = 0
+    start = time.perf_counter()
+    for update in updates:
+        await bot.handle_group_message(update, context)
+    elapsed = time.perf_counter() - start
+
+    # Stop the outbound dispatcher and its deliveries; sending is not measured
+    for task in asyncio.all_tasks():
+        if task is not asyncio.current_task():
+            task.cancel()
+    return elapsed, drops_made
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    groups = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    seed_characters()
+    print(f"messages: {messages} across {groups} groups")
+    elapsed, drops = asyncio.run(run(messages, groups, -1000))
+    print(f"persistent connections  {elapsed:.3f}s  {messages / elapsed:>9,.0f} messages/sec  ({drops} drops)")
+    use_per_call_connections()
+    elapsed, drops = asyncio.run(run(messages, groups, -2000))
+    print(f"per-call connections    {elapsed:.3f}s  {messages / elapsed:>9,.0f} messages/sec  ({drops} drops)")
+
+
+if __name__ == '__main__':
+    main()
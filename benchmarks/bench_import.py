@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bulk character import from CSV and JSONL
+
+Writes a synthetic catalog (with a sprinkling of invalid rows) in both
+formats, imports the CSV through importer.import_stream and reports rows
+per second. Then checks that the random-drop index and /search see the new
+characters, that importing the same catalog again (as JSONL) adds nothing,
+that the invalid rows were reported, and that characters imported by a
+separate `cli.py import` process become droppable without a restart.
+
+Usage: python benchmarks/bench_import.py [rows] [chunk_size]
+"""
+
+import csv
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+# Isolate the database before the bot modules create the global instance
+WORK_DIR = tempfile.mkdtemp(prefix='waifu_bench_')
+os.chdir(WORK_DIR)
+os.environ['DATABASE_PATH'] = os.path.join(WORK_DIR, 'bench.db')
+
+from database import db  # noqa: E402
+from importer import import_stream  # noqa: E402
+from config import IMPORT_CHUNK_SIZE, VALID_RARITIES  # noqa: E402
+
+INVALID_EVERY = 1000
+
+
+def make_catalog(rows, rng):
+    """Yield catalog rows; every INVALID_EVERY-th one has an unknown gender"""
+    for i in range(rows):
+        gender = 'robot' if i % INVALID_EVERY == 999 else rng.choice(('waifu', 'Husbando'))
+        yield {
+            'name': f"Imported {i:06d} @SomeBot",
+            'series_name': f"Series {i % 997}",
+            'gender': gender,
+            'rarity': rng.choice(VALID_RARITIES).lower(),
+            'image_url': f"https://images.example/{i}.png" if i % 3 else "",
+        }
+
+
+def write_files(rows):
+    rng = random.Random(3)
+    csv_path = os.path.join(WORK_DIR, 'catalog.csv')
+    jsonl_path = os.path.join(WORK_DIR, 'catalog.jsonl')
+    with open(csv_path, 'w', newline='', encoding='utf-8') as csv_file, \
+            open(jsonl_path, 'w', encoding='utf-8') as jsonl_file:
+        writer = csv.DictWriter(csv_file, fieldnames=['name', 'series_name', 'gender', 'rarity', 'image_url'])
+        writer.writeheader()
+        for row in make_catalog(rows, rng):
+            writer.writerow(row)
+            jsonl_file.write(json.dumps(row) + "\n")
+        jsonl_file.write("{not json\n")
+    return csv_path, jsonl_path
+
+
+def cli_import(series, count):
+    """Import characters of one series through a separate cli.py process"""
+    path = os.path.join(WORK_DIR, f'{series}.jsonl')
+    with open(path, 'w', encoding='utf-8') as out:
+        for i in range(count):
+            out.write(json.dumps({'name': f"Shell Import {i}", 'series': series, 'gender': 'husbando'}) + "\n")
+    subprocess.run(
+        [sys.executable, os.path.join(SRC_DIR, 'cli.py'), 'import', path],
+        check=True, capture_output=True, env=dict(os.environ)
+    )
+
+
+def undroppable(series):
+    indexed = set(db._character_ids.get('husbando', []))
+    cursor = db.get_connection().execute("SELECT id FROM characters WHERE series_name = ?", (series,))
+    return sum(1 for row in cursor if row[0] not in indexed)
+
+
+def check_cli_import():
+    """Characters imported by another process must reach the running bot's drop index"""
+    failures = []
+    # Picked up by the refresh main's flush loop runs every few seconds
+    cli_import("CLI Drop", 100)
+    db.refresh_character_index()
+    if undroppable("CLI Drop"):
+        failures.append(f"{undroppable('CLI Drop')} characters imported by cli.py are not droppable")
+    # An in-process add right after must not skip over them
+    cli_import("CLI Add", 100)
+    db.add_character("In Process", "CLI Add", None, 'husbando', 0)
+    if undroppable("CLI Add"):
+        failures.append(f"{undroppable('CLI Add')} cli.py imports were skipped by a later add_character")
+    return failures
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else IMPORT_CHUNK_SIZE
+    csv_path, jsonl_path = write_files(rows)
+    expected_invalid = rows // INVALID_EVERY
+    failures = []
+
+    start = time.perf_counter()
+    with open(csv_path, encoding='utf-8-sig', newline='') as stream:
+        report = import_stream(stream, 'csv', added_by=1, chunk_size=chunk_size)
+    elapsed = time.perf_counter() - start
+    print(f"csv import: {rows:,} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/sec, chunks of {chunk_size})")
+
+    if report.imported != rows - expected_invalid or report.invalid != expected_invalid:
+        failures.append(f"unexpected report: {report.summary()}")
+    indexed = sum(len(ids) for ids in db._character_ids.values())
+    if indexed != db.get_total_character_count():
+        failures.append(f"random-drop index has {indexed} IDs, table has {db.get_total_character_count()}")
+    if db.get_random_character('husbando') is None:
+        failures.append("no husbando drops after import")
+    found = db.search_characters("Imported 000123")
+    if not found or found[0]['name'] != "Imported 000123":
+        failures.append(f"search did not find an imported character (names cleaned?): {found[:1]}")
+
+    start = time.perf_counter()
+    with open(jsonl_path, encoding='utf-8') as stream:
+        again = import_stream(stream, 'jsonl', added_by=1, chunk_size=chunk_size)
+    print(f"jsonl re-import: {time.perf_counter() - start:.2f}s, {again.duplicates:,} already present")
+    if again.imported != 0 or again.invalid != expected_invalid + 1:
+        failures.append(f"re-import changed the catalog: {again.summary()}")
+
+    failures.extend(check_cli_import())
+
+    db.close()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("[ok] indexes updated, re-import skipped every existing character, cli.py imports droppable")
+
+
+if __name__ == '__main__':
+    main()
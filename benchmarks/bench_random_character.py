@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark: random character selection for drops on a large catalog
+
+Compares the in-memory per-gender ID index used by get_random_character
+with the previous ORDER BY RANDOM() query on the same database.
+
+Usage: python benchmarks/bench_random_character.py [catalog_size] [picks]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+WORK_DIR = tempfile.mkdtemp(prefix='waifu_bench_')
+os.chdir(WORK_DIR)
+os.environ['DATABASE_PATH'] = os.path.join(WORK_DIR, 'bench.db')
+
+from database import db  # noqa: E402
+
+RARITIES = ['Common', 'Uncommon', 'Rare', 'Epic', 'Legendary', 'Mythical', 'Divine']
+
+
+def seed(catalog_size):
+    conn = db.get_connection()
+    conn.executemany(
+        '''INSERT INTO characters (name, series_name, image_url, gender, added_by, rarity)
+           VALUES (?, ?, ?, ?, 0, ?)''',
+        (
+            (f"Character {i}", f"Series {i % 500}", None,
+             'waifu' if i % 2 == 0 else 'husbando', RARITIES[i % len(RARITIES)])
+            for i in range(catalog_size)
+        )
+    )
+    conn.commit()
+
+
+def bench(label, picks, pick):
+    start = time.perf_counter()
+    for _ in range(picks):
+        pick()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<18} {picks / elapsed:>12,.0f} picks/sec  ({elapsed / picks * 1e6:,.1f} us/pick)")
+
+
+def main():
+    catalog_size = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    picks = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+
+    seed(catalog_size)
+
+    start = time.perf_counter()
+    db.load_character_index()
+    print(f"catalog: {catalog_size:,} characters (index load {time.perf_counter() - start:.3f}s)")
+
+    conn = db.get_connection()
+    legacy_sql = "SELECT * FROM characters WHERE gender = ? ORDER BY RANDOM() LIMIT 1"
+    # The legacy query is slow enough that a fraction of the picks is plenty
+    bench("ORDER BY RANDOM()", max(picks // 20, 10), lambda: dict(conn.execute(legacy_sql, ('waifu',)).fetchone()))
+    bench("ID index", picks, lambda: db.get_random_character('waifu'))
+
+
+if __name__ == '__main__':
+    main()
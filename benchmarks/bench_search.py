@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /search latency on a large catalog
+
+Compares search_characters (FTS5, BM25-ranked prefix matching) with the
+previous LIKE '%q%' query on the same database, then pages through the
+results of each query both by re-running the search for every page and
+from a search session (ranked IDs kept, one primary-key lookup per page).
+
+Usage: python benchmarks/bench_search.py [catalog_size] [searches]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+WORK_DIR = tempfile.mkdtemp(prefix='waifu_bench_')
+os.chdir(WORK_DIR)
+os.environ['DATABASE_PATH'] = os.path.join(WORK_DIR, 'bench.db')
+
+from database import db  # noqa: E402
+from config import SEARCH_MAX_RESULTS, SEARCH_PAGE_SIZE  # noqa: E402
+
+PAGES = 10
+
+# Romaji syllables give a vocabulary with a realistic spread of name prefixes
+SYLLABLES = [
+    'a', 'ka', 'sa', 'ta', 'na', 'ha', 'ma', 'ya', 'ra', 'wa',
+    'i', 'ki', 'shi', 'chi', 'ni', 'hi', 'mi', 'ri',
+    'u', 'ku', 'su', 'tsu', 'nu', 'fu', 'mu', 'yu', 'ru',
+    'e', 'ke', 'se', 'te', 'ne', 'he', 'me', 're',
+    'o', 'ko', 'so', 'to', 'no', 'ho', 'mo', 'yo', 'ro', 'zen',
+]
+
+
+def word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+
+
+def seed(catalog_size, rng):
+    conn = db.get_connection()
+    conn.executemany(
+        '''INSERT INTO characters (name, series_name, image_url, gender, added_by, rarity)
+           VALUES (?, ?, NULL, ?, 0, 'Common')''',
+        (
+            (f"{word(rng)} {word(rng)}", f"{word(rng)} no {word(rng)}",
+             'waifu' if i % 2 == 0 else 'husbando')
+            for i in range(catalog_size)
+        )
+    )
+    conn.commit()
+
+
+def bench(label, queries, search):
+    start = time.perf_counter()
+    hits = sum(len(search(query)) for query in queries)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<14} {elapsed / len(queries) * 1000:>9.2f} ms/search  ({hits / len(queries):.1f} results/search)")
+
+
+def main():
+    catalog_size = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    searches = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = random.Random(7)
+
+    seed(catalog_size, rng)
+    print(f"catalog: {catalog_size:,} characters, FTS5 enabled: {db.fts_enabled}")
+
+    queries = [word(rng)[:rng.randint(4, 6)] for _ in range(searches)]
+    conn = db.get_connection()
+
+    def like_search(query):
+        return conn.execute(
+            "SELECT * FROM characters WHERE name LIKE ? OR series_name LIKE ? ORDER BY name LIMIT 10",
+            (f'%{query}%', f'%{query}%')
+        ).fetchall()
+
+    bench("LIKE '%q%'", queries[:max(searches // 10, 5)], like_search)
+    bench("FTS5 prefix", queries, db.search_characters)
+
+    def rerun_paging(query):
+        # Without sessions every page re-ranks the whole match set
+        shown = []
+        for page in range(PAGES):
+            end = (page + 1) * SEARCH_PAGE_SIZE
+            shown.extend(db.search_characters(query, limit=min(end, SEARCH_MAX_RESULTS))[end - SEARCH_PAGE_SIZE:])
+        return shown
+
+    def session_paging(query):
+        ids = db.search_character_ids(query)
+        shown = []
+        for page in range(PAGES):
+            start = page * SEARCH_PAGE_SIZE
+            shown.extend(db.get_characters_by_ids(ids[start:start + SEARCH_PAGE_SIZE]))
+        return shown
+
+    mismatched = [q for q in queries[:20] if rerun_paging(q) != session_paging(q)]
+    if mismatched:
+        print(f"FAIL: session pages differ from re-run pages for {mismatched[:3]}")
+        sys.exit(1)
+    print(f"paging {PAGES} pages of {SEARCH_PAGE_SIZE} per query:")
+    bench("re-run search", queries, rerun_paging)
+    bench("session", queries, session_paging)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Check: online backup and JSONL export while the bot keeps writing
+
+Fills a database with characters and collections, then runs a backup and
+an export while writer threads keep claiming characters. Checks that the
+writers were never stalled for long, that the backup passes
+integrity_check and is a consistent snapshot (collection stats match the
+collections they summarize), that the export's row counts match the
+backup, that export memory stays bounded, and that the export redacts the
+bot token from stored Telegram file links. Also checks that timestamped
+exports are rotated like backups.
+
+Usage: python benchmarks/check_backup.py [characters] [writers]
+"""
+
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+# Isolate the database before the bot modules create the global instance
+WORK_DIR = tempfile.mkdtemp(prefix='waifu_backup_')
+os.chdir(WORK_DIR)
+os.environ['DATABASE_PATH'] = os.path.join(WORK_DIR, 'live.db')
+
+from database import db  # noqa: E402
+from backup import backup_database, export_database  # noqa: E402
+from config import EXPORT_DIR, EXPORT_KEEP  # noqa: E402
+
+STALL_LIMIT = 0.5  # seconds a single claim may take while the backup runs
+BOT_TOKEN = '123456:backup-check-token'
+
+
+class Writers:
+    """Threads claiming characters in a loop, recording the slowest claim"""
+
+    def __init__(self, count, characters):
+        self.characters = characters
+        self.stop = threading.Event()
+        self.claims = 0
+        self.slowest = 0.0
+        self.threads = [threading.Thread(target=self.run, args=(i,)) for i in range(count)]
+
+    def run(self, n):
+        i = 0
+        while not self.stop.is_set():
+            start = time.perf_counter()
+            db.claim_character(1000 + n, 1 + (i * 7919 + n) % self.characters, -1)
+            self.slowest = max(self.slowest, time.perf_counter() - start)
+            self.claims += 1
+            i += 1
+
+    def __enter__(self):
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        for thread in self.threads:
+            thread.join()
+
+
+def seed(characters):
+    rows = [(f"Backup Character {i}", f"Series {i % 500}", f"https://images.example/{i}.png",
+             'waifu' if i % 2 else 'husbando', 'Common') for i in range(characters)]
+    # A link stored by an older version, with the token in its path
+    rows[0] = rows[0][:2] + (f"https://api.telegram.org/file/bot{BOT_TOKEN}/photos/file_0.jpg",) + rows[0][3:]
+    for start in range(0, characters, 5000):
+        db.add_characters(rows[start:start + 5000], 0)
+    for user in range(200):
+        for k in range(50):
+            db.claim_character(user, 1 + (user * 131 + k * 17) % characters, -1)
+
+
+def main():
+    characters = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    writers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    seed(characters)
+    failures = []
+
+    with Writers(writers, characters) as load:
+        time.sleep(0.2)
+        before = load.claims
+        result = backup_database(os.path.join(WORK_DIR, 'copy.db'), pages=64)
+        during_backup = load.claims - before
+
+        tracemalloc.start()
+        written = export_database(os.path.join(WORK_DIR, 'export'), compress=True)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        slowest = load.slowest
+
+    print(f"backup: {result.summary()}, {during_backup} claims committed meanwhile")
+    print(f"export: {', '.join(f'{rows} {table}' for table, _, rows in written)}; peak memory {peak / 1024 / 1024:.1f} MB")
+    print(f"slowest claim under load: {slowest * 1000:.1f} ms")
+
+    copy = sqlite3.connect(result.path)
+    if copy.execute("PRAGMA integrity_check").fetchone()[0] != 'ok':
+        failures.append("backup failed integrity_check")
+    collected, summarized = copy.execute('''
+        SELECT (SELECT SUM(count) FROM user_collections), (SELECT SUM(total_count) FROM user_collection_stats)
+    ''').fetchone()
+    if collected != summarized:
+        failures.append(f"backup is not a consistent snapshot: {collected} claimed vs {summarized} in stats")
+    if copy.execute("SELECT COUNT(*) FROM characters").fetchone()[0] != characters:
+        failures.append("backup is missing characters")
+    copy.close()
+
+    if during_backup == 0:
+        failures.append("writers made no progress during the backup")
+    if slowest > STALL_LIMIT:
+        failures.append(f"a claim stalled for {slowest:.2f}s")
+    if peak > 16 * 1024 * 1024:
+        failures.append(f"export held {peak / 1024 / 1024:.1f} MB at once")
+    exported = {table: rows for table, _, rows in written}
+    if exported['characters'] != characters:
+        failures.append(f"exported {exported['characters']} characters, expected {characters}")
+    with open(os.path.join(WORK_DIR, 'export', 'trades.jsonl.gz'), 'rb') as raw:
+        if raw.read(2) != b'\x1f\x8b':
+            failures.append("export is not gzipped")
+    with gzip.open(written[0][1], 'rt') as stream:
+        first = json.loads(stream.readline())
+    if first.get('id') != 1 or 'name' not in first:
+        failures.append(f"unexpected first exported row {first}")
+    if BOT_TOKEN in (first.get('image_url') or ''):
+        failures.append("export leaked the bot token in a Telegram file link")
+
+    # Older timestamped exports are pruned; other directories are left alone
+    for name in [f"20200101-0000{i:02d}" for i in range(EXPORT_KEEP + 2)] + ['manual']:
+        os.makedirs(os.path.join(EXPORT_DIR, name))
+    export_database(tables=('trades',))
+    kept = sorted(os.listdir(EXPORT_DIR))
+    if len(kept) != EXPORT_KEEP + 1 or 'manual' not in kept or '20200101-000000' in kept:
+        failures.append(f"export rotation kept {kept}")
+
+    db.close()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("[ok] backup and export ran without blocking writers")
+
+
+if __name__ == '__main__':
+    main()
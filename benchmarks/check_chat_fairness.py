@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Check: a backlog in one chat does not delay other chats
+
+Queues a burst of slow updates from one chat through
+PerChatUpdateProcessor, then one update from another chat, and checks
+that the second chat is handled right away instead of after the burst.
+Also checks that max_concurrent_updates still caps how many updates
+run at once when many chats are busy.
+
+Usage: python benchmarks/check_chat_fairness.py [burst] [handler_ms] [limit]
+"""
+
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+from update_processor import PerChatUpdateProcessor  # noqa: E402
+
+
+def make_update(chat_id):
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id))
+
+
+class Handler:
+    """Sleeps like a slow handler and tracks how many run at once"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.running = 0
+        self.peak = 0
+
+    async def handle(self):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(self.seconds)
+        finally:
+            self.running -= 1
+
+
+async def quiet_chat_latency(burst, seconds, limit):
+    processor = PerChatUpdateProcessor(limit)
+    handler = Handler(seconds)
+    tasks = [
+        asyncio.create_task(processor.process_update(make_update(-1), handler.handle()))
+        for _ in range(burst)
+    ]
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await processor.process_update(make_update(-2), handler.handle())
+    latency = time.perf_counter() - start
+    await asyncio.gather(*tasks)
+    return latency
+
+
+async def peak_running(chats, seconds, limit):
+    processor = PerChatUpdateProcessor(limit)
+    handler = Handler(seconds)
+    await asyncio.gather(*(
+        processor.process_update(make_update(-chat), handler.handle()) for chat in range(1, chats + 1)
+    ))
+    return handler.peak
+
+
+def main():
+    burst = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    seconds = (float(sys.argv[2]) if len(sys.argv) > 2 else 20.0) / 1000
+    limit = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+    latency = asyncio.run(quiet_chat_latency(burst, seconds, limit))
+    peak = asyncio.run(peak_running(limit * 4, seconds, limit))
+    print(f"{burst} queued updates in one chat, limit {limit}: other chat answered in {latency * 1000:.1f} ms")
+    print(f"{limit * 4} busy chats: at most {peak} updates ran at once")
+
+    failures = []
+    if latency > seconds * 3:
+        failures.append(f"other chat waited {latency * 1000:.0f} ms behind the burst")
+    if peak > limit:
+        failures.append(f"{peak} updates ran at once, limit is {limit}")
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("[ok] queued updates do not take slots from other chats")
+
+
+if __name__ == '__main__':
+    main()
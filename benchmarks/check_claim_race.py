@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Check: concurrent catchers of one drop produce exactly one winner
+
+Fires 50 simultaneous claim_drop calls at a single drop, split across two
+Database instances on the same file so the SQLite transaction (not just
+the in-memory registry) has to arbitrate. Exits non-zero unless exactly
+one catcher wins, the winner holds one copy and the drop row is gone.
+
+Usage: python benchmarks/check_claim_race.py [catchers] [rounds]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+# Isolate the database before the bot modules create the global instance
+WORK_DIR = tempfile.mkdtemp(prefix='waifu_claim_')
+os.chdir(WORK_DIR)
+os.environ['DATABASE_PATH'] = os.path.join(WORK_DIR, 'claim.db')
+
+from database import Database, db  # noqa: E402
+
+GROUP_ID = -1001
+
+
+def race(character_id, catchers):
+    """Drop one character and let every catcher claim it at once; returns failures"""
+    drop_id = db.create_drop(GROUP_ID, character_id)
+    # A second instance loads the drop into its own registry, so its
+    # catchers reach the DELETE ... RETURNING instead of the memory check
+    other = Database(os.environ['DATABASE_PATH'])
+    instances = [db, other]
+
+    barrier = threading.Barrier(catchers)
+    results = [None] * catchers
+    errors = []
+
+    def catch(i):
+        barrier.wait()
+        try:
+            results[i] = instances[i % 2].claim_drop(GROUP_ID, drop_id, 5000 + i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=catch, args=(i,)) for i in range(catchers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    other.close()
+
+    failures = [f"error: {e!r}" for e in errors]
+    winners = [(5000 + i, count) for i, count in enumerate(results) if count is not None]
+    if len(winners) != 1:
+        failures.append(f"expected 1 winner, got {len(winners)}: {winners}")
+    elif winners[0][1] != 1:
+        failures.append(f"winner count should be 1, got {winners[0][1]}")
+
+    conn = db.get_connection()
+    leftover = conn.execute("SELECT COUNT(*) FROM active_drops WHERE id = ?", (drop_id,)).fetchone()[0]
+    owners = conn.execute("SELECT COUNT(*) FROM user_collections WHERE character_id = ?", (character_id,)).fetchone()[0]
+    if leftover:
+        failures.append("drop row still present after the race")
+    if owners != len(winners):
+        failures.append(f"{owners} collection rows for {len(winners)} winners")
+    if db.get_active_drop(GROUP_ID):
+        failures.append("drop still in the registry after the race")
+    return failures
+
+
+def main():
+    catchers = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    failures = []
+    for n in range(rounds):
+        character_id = db.add_character(f"Racer {n}", "Claim Race", None, "waifu", 0, "Common")
+        for failure in race(character_id, catchers):
+            failures.append(f"round {n}: {failure}")
+
+    db.close()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print(f"{rounds} rounds x {catchers} catchers: exactly one winner every time")
+
+
+if __name__ == '__main__':
+    main()
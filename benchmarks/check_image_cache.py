@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Check: character pictures are uploaded once, then sent by file_id
+
+Announces drops through main.announce_drop against a fake bot that
+accepts one URL, rejects another and knows which file_ids it issued.
+Verifies that the first send uploads the URL and stores the file_id,
+later sends reuse it, a refused URL is marked broken and never retried,
+a stale file_id falls back to the URL once, and a chat that refuses
+photos falls back to text without marking the picture broken.
+
+Usage: python benchmarks/check_image_cache.py
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+# Isolate the database before the bot modules create the global instance
+WORK_DIR = tempfile.mkdtemp(prefix='waifu_images_')
+os.chdir(WORK_DIR)
+os.environ['DATABASE_PATH'] = os.path.join(WORK_DIR, 'images.db')
+
+from telegram.error import BadRequest  # noqa: E402
+from database import db  # noqa: E402
+import main as bot  # noqa: E402
+
+GOOD_URL = "https://images.example/good.jpg"
+BAD_URL = "https://images.example/gone.jpg"
+NO_MEDIA_CHAT = 6
+
+
+class FakeBot:
+    """Accepts GOOD_URL and file_ids it issued; refuses everything else"""
+
+    def __init__(self):
+        self.photos = []
+        self.texts = 0
+        self.issued = set()
+
+    async def send_photo(self, chat_id, photo, caption=None, **kwargs):
+        self.photos.append(photo)
+        if chat_id == NO_MEDIA_CHAT:
+            raise BadRequest("Not enough rights to send photos to the chat")
+        if photo == GOOD_URL:
+            file_id = f"file-{len(self.issued)}"
+            self.issued.add(file_id)
+        elif photo in self.issued:
+            file_id = photo
+        else:
+            raise BadRequest("Wrong file identifier/http url specified")
+        return SimpleNamespace(message_id=len(self.photos), photo=[SimpleNamespace(file_id=file_id)])
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.texts += 1
+        return SimpleNamespace(message_id=0, photo=None)
+
+
+async def announce(fake, character_id, chat_id):
+    character = db.get_character_by_id(character_id)
+    return await bot.announce_drop(fake, chat_id, character, "drop!")
+
+
+async def main():
+    good = db.add_character("Good Picture", "Cache", GOOD_URL, "waifu", 0)
+    bad = db.add_character("Dead Link", "Cache", BAD_URL, "waifu", 0)
+    stale = db.add_character("Stale Id", "Cache", GOOD_URL, "waifu", 0, image_file_id="expired-id")
+    fake = FakeBot()
+    failures = []
+
+    # Private chat ids keep each send in its own flood bucket
+    await announce(fake, good, 1)
+    stored = db.get_character_by_id(good)['image_file_id']
+    await announce(fake, good, 2)
+    if fake.photos != [GOOD_URL, stored] or stored is None:
+        failures.append(f"file_id not reused: sent {fake.photos}, stored {stored}")
+
+    fake.photos.clear()
+    await announce(fake, bad, 3)
+    await announce(fake, bad, 4)
+    if fake.photos != [BAD_URL]:
+        failures.append(f"broken URL retried: sent {fake.photos}")
+    if db.get_character_by_id(bad)['image_status'] != 'broken':
+        failures.append("refused URL not marked broken")
+    if fake.texts != 2:
+        failures.append(f"expected 2 text fallbacks for the broken picture, got {fake.texts}")
+
+    fake.photos.clear()
+    await announce(fake, stale, 5)
+    refreshed = db.get_character_by_id(stale)
+    if fake.photos != ["expired-id", GOOD_URL] or refreshed['image_file_id'] in (None, "expired-id"):
+        failures.append(f"stale file_id not replaced: sent {fake.photos}, stored {refreshed['image_file_id']}")
+
+    fake.photos.clear()
+    fake.texts = 0
+    await announce(fake, good, NO_MEDIA_CHAT)
+    if fake.texts != 1:
+        failures.append("chat without media rights got no text fallback")
+    if db.get_character_by_id(good)['image_status'] == 'broken' or not db.get_character_by_id(good)['image_file_id']:
+        failures.append("a chat without media rights marked the picture broken")
+    await announce(fake, good, 7)
+    if fake.photos[-1] != stored:
+        failures.append(f"picture not sent to other chats after a rights error: sent {fake.photos}")
+
+    await bot.outbound.close()
+    db.close()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("[ok] URLs upload once, file_ids are reused, only picture errors mark a picture broken")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Check: background image validation against a local stand-in server
+
+Serves good, missing, non-image, oversized, HEAD-refusing, flaky and slow
+pictures from 127.0.0.1, sweeps them with ImageValidator and its default
+fetcher, and checks each verdict, the recorded content type and size,
+that no more than the configured number of fetches ran at once, that
+Telegram file links (which embed the bot token) are never fetched, and
+that logs name only the host of a bad picture.
+
+Usage: python benchmarks/check_image_pipeline.py
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+# Isolate the database before the bot modules create the global instance
+WORK_DIR = tempfile.mkdtemp(prefix='waifu_images_')
+os.chdir(WORK_DIR)
+os.environ['DATABASE_PATH'] = os.path.join(WORK_DIR, 'images.db')
+
+from database import db  # noqa: E402
+from images import ImageValidator  # noqa: E402
+
+CONCURRENCY = 3
+SLOW_PICTURES = 12
+
+
+class StandInServer:
+    """Tiny HTTP/1.1 server with one canned response per path"""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.requests = []
+
+    def respond(self, method, path):
+        """Return (status, content_type, declared_length, body)"""
+        if path == '/good.jpg':
+            return 200, 'image/jpeg', 2048, b'\xff' * 2048
+        if path == '/page.html':
+            return 200, 'text/html; charset=utf-8', 13, b'<html></html>'
+        if path == '/huge.png':
+            # Declared size only; the checker must not download it
+            return 200, 'image/png', 20 * 1024 * 1024, b''
+        if path == '/nohead.jpg':
+            if method == 'HEAD':
+                return 405, 'text/plain', 0, b''
+            return 200, 'image/jpeg', 1000, b'\x00' * 1000
+        if path == '/flaky.jpg':
+            return 503, 'text/plain', 0, b''
+        if path.startswith('/slow/'):
+            return 200, 'image/webp', 512, b'\x00' * 512
+        return 404, 'text/html', 9, b'not found'
+
+    async def handle(self, reader, writer):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            method, path, _ = (await reader.readline()).decode().split(' ', 2)
+            while (await reader.readline()) not in (b'\r\n', b''):
+                pass
+            self.requests.append((method, path))
+            if path.startswith('/slow/'):
+                await asyncio.sleep(0.2)
+
+            status, content_type, length, body = self.respond(method, path)
+            head = (
+                f"HTTP/1.1 {status} X\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {length}\r\nConnection: close\r\n\r\n"
+            ).encode()
+            writer.write(head if method == 'HEAD' else head + body)
+            await writer.drain()
+        finally:
+            self.active -= 1
+            writer.close()
+
+
+async def main():
+    server = StandInServer()
+    listener = await asyncio.start_server(server.handle, '127.0.0.1', 0)
+    base = f"http://127.0.0.1:{listener.sockets[0].getsockname()[1]}"
+
+    expected = {
+        'good': ('/good.jpg', 'ok'),
+        'missing': ('/missing.jpg', 'broken'),
+        'html': ('/page.html', 'broken'),
+        'huge': ('/huge.png', 'broken'),
+        'nohead': ('/nohead.jpg', 'ok'),
+        'flaky': ('/flaky.jpg', None),
+    }
+    ids = {
+        name: db.add_character(f"Pic {name}", "Images", base + path, "waifu", 0)
+        for name, (path, _) in expected.items()
+    }
+    for i in range(SLOW_PICTURES):
+        ids[f'slow{i}'] = db.add_character(f"Slow {i}", "Images", f"{base}/slow/{i}.webp", "husbando", 0)
+        expected[f'slow{i}'] = (None, 'ok')
+    # Uploaded pictures already live on Telegram and are never fetched
+    uploaded = db.add_character("Uploaded", "Images", base + "/good.jpg", "waifu", 0, image_file_id="tg-file")
+    db.add_character("Old Upload", "Images", "https://api.telegram.org/file/bot123:SECRET/photos/1.jpg", "waifu", 0)
+
+    logs = []
+    handler = logging.Handler()
+    handler.emit = lambda record: logs.append(record.getMessage())
+    logging.getLogger('images').addHandler(handler)
+    validator = ImageValidator(concurrency=CONCURRENCY, batch_size=5)
+    checked = await validator.sweep()
+    logging.getLogger('images').removeHandler(handler)
+
+    failures = []
+    for name, (_, verdict) in expected.items():
+        character = db.get_character_by_id(ids[name])
+        if character['image_status'] != verdict:
+            failures.append(f"{name}: expected {verdict}, got {character['image_status']}")
+        if verdict and character['image_checked_at'] is None:
+            failures.append(f"{name}: check time not recorded")
+
+    good = db.get_character_by_id(ids['good'])
+    if (good['image_content_type'], good['image_size']) != ('image/jpeg', 2048):
+        failures.append(f"good: recorded {good['image_content_type']} / {good['image_size']}")
+    if ('GET', '/huge.png') in server.requests:
+        failures.append("oversized picture was downloaded despite its declared size")
+    # One HEAD for the "good" character; the uploaded one shares its URL but is skipped
+    if server.requests.count(('HEAD', '/good.jpg')) != 1:
+        failures.append("uploaded picture was fetched")
+    if db.get_character_by_id(uploaded)['image_status'] != 'ok':
+        failures.append("uploaded picture lost its status")
+    if server.max_active > CONCURRENCY:
+        failures.append(f"{server.max_active} fetches at once, limit {CONCURRENCY}")
+    if checked != len(expected) - 1:
+        failures.append(f"sweep reported {checked} checked, expected {len(expected) - 1}")
+
+    leaked = [message for message in logs if '/missing.jpg' in message or 'SECRET' in message]
+    if leaked:
+        failures.append(f"log lines carry picture paths: {leaked}")
+
+    # Only the flaky picture is left for the next sweep (Telegram file links never are)
+    pending = db.get_characters_needing_image_check()
+    if [row['id'] for row in pending] != [ids['flaky']]:
+        failures.append(f"left for the next sweep: {pending}")
+
+    # A fetcher that raises (timeout, DNS failure) leaves the picture unjudged
+    async def unreachable(url):
+        raise TimeoutError("stand-in timeout")
+    if await ImageValidator(fetcher=unreachable).check(ids['flaky'], "http://unreachable") is not None:
+        failures.append("network failure produced a verdict")
+
+    await validator.close()
+    listener.close()
+    db.close()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print(f"[ok] {checked} pictures judged correctly, at most {server.max_active} fetches at once")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Check: handler and database latency metrics
+
+Runs wrapped handlers and database calls, with writer threads contending
+for the database lock, then scrapes the metrics endpoint over HTTP. Checks
+that every handler and method shows up with the right call counts, that
+handler errors are counted, that lock contention shows up as lock wait
+(not as execution time of the waiting call), and that /perfstats renders.
+
+Usage: python benchmarks/check_metrics.py [writers] [claims]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import urllib.request
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+# Isolate the database before the bot modules create the global instance
+WORK_DIR = tempfile.mkdtemp(prefix='waifu_metrics_')
+os.chdir(WORK_DIR)
+os.environ['DATABASE_PATH'] = os.path.join(WORK_DIR, 'metrics.db')
+
+import main  # noqa: E402
+from database import db, async_db  # noqa: E402
+from metrics import (  # noqa: E402
+    registry, timed_handler, start_metrics_server,
+    handler_seconds, handler_errors, db_call_seconds, db_lock_wait_seconds, db_queue_wait_seconds,
+)
+
+HOLD_SECONDS = 0.05  # how long the check keeps the writer lock while the claims wait
+
+
+async def ok_handler(update, context):
+    await async_db.get_total_character_count()
+
+
+async def failing_handler(update, context):
+    raise RuntimeError("boom")
+
+
+async def drive_handlers(calls):
+    ok = timed_handler('ok_handler', ok_handler)
+    failing = timed_handler('failing_handler', failing_handler)
+    for _ in range(calls):
+        await ok(None, None)
+    for _ in range(3):
+        try:
+            await failing(None, None)
+        except RuntimeError:
+            pass
+
+
+def contend(writers, claims):
+    """Claim characters from several threads while the lock is held for a while"""
+    def claim(n):
+        for i in range(claims):
+            db.claim_character(2000 + n, 1 + (n + i) % 10, -1)
+
+    db.lock.acquire()
+    threads = [threading.Thread(target=claim, args=(n,)) for n in range(writers)]
+    for thread in threads:
+        thread.start()
+    threading.Event().wait(HOLD_SECONDS)
+    db.lock.release()
+    for thread in threads:
+        thread.join()
+
+
+def scrape(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+        return response.headers.get('Content-Type'), response.read().decode()
+
+
+def sample(body, line_prefix):
+    for line in body.splitlines():
+        if line.startswith(line_prefix + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+def main_check():
+    writers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    claims = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    for i in range(10):
+        db.add_character(f"Metrics Character {i}", "Metrics Series", None, 'waifu', 0, "Common")
+
+    calls = 25
+    asyncio.run(drive_handlers(calls))
+    contend(writers, claims)
+    main.register_metrics()
+
+    server = start_metrics_server('127.0.0.1', 0)
+    try:
+        content_type, body = scrape(server.server_address[1])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    failures = []
+    if not content_type.startswith('text/plain'):
+        failures.append(f"unexpected content type {content_type}")
+
+    handled = sample(body, 'waifu_handler_seconds_count{handler="ok_handler"}')
+    if handled != calls:
+        failures.append(f"ok_handler counted {handled} calls, expected {calls}")
+    errors = sample(body, 'waifu_handler_errors_total{handler="failing_handler"}')
+    if errors != 3:
+        failures.append(f"failing_handler counted {errors} errors, expected 3")
+
+    claimed = sample(body, 'waifu_db_call_seconds_count{method="claim_character"}')
+    if claimed != writers * claims:
+        failures.append(f"claim_character counted {claimed} calls, expected {writers * claims}")
+    if sample(body, 'waifu_db_queue_wait_seconds_count{method="get_total_character_count"}') != calls:
+        failures.append("async_db queue wait was not recorded per call")
+    if 'waifu_db_call_seconds_bucket{method="claim_character",le="+Inf"}' not in body:
+        failures.append("histogram buckets missing from the exposition")
+    for name in ('waifu_outbound_queue_depth{priority="high"}', 'waifu_cache_hits_total{cache="collection_pages"}'):
+        if sample(body, name) is None:
+            failures.append(f"{name} missing from the exposition")
+
+    # Every claim queued behind the held lock: that time must land in lock wait
+    wait = db_lock_wait_seconds.labels('claim_character')
+    total = db_call_seconds.labels('claim_character')
+    if wait.max < HOLD_SECONDS * 0.8:
+        failures.append(f"longest lock wait {wait.max * 1000:.1f} ms, expected about {HOLD_SECONDS * 1000:.0f} ms")
+    if wait.sum > total.sum:
+        failures.append("lock wait exceeds the calls' wall time")
+    # Methods called from inside other methods must not be counted on their own
+    if 'get_connection' in db_call_seconds.children:
+        failures.append("get_connection was instrumented")
+    # In-memory lookups on the message hot path stay unwrapped
+    db.is_banned(1)
+    db.increment_message_count(-1)
+    for method in ('is_banned', 'increment_message_count'):
+        if method in db_call_seconds.children:
+            failures.append(f"in-memory {method} was instrumented")
+
+    text = main.format_perfstats()
+    if 'claim_character' not in text or 'ok_handler' not in text:
+        failures.append("/perfstats is missing handlers or methods")
+
+    print(f"handlers: {handler_seconds.labels('ok_handler').count} ok, {handler_errors.values.get('failing_handler', 0)} errors")
+    print(f"claim_character: {total.count} calls, avg {total.mean * 1000:.2f} ms, "
+          f"avg lock wait {wait.mean * 1000:.2f} ms, max lock wait {wait.max * 1000:.1f} ms")
+    print(f"queue wait p95: {db_queue_wait_seconds.labels('get_total_character_count').quantile(0.95) * 1000:.2f} ms")
+    print(f"exposition: {len(body.splitlines())} lines, {len(registry.render())} bytes")
+
+    db.close()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("[ok] handler and database metrics are recorded and served")
+
+
+if __name__ == '__main__':
+    main_check()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Check: outbound queue flood limits, priorities, coalescing and retry_after
+
+Drives OutboundQueue against a fake bot that records when each call
+arrives (and can answer with a 429), using small limits so the run takes
+a few seconds. Also cancels callers and deliveries mid-call. Exits non-zero on the first broken guarantee.
+
+Usage: python benchmarks/check_outbound_queue.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+from telegram.error import RetryAfter  # noqa: E402
+from outbound import OutboundQueue, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW  # noqa: E402
+
+
+class FakeBot:
+    """Records (time, chat_id, text) per call; chats in flood_once get one 429 first"""
+
+    def __init__(self, flood_once=(), retry_after=1):
+        self.calls = []
+        self.flood_once = set(flood_once)
+        self.retry_after = retry_after
+
+    async def _call(self, chat_id, text):
+        if chat_id in self.flood_once:
+            self.flood_once.discard(chat_id)
+            raise RetryAfter(self.retry_after)
+        self.calls.append((time.monotonic(), chat_id, text))
+        return text
+
+    async def send_message(self, chat_id, text, **kwargs):
+        return await self._call(chat_id, text)
+
+    async def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        return await self._call(chat_id, text)
+
+
+def max_in_window(times, window):
+    """Largest number of timestamps inside any window of the given length"""
+    times = sorted(times)
+    best = start = 0
+    for end in range(len(times)):
+        while times[end] - times[start] > window:
+            start += 1
+        best = max(best, end - start + 1)
+    return best
+
+
+async def check_chat_limit():
+    queue = OutboundQueue(global_rate=1000, global_burst=1000, group_rate=10, group_burst=2)
+    bot = FakeBot()
+    futures = [queue.submit(bot, -1, 'send_message', text=f"m{i}") for i in range(12)]
+    await asyncio.gather(*futures)
+    await queue.close()
+
+    times = [t for t, _, _ in bot.calls]
+    assert [text for _, _, text in bot.calls] == [f"m{i}" for i in range(12)], "chat order not preserved"
+    # 2 burst + 10/s: at most 2 + 10 * window calls land in any window
+    assert max_in_window(times, 0.5) <= 2 + 5 + 1, f"chat limit exceeded: {max_in_window(times, 0.5)} in 0.5s"
+    assert times[-1] - times[0] >= 0.9, f"12 sends at 10/s finished in {times[-1] - times[0]:.2f}s"
+    return "per-chat bucket spaces a group's messages and keeps their order"
+
+
+async def check_global_limit():
+    queue = OutboundQueue(global_rate=50, global_burst=10, group_rate=1000, group_burst=1000)
+    bot = FakeBot()
+    start = time.monotonic()
+    futures = [queue.submit(bot, -1000 - i, 'send_message', text="hi") for i in range(150)]
+    await asyncio.gather(*futures)
+    elapsed = time.monotonic() - start
+    await queue.close()
+
+    times = [t for t, _, _ in bot.calls]
+    assert max_in_window(times, 1.0) <= 10 + 50 + 1, f"global limit exceeded: {max_in_window(times, 1.0)} in 1s"
+    assert elapsed >= (150 - 10) / 50 - 0.1, f"150 sends at 50/s finished in {elapsed:.2f}s"
+    return f"global bucket held 150 sends over 150 chats to 50/s ({elapsed:.2f}s)"
+
+
+async def check_retry_after():
+    queue = OutboundQueue(global_rate=1000, global_burst=1000, group_rate=1000, group_burst=1000)
+    bot = FakeBot(flood_once={-1}, retry_after=1)
+    start = time.monotonic()
+    flooded = queue.submit(bot, -1, 'send_message', text="flooded")
+    queued_behind = queue.submit(bot, -1, 'send_message', text="behind")
+    other = queue.submit(bot, -2, 'send_message', text="other")
+
+    assert await other == "other"
+    other_elapsed = time.monotonic() - start
+    assert await flooded == "flooded" and await queued_behind == "behind"
+    elapsed = time.monotonic() - start
+    stats = queue.stats()
+    await queue.close()
+
+    assert other_elapsed < 0.5, f"a 429 in one chat delayed another chat by {other_elapsed:.2f}s"
+    assert elapsed >= 1.0, f"retry_after ignored (resent after {elapsed:.2f}s)"
+    order = [text for _, chat_id, text in bot.calls if chat_id == -1]
+    assert order == ["flooded", "behind"], f"retry lost its place in the chat: {order}"
+    assert stats['retried'] == 1, stats
+    return "retry_after pauses only the flooded chat and the retried send keeps its place"
+
+
+async def check_priority_and_coalescing():
+    queue = OutboundQueue(global_rate=1000, global_burst=1000, group_rate=1000, group_burst=1000)
+    bot = FakeBot(flood_once={-1}, retry_after=1)
+    # The first send hits a 429, so everything after it waits in the queue together
+    first = queue.submit(bot, -1, 'send_message', PRIORITY_NORMAL, text="first")
+    await asyncio.sleep(0.05)
+
+    edits = [
+        queue.submit(bot, -1, 'edit_message_text', PRIORITY_LOW, coalesce_key=('edit', -1, 7),
+                     message_id=7, text=f"page {i}")
+        for i in range(10)
+    ]
+    normal = queue.submit(bot, -1, 'send_message', PRIORITY_NORMAL, text="normal")
+    high = queue.submit(bot, -1, 'send_message', PRIORITY_HIGH, text="high")
+    # first (back in the queue after its 429), one edit, normal and high
+    assert queue.depth == 4, f"expected 4 queued after coalescing, got {queue.depth}"
+
+    await asyncio.gather(first, normal, high, *edits)
+    stats = queue.stats()
+    await queue.close()
+
+    order = [text for _, _, text in bot.calls]
+    # The retried normal send still yields to the high-priority one
+    assert order == ["high", "first", "normal", "page 9"], f"unexpected delivery order {order}"
+    results = [edit.result() for edit in edits]
+    assert results == [None] * 9 + ["page 9"], results
+    assert stats['coalesced'] == 9 and stats['depth'] == 0, stats
+    assert stats['latency']['max'] >= 1.0, stats
+    return "high before normal before low, 10 queued edits of one message coalesced to 1"
+
+
+async def check_failures():
+    class BrokenBot(FakeBot):
+        async def send_message(self, chat_id, text, **kwargs):
+            raise ValueError("bad request")
+
+    queue = OutboundQueue()
+    future = queue.submit(BrokenBot(), 1, 'send_message', text="x")
+    try:
+        await future
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("failure not propagated to the awaiting caller")
+    # A fire-and-forget failure must not break the dispatcher
+    queue.submit(BrokenBot(), 2, 'send_message', text="y")
+    ok = await queue.send(FakeBot(), 3, 'send_message', text="z")
+    stats = queue.stats()
+    await queue.close()
+    assert ok == "z" and stats['failed'] == 2, stats
+    return "failed calls reach awaiting callers and do not stop the dispatcher"
+
+
+async def check_cancelled_callers():
+    class SlowBot(FakeBot):
+        async def send_message(self, chat_id, text, **kwargs):
+            await asyncio.sleep(0.1)
+            return await self._call(chat_id, text)
+
+    queue = OutboundQueue()
+    bot = SlowBot()
+    loop = asyncio.get_running_loop()
+    errors = []
+    loop.set_exception_handler(lambda loop, context: errors.append(context.get('message')))
+
+    # Callers that stop waiting while their call is in flight
+    waiter = asyncio.create_task(queue.send(bot, -1, 'send_message', text="abandoned"))
+    await asyncio.sleep(0.05)
+    waiter.cancel()
+    after = await queue.send(bot, -1, 'send_message', text="after")
+
+    # A delivery cancelled mid-call must not leave its chat busy
+    stuck = queue.submit(bot, -2, 'send_message', text="cut off")
+    await asyncio.sleep(0.05)
+    for task in list(queue._in_flight):
+        task.cancel()
+    await asyncio.sleep(0)
+    follow_up = await asyncio.wait_for(queue.send(bot, -2, 'send_message', text="next"), timeout=2)
+    await queue.close()
+    loop.set_exception_handler(None)
+
+    assert after == "after", after
+    assert stuck.cancelled(), "cancelled delivery left its caller waiting"
+    assert follow_up == "next", follow_up
+    assert not errors, f"unexpected loop errors: {errors}"
+    return "cancelled callers and deliveries neither raise nor leave the chat busy"
+
+
+async def main():
+    failures = 0
+    for check in (check_chat_limit, check_global_limit, check_retry_after,
+                  check_priority_and_coalescing, check_failures, check_cancelled_callers):
+        try:
+            print(f"[ok] {await check()}")
+        except AssertionError as e:
+            failures += 1
+            print(f"[FAIL] {check.__name__}: {e}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
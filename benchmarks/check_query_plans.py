@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Check: no hot query does a full table scan or a temporary sort
+
+Calls the real Database methods on a throwaway database, captures the SQL
+they execute through a trace callback and runs EXPLAIN QUERY PLAN on each
+statement. Exits non-zero if any plan contains a SCAN or a temp B-tree.
+
+Usage: python benchmarks/check_query_plans.py
+"""
+
+import os
+import sys
+import tempfile
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+WORK_DIR = tempfile.mkdtemp(prefix='waifu_plans_')
+os.chdir(WORK_DIR)
+os.environ['DATABASE_PATH'] = os.path.join(WORK_DIR, 'plans.db')
+
+from database import db  # noqa: E402
+
+GROUP_ID = -1001
+USER_ID = 42
+
+# Hot paths: per group message, per /catch, per collection or search page and per stats view
+HOT_CALLS = [
+    ('get_group', lambda: db.get_group(GROUP_ID)),
+    ('create_drop', lambda: db.create_drop(GROUP_ID, 1)),
+    ('get_character_by_id', lambda: db.get_character_by_id(1)),
+    ('get_random_character', lambda: db.get_random_character('waifu')),
+    ('claim_character', lambda: db.claim_character(USER_ID, 2, GROUP_ID)),
+    ('remove_active_drop', lambda: db.remove_active_drop(GROUP_ID)),
+    ('get_user_collection_page', lambda: db.get_user_collection_page(USER_ID, limit=5)),
+    ('get_user_collection_page(after)', lambda: db.get_user_collection_page(USER_ID, after=('2100-01-01 00:00:00', 10**9))),
+    ('get_user_collection_page(before)', lambda: db.get_user_collection_page(USER_ID, before=('1970-01-01 00:00:00', 0))),
+    ('get_collection_count', lambda: db.get_collection_count(USER_ID)),
+    ('get_pending_trades', lambda: db.get_pending_trades(USER_ID)),
+    ('get_characters_by_ids', lambda: db.get_characters_by_ids([5, 3, 1])),
+    ('add_characters', lambda: db.add_characters([("Plan Import", "Plan Series", None, 'waifu', 'Common')], 0)),
+    ('get_character_count_by_gender', lambda: db.get_character_count_by_gender('waifu')),
+]
+
+BAD_PLAN_MARKERS = ('SCAN ', 'USE TEMP B-TREE')
+# INSERT ... SELECT without a FROM clause "scans" its single constant row
+HARMLESS_PLAN_STEPS = ('SCAN CONSTANT ROW',)
+
+
+def seed():
+    db.register_group(GROUP_ID)
+    for i in range(200):
+        gender = 'waifu' if i % 2 == 0 else 'husbando'
+        db.add_character(f"Plan Character {i}", "Plan Series", None, gender, 0, "Common")
+    for character_id in range(1, 50):
+        db.claim_character(USER_ID + character_id % 5, character_id, GROUP_ID)
+    db.create_drop(GROUP_ID, 1)
+    db.create_trade(USER_ID + 1, USER_ID, 3, GROUP_ID)
+
+
+def capture(call):
+    """Return the data statements a Database call executes"""
+    statements = []
+    conn = db.get_connection()
+    conn.set_trace_callback(statements.append)
+    try:
+        call()
+    finally:
+        conn.set_trace_callback(None)
+    return [
+        sql for sql in statements
+        if sql.lstrip().split(None, 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH')
+    ]
+
+
+def main():
+    seed()
+    conn = db.get_connection()
+    failures = 0
+
+    for name, call in HOT_CALLS:
+        for sql in capture(call):
+            plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+            bad = [step for step in plan if step.startswith(BAD_PLAN_MARKERS) and step not in HARMLESS_PLAN_STEPS]
+            status = 'FAIL' if bad else 'ok'
+            print(f"[{status}] {name}: {' | '.join(plan) or 'no plan'}")
+            failures += bool(bad)
+
+    if failures:
+        print(f"\n{failures} hot statement(s) scan a table or sort in a temp B-tree")
+        sys.exit(1)
+    print("\nAll hot statements use indexes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Check: a failed write leaves no open transaction behind
+
+Connections live for the whole thread, so a write that raises must roll
+back; otherwise the connection keeps its write lock (other writers then
+fail with "database is locked") and the next commit on that thread also
+commits the failed call's half-done work. Makes add_character and a
+multi-statement write fail on purpose and checks that the connection is
+clean, other threads can write at once, and nothing partial was kept.
+
+Usage: python benchmarks/check_write_rollback.py
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+# Isolate the database before the bot modules create the global instance
+WORK_DIR = tempfile.mkdtemp(prefix='waifu_rollback_')
+os.chdir(WORK_DIR)
+os.environ['DATABASE_PATH'] = os.path.join(WORK_DIR, 'rollback.db')
+
+from database import db  # noqa: E402
+
+WRITE_LIMIT = 1.0  # seconds another thread's write may take after the failure
+
+
+def write_from_other_thread():
+    """Add a character from a fresh thread (own connection); returns seconds taken or the error"""
+    result = {}
+
+    def run():
+        start = time.perf_counter()
+        try:
+            db.add_character("Other Thread", "Rollback", None, 'waifu', 0)
+            result['seconds'] = time.perf_counter() - start
+        except sqlite3.Error as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    return result
+
+
+def main():
+    failures = []
+    character_id = db.add_character("Drop Target", "Rollback", None, 'waifu', 0)
+    db.create_drop(-100, character_id)
+
+    # A CHECK constraint failure inside add_character
+    try:
+        db.add_character("Bad Gender", "Rollback", None, 'neither', 0)
+        failures.append("invalid gender was accepted")
+    except sqlite3.IntegrityError:
+        pass
+    if db.get_connection().in_transaction:
+        failures.append("failed add_character left its transaction open")
+
+    result = write_from_other_thread()
+    if 'error' in result:
+        failures.append(f"another writer failed after the error: {result['error']}")
+    elif result['seconds'] > WRITE_LIMIT:
+        failures.append(f"another writer waited {result['seconds']:.2f}s for the lock")
+
+    # create_drop fails after its DELETE; the old drop must survive
+    try:
+        db.create_drop(-100, character_id, expires_at=object())
+        failures.append("create_drop accepted an unbindable parameter")
+    except sqlite3.Error:
+        pass
+    db.set_group_mode(-1, 'waifu')  # the next commit on this thread
+    rows = db.get_connection().execute("SELECT COUNT(*) FROM active_drops WHERE group_id = -100").fetchone()[0]
+    if rows != 1:
+        failures.append(f"a failed create_drop lost the group's drop ({rows} rows left)")
+
+    if db.get_connection().execute("SELECT COUNT(*) FROM characters WHERE name = 'Bad Gender'").fetchone()[0]:
+        failures.append("a failed insert was committed later")
+
+    db.close()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("[ok] failed writes roll back and release the database")
+
+
+if __name__ == '__main__':
+    main()
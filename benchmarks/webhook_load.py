@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Load generator: POST synthetic group messages to the webhook listener
+
+Measures ingestion latency, i.e. the time until the listener acknowledges
+each update, at a given concurrency. Point it at a bot running in webhook
+mode (use a test bot token: synthetic chats do not exist, so drops fail to
+send), or pass --local to start the bot's Application in-process on a
+throwaway database with Telegram API calls answered offline (in a child
+process, so client and server do not share an event loop).
+
+Usage:
+  python benchmarks/webhook_load.py --local
+  python benchmarks/webhook_load.py --url http://127.0.0.1:8443/telegram --secret s3cret
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from urllib.parse import urlsplit
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+
+def make_update(update_id, groups):
+    """A text message in one of the synthetic groups, as Telegram would POST it"""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": -100000 - (update_id % groups), "type": "supergroup", "title": "Load test"},
+            "from": {"id": 1 + (update_id % 97), "is_bot": False, "first_name": "load"},
+            "text": f"synthetic message {update_id}",
+        },
+    }
+
+
+async def post_updates(url, secret, total, concurrency, groups):
+    """POST total updates over concurrency keep-alive connections; returns latencies in seconds
+
+    Speaks minimal HTTP/1.1 over asyncio streams: a full HTTP client costs
+    more per request than the listener being measured.
+    """
+    target = urlsplit(url)
+    host, port = target.hostname, target.port or 80
+    extra_headers = f"X-Telegram-Bot-Api-Secret-Token: {secret}\r\n" if secret else ""
+    latencies = []
+    errors = 0
+    next_id = iter(range(1, total + 1))
+
+    async def worker():
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for update_id in next_id:
+                body = json.dumps(make_update(update_id, groups)).encode()
+                request = (
+                    f"POST {target.path or '/'} HTTP/1.1\r\n"
+                    f"Host: {target.netloc}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"{extra_headers}\r\n"
+                ).encode() + body
+
+                start = time.perf_counter()
+                writer.write(request)
+                status = int((await reader.readline()).split()[1])
+                length = 0
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, _, value = line.decode().partition(':')
+                    if name.lower() == 'content-length':
+                        length = int(value)
+                if length:
+                    await reader.readexactly(length)
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    errors += 1
+        finally:
+            writer.close()
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def start_local_bot(port, secret):
+    """Run the bot's Application in-process on a temporary database; returns (url, start, stop)"""
+    work_dir = tempfile.mkdtemp(prefix='waifu_webhook_')
+    os.chdir(work_dir)
+    os.environ['DATABASE_PATH'] = os.path.join(work_dir, 'load.db')
+
+    from telegram.ext import Application
+    from telegram.request import BaseRequest
+    from database import db
+    import main as bot
+
+    class OfflineRequest(BaseRequest):
+        """Answers Bot API calls locally so no request leaves the machine"""
+
+        def __init__(self):
+            self.message_id = 0
+
+        async def initialize(self):
+            pass
+
+        async def shutdown(self):
+            pass
+
+        async def do_request(self, url, method, request_data=None, **kwargs):
+            endpoint = url.rsplit('/', 1)[-1]
+            if endpoint == 'getMe':
+                result = {"id": 1, "is_bot": True, "first_name": "Offline", "username": "offline_bot"}
+            elif endpoint.startswith('send'):
+                self.message_id += 1
+                chat_id = request_data.parameters.get('chat_id', 0) if request_data else 0
+                result = {
+                    "message_id": self.message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "supergroup"},
+                }
+            else:
+                result = True
+            return 200, json.dumps({"ok": True, "result": result}).encode()
+
+    for i in range(50):
+        gender = 'waifu' if i % 2 == 0 else 'husbando'
+        db.add_character(f"Load Character {i}", "Load Series", None, gender, 0, "Common")
+
+    builder = (
+        Application.builder()
+        .token("123456:offline")
+        .request(OfflineRequest())
+        .get_updates_request(OfflineRequest())
+    )
+    application = bot.build_application(builder)
+
+    async def start():
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+        await application.updater.start_webhook(
+            listen='127.0.0.1',
+            port=port,
+            url_path='telegram',
+            secret_token=secret,
+            allowed_updates=bot.ALLOWED_UPDATES,
+        )
+        await application.start()
+
+    async def stop():
+        # Let queued updates finish before shutting down
+        while not application.update_queue.empty():
+            await asyncio.sleep(0.05)
+        await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+    return f"http://127.0.0.1:{port}/telegram", start, stop
+
+
+async def serve(args):
+    """Run the offline bot until SIGINT/SIGTERM (the --local child process)"""
+    _, start, stop = start_local_bot(args.port, args.secret)
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopped.set)
+    await start()
+    await stopped.wait()
+    await stop()
+
+
+def spawn_local_bot(args):
+    """Start the offline bot in a child process so it does not share a loop with the client"""
+    command = [sys.executable, os.path.abspath(__file__), '--serve', '--port', str(args.port)]
+    if args.secret:
+        command += ['--secret', args.secret]
+    child = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if child.poll() is not None:
+            raise RuntimeError("local bot exited during startup")
+        try:
+            socket.create_connection(('127.0.0.1', args.port), timeout=0.5).close()
+            return child, f"http://127.0.0.1:{args.port}/telegram"
+        except OSError:
+            time.sleep(0.1)
+    child.kill()
+    raise RuntimeError("local bot did not start listening within 30s")
+
+
+def report(args, url, latencies, errors, wall):
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+    print(f"updates: {len(latencies)} to {url} ({args.concurrency} concurrent, {args.groups} groups)")
+    print(f"elapsed: {wall:.3f}s  ({len(latencies) / wall:,.0f} updates/sec, {errors} non-200)")
+    print(f"latency: mean {statistics.mean(latencies) * 1000:.2f} ms  p50 {pct(50):.2f}  "
+          f"p95 {pct(95):.2f}  p99 {pct(99):.2f}  max {latencies[-1] * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--url', default='http://127.0.0.1:8443/telegram', help='webhook URL to POST to')
+    parser.add_argument('--secret', default=None, help='value for X-Telegram-Bot-Api-Secret-Token')
+    parser.add_argument('--local', action='store_true', help='start the bot in-process with Telegram offline')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, default=8443, help='listener port for --local')
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--groups', type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.serve:
+        asyncio.run(serve(args))
+        return
+
+    url, child = args.url, None
+    if args.local:
+        child, url = spawn_local_bot(args)
+    try:
+        wall = time.perf_counter()
+        latencies, errors = asyncio.run(
+            post_updates(url, args.secret, args.updates, args.concurrency, args.groups)
+        )
+        wall = time.perf_counter() - wall
+    finally:
+        if child:
+            child.send_signal(signal.SIGINT)
+            child.wait(timeout=30)
+
+    report(args, url, latencies, errors, wall)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
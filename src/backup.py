@@ -0,0 +1,177 @@
+import gzip
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from config import (
+    DATABASE_PATH, BACKUP_DIR, BACKUP_KEEP, BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP,
+    EXPORT_DIR, EXPORT_KEEP, EXPORT_BATCH_SIZE, DB_BUSY_TIMEOUT_MS
+)
+
+logger = logging.getLogger(__name__)
+
+# Tables the exporter knows, each streamed in primary key order
+EXPORT_TABLES = ('characters', 'user_collections', 'trades')
+
+# Telegram file links stored by older versions embed the bot token
+TELEGRAM_FILE_TOKEN = re.compile(r'(https://api\.telegram\.org/file/bot)[^/]+')
+
+# Directory names written by _timestamp()
+TIMESTAMP_NAME = re.compile(r'\d{8}-\d{6}')
+
+def _open_snapshot(db_path):
+    """Open a read connection and pin one WAL snapshot until it is closed.
+
+    Readers never block writers in WAL mode. Pinning the snapshot keeps a
+    stepped backup (or a multi-table export) consistent: without it, the
+    backup restarts whenever the bot commits between two steps.
+    """
+    conn = sqlite3.connect(db_path, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+    conn.execute("BEGIN")
+    conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+    return conn
+
+def _timestamp():
+    return datetime.now().strftime('%Y%m%d-%H%M%S')
+
+class BackupResult:
+    def __init__(self, path, pages, size, seconds):
+        self.path = path
+        self.pages = pages
+        self.size = size
+        self.seconds = seconds
+
+    def summary(self):
+        return f"{self.path} ({self.size / 1024 / 1024:.1f} MB, {self.pages} pages) in {self.seconds:.2f}s"
+
+def backup_database(dest_path=None, db_path=DATABASE_PATH, pages=BACKUP_PAGES_PER_STEP,
+                    sleep=BACKUP_STEP_SLEEP, keep=BACKUP_KEEP):
+    """Copy the live database to dest_path (default: a timestamped file in BACKUP_DIR).
+
+    The copy is made page-step by page-step with SQLite's online backup API
+    and sleeps between steps, so writers keep going. It is written to a
+    .partial file first and only renamed into place once complete.
+    """
+    if dest_path is None:
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        name = os.path.splitext(os.path.basename(db_path))[0]
+        dest_path = os.path.join(BACKUP_DIR, f"{name}-{_timestamp()}.db")
+        rotate = True
+    else:
+        rotate = False
+
+    partial_path = dest_path + '.partial'
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+
+    start = time.perf_counter()
+    progress = {'total': 0}
+
+    def on_step(status, remaining, total):
+        progress['total'] = total
+
+    source = _open_snapshot(db_path)
+    target = sqlite3.connect(partial_path)
+    try:
+        source.backup(target, pages=pages, progress=on_step, sleep=sleep)
+        # A standalone file is easier to copy around than one with a -wal beside it
+        target.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        target.close()
+        source.close()
+
+    os.replace(partial_path, dest_path)
+    result = BackupResult(dest_path, progress['total'], os.path.getsize(dest_path), time.perf_counter() - start)
+    logger.info(f"Database backup written to {result.summary()}")
+
+    if rotate:
+        prune_backups(name, keep)
+    return result
+
+def prune_backups(name, keep=BACKUP_KEEP, backup_dir=BACKUP_DIR):
+    """Delete all but the newest `keep` timestamped backups of a database (0 keeps all)"""
+    if keep <= 0:
+        return
+    backups = sorted(
+        entry for entry in os.listdir(backup_dir)
+        if entry.startswith(f"{name}-") and entry.endswith('.db')
+    )
+    for entry in backups[:-keep]:
+        os.remove(os.path.join(backup_dir, entry))
+        logger.info(f"Removed old backup {entry}")
+
+def prune_exports(keep=EXPORT_KEEP, export_dir=EXPORT_DIR):
+    """Delete all but the newest `keep` timestamped export directories (0 keeps all)"""
+    if keep <= 0:
+        return
+    exports = sorted(
+        entry for entry in os.listdir(export_dir)
+        if TIMESTAMP_NAME.fullmatch(entry) and os.path.isdir(os.path.join(export_dir, entry))
+    )
+    for entry in exports[:-keep]:
+        shutil.rmtree(os.path.join(export_dir, entry))
+        logger.info(f"Removed old export {entry}")
+
+def export_table(conn, table, stream, batch_size=EXPORT_BATCH_SIZE):
+    """Write every row of a table to a text stream as JSON lines; returns the row count"""
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown table {table!r}; expected one of {', '.join(EXPORT_TABLES)}")
+
+    cursor = conn.execute(f"SELECT * FROM {table} ORDER BY id")
+    columns = [column[0] for column in cursor.description]
+    redact = 'image_url' in columns
+
+    def encode(row):
+        record = dict(zip(columns, row))
+        if redact and record['image_url']:
+            record['image_url'] = TELEGRAM_FILE_TOKEN.sub(r'\1<redacted>', record['image_url'])
+        return json.dumps(record, ensure_ascii=False) + "\n"
+
+    rows = 0
+    # fetchmany keeps at most one batch in memory however large the table is
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        stream.writelines(encode(row) for row in batch)
+        rows += len(batch)
+    return rows
+
+def export_database(out_dir=None, tables=EXPORT_TABLES, db_path=DATABASE_PATH,
+                    compress=False, batch_size=EXPORT_BATCH_SIZE, keep=EXPORT_KEEP):
+    """Export tables to <out_dir>/<table>.jsonl[.gz] from one consistent snapshot.
+
+    Without out_dir the export goes to a timestamped directory in EXPORT_DIR,
+    where only the newest `keep` are kept. Returns a list of (table, path, rows).
+    """
+    if out_dir is None:
+        out_dir = os.path.join(EXPORT_DIR, _timestamp())
+        rotate = True
+    else:
+        rotate = False
+    os.makedirs(out_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    written = []
+    conn = _open_snapshot(db_path)
+    try:
+        for table in tables:
+            path = os.path.join(out_dir, f"{table}.jsonl" + ('.gz' if compress else ''))
+            opener = gzip.open if compress else open
+            with opener(path, 'wt', encoding='utf-8') as stream:
+                rows = export_table(conn, table, stream, batch_size)
+            written.append((table, path, rows))
+    finally:
+        conn.close()
+
+    logger.info(
+        f"Exported {', '.join(f'{rows} {table}' for table, _, rows in written)} "
+        f"to {out_dir} in {time.perf_counter() - start:.2f}s"
+    )
+    if rotate:
+        prune_exports(keep)
+    return written
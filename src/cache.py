@@ -0,0 +1,78 @@
+import time
+from collections import OrderedDict
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entry when full.
+    
+    Not thread-safe; meant for state owned by the event loop.
+    """
+    
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def __len__(self):
+        return len(self._data)
+    
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+    
+    def clear(self):
+        self._data.clear()
+
+class TTLCache(LRUCache):
+    """LRU cache whose entries also expire `ttl` seconds after they were last used.
+    
+    Expired entries are dropped when looked up and swept from the old end
+    on every put, so the cache never holds more than `maxsize` entries.
+    """
+    
+    def __init__(self, maxsize, ttl, clock=time.monotonic):
+        super().__init__(maxsize)
+        self.ttl = ttl
+        self._clock = clock
+        self.expired = 0
+    
+    def get(self, key, default=None):
+        entry = super().get(key)
+        if entry is None:
+            return default
+        
+        value, expires_at = entry
+        now = self._clock()
+        if now >= expires_at:
+            del self._data[key]
+            self.hits -= 1
+            self.misses += 1
+            self.expired += 1
+            return default
+        
+        # Using an entry extends its life
+        self._data[key] = (value, now + self.ttl)
+        return value
+    
+    def put(self, key, value):
+        now = self._clock()
+        super().put(key, (value, now + self.ttl))
+        # Entries are ordered by last use, so expired ones sit at the old end
+        while self._data:
+            oldest = next(iter(self._data))
+            if self._data[oldest][1] > now:
+                break
+            del self._data[oldest]
+            self.expired += 1
@@ -0,0 +1,105 @@
+"""Command-line maintenance tools for the bot's database.
+
+Usage:
+    python src/cli.py import catalog.csv
+    python src/cli.py import - --format jsonl < catalog.jsonl
+    python src/cli.py import --samples
+    python src/cli.py backup [dest.db]
+    python src/cli.py export [--out DIR] [--gzip] [characters user_collections trades]
+"""
+
+import argparse
+import logging
+import sys
+import time
+from database import db
+from importer import FORMATS, detect_format, import_records, import_stream
+from backup import EXPORT_TABLES, backup_database, export_database
+from config import IMPORT_CHUNK_SIZE, OWNER_USER_ID, BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP
+
+def cmd_import(args):
+    """Bulk-import characters from a CSV/JSONL catalog or the bundled samples"""
+    start = time.perf_counter()
+    if args.samples:
+        from characters import SAMPLE_CHARACTERS
+        records = ((i, record) for i, record in enumerate(SAMPLE_CHARACTERS, 1))
+        report = import_records(records, args.added_by, chunk_size=args.chunk_size)
+    elif args.path:
+        fmt = args.format or detect_format(args.path)
+        if fmt is None:
+            print(f"Cannot tell the format of {args.path}; pass --format", file=sys.stderr)
+            return 2
+        if args.path == '-':
+            report = import_stream(sys.stdin, fmt, args.added_by, chunk_size=args.chunk_size)
+        else:
+            try:
+                # utf-8-sig drops the byte order mark spreadsheet exports add
+                with open(args.path, encoding='utf-8-sig', newline='') as stream:
+                    report = import_stream(stream, fmt, args.added_by, chunk_size=args.chunk_size)
+            except OSError as e:
+                print(f"Cannot read {args.path}: {e.strerror}", file=sys.stderr)
+                return 1
+    else:
+        print("Give a catalog file (or - for stdin) or --samples", file=sys.stderr)
+        return 2
+
+    print(report.summary())
+    print(f"Done in {time.perf_counter() - start:.2f}s; catalog now has {db.get_total_character_count()} characters")
+    return 0
+
+def cmd_backup(args):
+    """Copy the live database with SQLite's online backup API"""
+    result = backup_database(args.dest, pages=args.pages, sleep=args.sleep)
+    print(f"Backup written to {result.summary()}")
+    return 0
+
+def cmd_export(args):
+    """Stream tables to JSONL files from one consistent snapshot"""
+    unknown = [table for table in args.tables if table not in EXPORT_TABLES]
+    if unknown:
+        print(f"Unknown table(s) {', '.join(unknown)}; expected {', '.join(EXPORT_TABLES)}", file=sys.stderr)
+        return 2
+
+    start = time.perf_counter()
+    written = export_database(args.out, tables=args.tables or EXPORT_TABLES, compress=args.gzip)
+    for table, path, rows in written:
+        print(f"{table}: {rows} rows -> {path}")
+    print(f"Done in {time.perf_counter() - start:.2f}s")
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Waifu bot maintenance tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    importer = commands.add_parser('import', help=cmd_import.__doc__)
+    importer.add_argument('path', nargs='?', help="CSV or JSONL catalog, or - for stdin")
+    importer.add_argument('--format', choices=FORMATS, help="default: from the file extension")
+    importer.add_argument('--samples', action='store_true', help="import the bundled sample characters")
+    importer.add_argument('--added-by', type=int, default=OWNER_USER_ID, help="user ID recorded as the adder")
+    importer.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help="rows per transaction")
+    importer.set_defaults(func=cmd_import)
+
+    backup = commands.add_parser('backup', help=cmd_backup.__doc__)
+    backup.add_argument('dest', nargs='?', help="backup file (default: timestamped file in BACKUP_DIR)")
+    backup.add_argument('--pages', type=int, default=BACKUP_PAGES_PER_STEP, help="pages copied per step")
+    backup.add_argument('--sleep', type=float, default=BACKUP_STEP_SLEEP, help="seconds between steps")
+    backup.set_defaults(func=cmd_backup)
+
+    export = commands.add_parser('export', help=cmd_export.__doc__)
+    export.add_argument('tables', nargs='*', help=f"any of {', '.join(EXPORT_TABLES)} (default: all)")
+    export.add_argument('--out', help="output directory (default: timestamped directory in EXPORT_DIR)")
+    export.add_argument('--gzip', action='store_true', help="write .jsonl.gz files")
+    export.set_defaults(func=cmd_export)
+
+    return parser
+
+def main(argv=None):
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.WARNING)
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
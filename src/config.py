@@ -4,17 +4,99 @@ import os
 BOT_TOKEN = os.getenv("BOT_TOKEN", "your_bot_token_here")
 
 # Database configuration
-DATABASE_PATH = "waifu_bot.db"
+DATABASE_PATH = os.getenv("DATABASE_PATH", "waifu_bot.db")
+
+# SQLite connection tuning (applied once per persistent connection)
+DB_BUSY_TIMEOUT_MS = 5000  # Wait this long for a competing writer before failing
+DB_CACHE_SIZE_KB = 16384  # Page cache per connection (16 MB)
+DB_MMAP_SIZE = 64 * 1024 * 1024  # Memory-map up to 64 MB of the database file
+DB_STATEMENT_CACHE_SIZE = 256  # Prepared statements kept per connection
+
+# Async database facade (handlers never touch SQLite on the event loop)
+DB_MAX_WORKERS = 4  # Threads running database calls
+DB_MAX_PENDING = 256  # Queued calls allowed before callers wait (backpressure)
+
+# Update delivery: long polling unless WEBHOOK_URL is set, in which case the
+# bot listens on WEBHOOK_LISTEN:WEBHOOK_PORT/WEBHOOK_PATH (put it behind an
+# HTTPS reverse proxy). Webhook mode needs python-telegram-bot[webhooks].
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # Public base URL, e.g. https://bot.example.com
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None  # Checked against X-Telegram-Bot-Api-Secret-Token
+
+# Update processing: updates from different chats run concurrently, while
+# updates from the same chat are handled one at a time in arrival order.
+# Only running updates take a slot; updates queued behind their chat do not.
+MAX_CONCURRENT_UPDATES = 256
+
+# Outbound messages go through a rate-limited queue that stays under
+# Telegram's flood limits (about 30 messages/s overall, 1/s per private
+# chat and 20/min per group)
+OUTBOUND_GLOBAL_RATE = 25  # Messages per second across all chats
+OUTBOUND_GLOBAL_BURST = 30
+OUTBOUND_PRIVATE_RATE = 1.0  # Messages per second per private chat
+OUTBOUND_PRIVATE_BURST = 3
+OUTBOUND_GROUP_RATE = 20 / 60  # Messages per second per group
+OUTBOUND_GROUP_BURST = 5
+OUTBOUND_LOW_PRIORITY_RESERVE = 5  # Global tokens low-priority edits must leave for drops and replies
+OUTBOUND_MAX_RETRIES = 3  # Retries after a 429 before a message is dropped
+
+# Background check of character pictures (new ones right after /addchar,
+# unchecked ones on startup and then every IMAGE_CHECK_SWEEP_INTERVAL)
+IMAGE_CHECK_CONCURRENCY = 4  # Pictures fetched at the same time
+IMAGE_CHECK_TIMEOUT = 10  # Seconds per request
+IMAGE_CHECK_BATCH_SIZE = 100  # Characters read from the database per batch
+IMAGE_CHECK_SWEEP_INTERVAL = 6 * 3600
+IMAGE_MAX_BYTES = 5 * 1024 * 1024  # Telegram's limit for photos sent by URL
 
 # Waifu/Husbando Bot Configuration
 DEFAULT_WAIFU_LIMIT = 10  # Default messages before character drop
 DEFAULT_GROUP_MODE = "waifu"  # Default group mode
 CATCH_TIMEOUT = 30  # Seconds to catch a character before timeout
 
+# Message counters live in memory and are written to the groups table every
+# MESSAGE_COUNT_FLUSH_INTERVAL seconds (and on shutdown). After a crash at
+# most this many seconds of counted messages are lost, which only delays
+# the next drop in the affected groups.
+MESSAGE_COUNT_FLUSH_INTERVAL = 5
+
 # Character drop settings
 MIN_MESSAGES_FOR_DROP = 5
 MAX_MESSAGES_FOR_DROP = 15
 
+# Rendered /mycollection pages kept in memory (keyed by collection version,
+# so claims, trades and grants make old entries unreachable)
+COLLECTION_PAGE_CACHE_SIZE = 2048
+
+# Character search
+SEARCH_NAME_WEIGHT = 10.0  # BM25 weight of a name match relative to a series match
+SEARCH_SERIES_WEIGHT = 1.0
+SEARCH_MAX_RESULTS = 200  # ranked results kept per /search
+SEARCH_PAGE_SIZE = 5
+# Search sessions (ranked result IDs per /search) held for paging
+SEARCH_SESSION_TTL = 15 * 60  # seconds since the session was last used
+SEARCH_SESSION_LIMIT = 1000  # oldest sessions are evicted beyond this
+
+# Bulk character import (/import and cli.py import)
+IMPORT_CHUNK_SIZE = 5000  # rows per transaction
+IMPORT_MAX_ERRORS = 20  # invalid rows listed in the report
+
+# Backups (/backup and cli.py backup): SQLite online backup, copied in page steps
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_KEEP = 7  # newest backups kept in BACKUP_DIR
+BACKUP_PAGES_PER_STEP = 256  # pages copied per step (1 MB at the default page size)
+BACKUP_STEP_SLEEP = 0.005  # seconds between steps
+
+# JSONL exports (/export and cli.py export)
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_KEEP = BACKUP_KEEP  # newest timestamped exports kept in EXPORT_DIR
+EXPORT_BATCH_SIZE = 1000  # rows fetched per batch
+
+# Prometheus-style metrics endpoint (http://METRICS_LISTEN:METRICS_PORT/metrics); port 0 disables it
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
 # Admin permissions
 REQUIRED_ADMIN_PERMISSIONS = ['can_change_info', 'can_delete_messages', 'can_restrict_members']
 
@@ -49,6 +131,8 @@ TRADE_TIMEOUT = 300  # 5 minutes for trade to be accepted/declined
 
 # Character drop settings
 DROP_TIMEOUT = 180  # 180 seconds (3 minutes) to catch a character
+DROP_EXPIRY_BATCH_WINDOW = 1.0  # Drops may outlive their deadline by this much so neighbours expire together
+DROP_EXPIRY_BATCH_SIZE = 500  # Max drops removed per transaction
 CATCH_SIMILARITY_THRESHOLD = 0.8  # How similar the name needs to be
 
 # Owner user ID (can manage special users and ban/unban)
@@ -1,208 +1,342 @@
 import sqlite3
 import threading
 import random
-from datetime import datetime, timedelta
-from config import DATABASE_PATH, DEFAULT_WAIFU_LIMIT, DEFAULT_GROUP_MODE
+import re
+import asyncio
+import time
+import itertools
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from migrations import apply_migrations
+from matcher import CatchMatcher
+from metrics import TimedLock, instrument_methods, db_queue_wait_seconds
+from datetime import datetime, timezone
+from config import (
+    DATABASE_PATH, DEFAULT_WAIFU_LIMIT, DEFAULT_GROUP_MODE,
+    DB_BUSY_TIMEOUT_MS, DB_CACHE_SIZE_KB, DB_MMAP_SIZE, DB_STATEMENT_CACHE_SIZE,
+    DB_MAX_WORKERS, DB_MAX_PENDING, SEARCH_NAME_WEIGHT, SEARCH_SERIES_WEIGHT,
+    SEARCH_MAX_RESULTS
+)
 
 class Database:
-    def __init__(self):
-        self.lock = threading.Lock()
+    def __init__(self, db_path=None):
+        self.db_path = db_path or DATABASE_PATH
+        # Serializes writers; readers use their own WAL snapshot and skip it.
+        # Time spent waiting for it is reported per method (see metrics.py)
+        self.lock = TimedLock()
+        # One long-lived connection per thread, opened lazily
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        # Write-behind message counters: group_id -> count, flushed in batches
+        self._message_counts = {}
+        self._dirty_counts = set()
+        self._counts_lock = threading.Lock()
+        # Write-through cache of groups rows (mode, waifu_limit, last_drop, ...)
+        self._groups = {}
+        # Character IDs per gender so a random drop is one index lookup
+        self._character_ids = {}
+        # Highest character ID; grants are skipped while it is unchanged
+        self.catalog_version = 0
+        self._granted_catalog_versions = {}
+        # Per-user collection versions, all drawn from one increasing counter.
+        # Any change to what a user's collection pages show bumps the version,
+        # so rendered pages can be cached under it. Users not in the map are
+        # at the floor, which rises when every collection is invalidated.
+        self._collection_versions = {}
+        self._collection_version_floor = 0
+        self._collection_version_counter = itertools.count(1)
+        # Mirrors of banned_users / special_users for O(1) membership checks
+        self._banned_ids = set()
+        self._special_ids = set()
+        # Authoritative active drops by group_id; the table is write-through storage
+        self._active_drops = {}
         self.init_database()
+        self.load_character_index()
+        self.load_user_sets()
+        self.load_active_drops()
     
     def get_connection(self):
-        """Get database connection with proper configuration"""
-        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        """Get this thread's persistent database connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open_connection()
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    def _open_connection(self):
+        """Open a connection with WAL journaling and tuned pragmas"""
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            cached_statements=DB_STATEMENT_CACHE_SIZE
+        )
         conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        # NORMAL is durable across application crashes in WAL mode
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {int(DB_BUSY_TIMEOUT_MS)}")
+        conn.execute(f"PRAGMA cache_size = -{int(DB_CACHE_SIZE_KB)}")
+        conn.execute(f"PRAGMA mmap_size = {int(DB_MMAP_SIZE)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
         return conn
     
+    def close(self):
+        """Flush pending counters and close every connection opened by this instance"""
+        self.flush_message_counts()
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+    
+    @contextmanager
+    def _transaction(self):
+        """Yield a cursor for one write transaction (caller holds the writer lock).
+        
+        Commits when the block finishes and rolls back if it raises, so this
+        thread's long-lived connection never carries a failed call's partial
+        work, or its hold on the database file, into the next call.
+        """
+        conn = self.get_connection()
+        try:
+            yield conn.cursor()
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    
     def init_database(self):
-        """Initialize database tables"""
+        """Initialize database tables by applying pending schema migrations"""
         with self.lock:
             conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Groups table - stores group settings
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS groups (
-                    group_id INTEGER PRIMARY KEY,
-                    mode TEXT CHECK(mode IN ('waifu', 'husbando')) DEFAULT 'waifu',
-                    waifu_limit INTEGER DEFAULT 10,
-                    message_count INTEGER DEFAULT 0,
-                    last_drop TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Characters table - OuraDB format
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS characters (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    series_name TEXT NOT NULL,
-                    image_url TEXT,
-                    gender TEXT CHECK(gender IN ('waifu', 'husbando')) NOT NULL,
-                    added_by INTEGER,
-                    rarity TEXT DEFAULT 'Common',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # User collections - claimed characters with counts
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS user_collections (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    character_id INTEGER NOT NULL,
-                    group_id INTEGER NOT NULL,
-                    count INTEGER DEFAULT 1,
-                    first_claimed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_claimed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (character_id) REFERENCES characters (id),
-                    UNIQUE(user_id, character_id)
-                )
-            ''')
-            
-            # Trading table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS trades (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    from_user_id INTEGER NOT NULL,
-                    to_user_id INTEGER NOT NULL,
-                    character_id INTEGER NOT NULL,
-                    group_id INTEGER NOT NULL,
-                    status TEXT CHECK(status IN ('pending', 'accepted', 'rejected', 'cancelled')) DEFAULT 'pending',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    completed_at TIMESTAMP,
-                    FOREIGN KEY (character_id) REFERENCES characters (id)
-                )
-            ''')
-            
-            # Character drops (active drops waiting to be caught)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS active_drops (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    group_id INTEGER NOT NULL,
-                    character_id INTEGER NOT NULL,
-                    message_id INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (character_id) REFERENCES characters (id)
-                )
-            ''')
-            
-            # Special users table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS special_users (
-                    user_id INTEGER PRIMARY KEY,
-                    username TEXT,
-                    added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+            apply_migrations(conn)
             
-            # Banned users table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS banned_users (
-                    user_id INTEGER PRIMARY KEY,
-                    username TEXT,
-                    reason TEXT,
-                    banned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            conn.commit()
-            conn.close()
+            # The FTS5 search index is skipped on SQLite builds without FTS5
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'characters_fts'")
+            self.fts_enabled = cursor.fetchone() is not None
     
     # GROUP MANAGEMENT
     def register_group(self, group_id, mode=None):
-        """Register a new group or update existing group"""
+        """Register a new group or update existing group; returns the group row"""
         with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO groups (group_id, mode, waifu_limit, message_count, created_at)
-                VALUES (?, ?, ?, 
-                    COALESCE((SELECT message_count FROM groups WHERE group_id = ?), 0),
-                    COALESCE((SELECT created_at FROM groups WHERE group_id = ?), CURRENT_TIMESTAMP))
-            ''', (group_id, mode or DEFAULT_GROUP_MODE, DEFAULT_WAIFU_LIMIT, group_id, group_id))
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO groups (group_id, mode, waifu_limit, message_count, created_at)
+                    VALUES (?, ?, ?, 
+                        COALESCE((SELECT message_count FROM groups WHERE group_id = ?), 0),
+                        COALESCE((SELECT created_at FROM groups WHERE group_id = ?), CURRENT_TIMESTAMP))
+                ''', (group_id, mode or DEFAULT_GROUP_MODE, DEFAULT_WAIFU_LIMIT, group_id, group_id))
             
-            conn.commit()
-            conn.close()
+            self._load_group(cursor, group_id)
+        
+        return self.get_group(group_id)
+    
+    def _load_group(self, cursor, group_id):
+        """Read a groups row into the cache (caller holds the writer lock)"""
+        cursor.execute("SELECT * FROM groups WHERE group_id = ?", (group_id,))
+        group = cursor.fetchone()
+        if not group:
+            self._groups.pop(group_id, None)
+            return None
+        
+        group = dict(group)
+        self._groups[group_id] = group
+        return group
     
     def get_group(self, group_id):
-        """Get group information"""
-        with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT * FROM groups WHERE group_id = ?", (group_id,))
-            group = cursor.fetchone()
-            
-            conn.close()
-            return dict(group) if group else None
+        """Get group information (served from the cache after the first read)"""
+        group = self._groups.get(group_id)
+        if group is None:
+            # Fill under the writer lock so a concurrent update cannot be overwritten
+            with self.lock:
+                group = self._groups.get(group_id) or self._load_group(self.get_connection().cursor(), group_id)
+            if group is None:
+                return None
+        
+        group = dict(group)
+        # The in-memory counter is authoritative; seed it from the row once
+        with self._counts_lock:
+            group['message_count'] = self._message_counts.setdefault(group_id, group['message_count'] or 0)
+        return group
+    
+    def peek_group(self, group_id):
+        """Get group information only if it is already cached (never touches the database)"""
+        if group_id not in self._groups:
+            return None
+        return self.get_group(group_id)
+    
+    def _update_cached_group(self, group_id, **fields):
+        """Apply a committed change to the cached group row, if cached"""
+        group = self._groups.get(group_id)
+        if group is not None:
+            # Swap in a new dict so readers never see a half-updated row
+            self._groups[group_id] = {**group, **fields}
     
     def set_group_mode(self, group_id, mode):
         """Set group mode (waifu/husbando)"""
         with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("UPDATE groups SET mode = ? WHERE group_id = ?", (mode, group_id))
-            conn.commit()
-            conn.close()
+            with self._transaction() as cursor:
+                cursor.execute("UPDATE groups SET mode = ? WHERE group_id = ?", (mode, group_id))
+            self._update_cached_group(group_id, mode=mode)
     
     def set_waifu_limit(self, group_id, limit):
         """Set waifu limit for group"""
         with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("UPDATE groups SET waifu_limit = ? WHERE group_id = ?", (limit, group_id))
-            conn.commit()
-            conn.close()
+            with self._transaction() as cursor:
+                cursor.execute("UPDATE groups SET waifu_limit = ? WHERE group_id = ?", (limit, group_id))
+            self._update_cached_group(group_id, waifu_limit=limit)
     
     def increment_message_count(self, group_id):
-        """Increment message count for group"""
-        with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("UPDATE groups SET message_count = message_count + 1 WHERE group_id = ?", (group_id,))
-            conn.commit()
-            conn.close()
+        """Increment message count for group in memory and return the new count.
+        
+        Pure in-memory operation; the count is persisted by
+        flush_message_counts (see MESSAGE_COUNT_FLUSH_INTERVAL).
+        """
+        with self._counts_lock:
+            count = self._message_counts.get(group_id, 0) + 1
+            self._message_counts[group_id] = count
+            self._dirty_counts.add(group_id)
+            return count
+    
+    def flush_message_counts(self):
+        """Write pending in-memory message counts to the groups table"""
+        with self.lock:
+            with self._counts_lock:
+                if not self._dirty_counts:
+                    return 0
+                pending = [(self._message_counts[group_id], group_id) for group_id in self._dirty_counts]
+                self._dirty_counts.clear()
+            
+            try:
+                with self._transaction() as cursor:
+                    cursor.executemany("UPDATE groups SET message_count = ? WHERE group_id = ?", pending)
+            except sqlite3.Error:
+                # Keep the counts dirty so the next flush retries them
+                with self._counts_lock:
+                    self._dirty_counts.update(group_id for _, group_id in pending)
+                raise
+            return len(pending)
     
     def reset_message_count(self, group_id):
         """Reset message count for group"""
         with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self._counts_lock:
+                self._message_counts[group_id] = 0
+                self._dirty_counts.discard(group_id)
             
-            cursor.execute("UPDATE groups SET message_count = 0, last_drop = CURRENT_TIMESTAMP WHERE group_id = ?", (group_id,))
-            conn.commit()
-            conn.close()
+            # Same format as CURRENT_TIMESTAMP, computed here so the cache matches the row
+            last_drop = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+            with self._transaction() as cursor:
+                cursor.execute("UPDATE groups SET message_count = 0, last_drop = ? WHERE group_id = ?", (last_drop, group_id))
+            self._update_cached_group(group_id, last_drop=last_drop)
     
     # CHARACTER MANAGEMENT
-    def add_character(self, name, series_name, image_url, gender, added_by, rarity="Common"):
+    def add_character(self, name, series_name, image_url, gender, added_by, rarity="Common", image_file_id=None):
         """Add a new character to the database"""
         # Clean name by removing bot tags
         clean_name = self._clean_character_name(name)
         
         with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO characters (name, series_name, image_url, gender, added_by, rarity)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (clean_name, series_name, image_url, gender, added_by, rarity))
-            
-            character_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    INSERT INTO characters (name, series_name, image_url, gender, added_by, rarity, image_file_id, image_status)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (clean_name, series_name, image_url, gender, added_by, rarity,
+                      image_file_id, 'ok' if image_file_id else None))
+                character_id = cursor.lastrowid
+            
+            # Indexes this character and any another process added before it
+            self._index_new_characters(cursor)
             return character_id
     
+    def add_characters(self, rows, added_by):
+        """Insert a chunk of (name, series_name, image_url, gender, rarity) rows in one transaction.
+        
+        Rows whose cleaned name and series already exist are skipped.
+        Returns how many were inserted.
+        """
+        rows = [
+            (self._clean_character_name(name), series_name, image_url, gender, added_by, rarity)
+            for name, series_name, image_url, gender, rarity in rows
+        ]
+        
+        with self.lock:
+            with self._transaction() as cursor:
+                # Take the write lock first so no other writer can add IDs in between
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM characters")
+                previous_max = cursor.fetchone()[0]
+                if self.fts_enabled:
+                    # Skip the per-row FTS trigger; the chunk is indexed below in one statement
+                    cursor.execute("INSERT INTO characters_fts_deferred (flag) VALUES (1)")
+                
+                cursor.executemany('''
+                    INSERT INTO characters (name, series_name, image_url, gender, added_by, rarity)
+                    SELECT ?1, ?2, ?3, ?4, ?5, ?6
+                    WHERE NOT EXISTS (SELECT 1 FROM characters WHERE name = ?1 AND series_name = ?2)
+                ''', rows)
+                inserted = cursor.rowcount
+                
+                if self.fts_enabled:
+                    cursor.execute("DELETE FROM characters_fts_deferred")
+                    cursor.execute('''
+                        INSERT INTO characters_fts (rowid, name, series_name)
+                        SELECT id, name, series_name FROM characters WHERE id > ?
+                    ''', (previous_max,))
+            
+            # Index the new characters (and any another process added) for random drops
+            self._index_new_characters(cursor)
+            return inserted
+    
+    def set_character_file_id(self, character_id, file_id):
+        """Remember the Telegram file_id of a character's picture after a successful send"""
+        with self.lock, self._transaction() as cursor:
+            cursor.execute(
+                "UPDATE characters SET image_file_id = ?, image_status = 'ok' WHERE id = ?",
+                (file_id, character_id)
+            )
+    
+    def mark_character_image_broken(self, character_id):
+        """Stop sending a picture Telegram refused (the character is shown as text)"""
+        with self.lock, self._transaction() as cursor:
+            cursor.execute(
+                "UPDATE characters SET image_file_id = NULL, image_status = 'broken' WHERE id = ?",
+                (character_id,)
+            )
+    
+    def get_characters_needing_image_check(self, after_id=0, limit=100):
+        """Characters with a picture URL that was never checked or sent, in id order after after_id"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, image_url FROM characters
+            WHERE id > ? AND image_url IS NOT NULL AND image_file_id IS NULL
+              AND image_checked_at IS NULL AND image_status IS NULL
+              AND image_url NOT LIKE 'https://api.telegram.org/file/%'
+            ORDER BY id LIMIT ?
+        ''', (after_id, limit))
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def record_image_check(self, character_id, status, content_type, size):
+        """Store the result of a background picture check ('ok' or 'broken')"""
+        with self.lock, self._transaction() as cursor:
+            # A picture Telegram already accepted keeps its file_id and status
+            cursor.execute('''
+                UPDATE characters
+                SET image_status = CASE WHEN image_file_id IS NULL THEN ? ELSE image_status END,
+                    image_content_type = ?, image_size = ?, image_checked_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (status, content_type, size, character_id))
+    
     def _clean_character_name(self, name):
         """Clean character name by removing bot tags and unwanted text"""
-        import re
         # Remove bot mentions like @YourWaifuGotchaBot
         clean_name = re.sub(r'@\w+', '', name)
         # Remove extra spaces and clean up
@@ -211,438 +345,674 @@ class Database:
     
     def get_character_by_id(self, character_id):
         """Get character information by ID"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT * FROM characters WHERE id = ?", (character_id,))
+        character = cursor.fetchone()
+        
+        return dict(character) if character else None
+    
+    def load_character_index(self):
+        """Load the per-gender character ID arrays used for random drops"""
+        # Hold the writer lock so a concurrent add_character is not lost
         with self.lock:
             conn = self.get_connection()
             cursor = conn.cursor()
             
-            cursor.execute("SELECT * FROM characters WHERE id = ?", (character_id,))
-            character = cursor.fetchone()
+            index = {}
+            cursor.execute("SELECT id, gender FROM characters ORDER BY id")
+            for character_id, gender in cursor:
+                index.setdefault(gender, []).append(character_id)
             
-            conn.close()
-            return dict(character) if character else None
+            self._character_ids = index
+            self.catalog_version = max((ids[-1] for ids in index.values() if ids), default=0)
+    
+    def _index_new_characters(self, cursor):
+        """Append characters above catalog_version to the drop index (caller holds the writer lock)"""
+        cursor.execute("SELECT id, gender FROM characters WHERE id > ? ORDER BY id", (self.catalog_version,))
+        rows = cursor.fetchall()
+        for character_id, gender in rows:
+            self._character_ids.setdefault(gender, []).append(character_id)
+        if rows:
+            self.catalog_version = rows[-1][0]
+        return len(rows)
+    
+    def refresh_character_index(self):
+        """Index characters another process added (e.g. cli.py import); returns how many.
+        
+        Costs one MAX(id) lookup when nothing is new; called from main's
+        periodic flush loop so drops only read the in-memory index.
+        """
+        conn = self.get_connection()
+        latest = conn.execute("SELECT MAX(id) FROM characters").fetchone()[0] or 0
+        if latest <= self.catalog_version:
+            return 0
+        with self.lock:
+            return self._index_new_characters(conn.cursor())
     
     def get_random_character(self, gender):
         """Get random character by gender (includes all characters)"""
-        with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT * FROM characters WHERE gender = ? ORDER BY RANDOM() LIMIT 1", (gender,))
-            character = cursor.fetchone()
-            
-            conn.close()
-            return dict(character) if character else None
+        ids = self._character_ids.get(gender)
+        while ids:
+            character = self.get_character_by_id(random.choice(ids))
+            if character:
+                return character
+            
+            # Deleted outside the bot; rebuild the index and try again
+            self.load_character_index()
+            ids = self._character_ids.get(gender)
+        
+        return None
     
     def search_characters(self, query, limit=10):
-        """Search characters by name or series"""
-        with self.lock:
+        """Search characters by name or series (BM25-ranked prefix search with FTS5)"""
+        if self.fts_enabled:
+            match = self._fts_match_expression(query)
+            if not match:
+                return []
+            
             conn = self.get_connection()
             cursor = conn.cursor()
             
             cursor.execute('''
-                SELECT * FROM characters 
-                WHERE name LIKE ? OR series_name LIKE ? 
+                SELECT c.* FROM characters_fts
+                JOIN characters c ON c.id = characters_fts.rowid
+                WHERE characters_fts MATCH ?
+                ORDER BY bm25(characters_fts, ?, ?), c.id
+                LIMIT ?
+            ''', (match, SEARCH_NAME_WEIGHT, SEARCH_SERIES_WEIGHT, limit))
+            
+            return [dict(char) for char in cursor.fetchall()]
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT * FROM characters 
+            WHERE name LIKE ? OR series_name LIKE ? 
+            ORDER BY name LIMIT ?
+        ''', (f'%{query}%', f'%{query}%', limit))
+        
+        characters = cursor.fetchall()
+        return [dict(char) for char in characters]
+    
+    def search_character_ids(self, query, limit=SEARCH_MAX_RESULTS):
+        """Ranked IDs of the characters matching a search (same order as search_characters)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        if self.fts_enabled:
+            match = self._fts_match_expression(query)
+            if not match:
+                return []
+            
+            # rowid is the character ID; no join needed to rank
+            cursor.execute('''
+                SELECT rowid FROM characters_fts
+                WHERE characters_fts MATCH ?
+                ORDER BY bm25(characters_fts, ?, ?), rowid
+                LIMIT ?
+            ''', (match, SEARCH_NAME_WEIGHT, SEARCH_SERIES_WEIGHT, limit))
+        else:
+            cursor.execute('''
+                SELECT id FROM characters
+                WHERE name LIKE ? OR series_name LIKE ?
                 ORDER BY name LIMIT ?
             ''', (f'%{query}%', f'%{query}%', limit))
-            
-            characters = cursor.fetchall()
-            conn.close()
-            return [dict(char) for char in characters]
+        
+        return [row[0] for row in cursor.fetchall()]
+    
+    def get_characters_by_ids(self, character_ids):
+        """Characters for a list of IDs, in the order given (missing IDs are skipped)"""
+        if not character_ids:
+            return []
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        placeholders = ','.join('?' * len(character_ids))
+        cursor.execute(f"SELECT * FROM characters WHERE id IN ({placeholders})", list(character_ids))
+        by_id = {row['id']: dict(row) for row in cursor.fetchall()}
+        
+        return [by_id[character_id] for character_id in character_ids if character_id in by_id]
+    
+    def _fts_match_expression(self, query):
+        """Turn free text into an FTS5 query where every word is a prefix term"""
+        terms = re.findall(r'\w+', query.lower())
+        return ' '.join(f'"{term}"*' for term in terms)
     
     # COLLECTION MANAGEMENT
     def claim_character(self, user_id, character_id, group_id):
         """Claim a character for a user (allows duplicates with count increment)"""
         with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Check if user already has this character
-            cursor.execute('''
-                SELECT count FROM user_collections 
-                WHERE user_id = ? AND character_id = ?
-            ''', (user_id, character_id))
-            
-            existing = cursor.fetchone()
-            
-            if existing:
-                # Increment count for existing character
-                cursor.execute('''
-                    UPDATE user_collections 
-                    SET count = count + 1, last_claimed_at = CURRENT_TIMESTAMP
-                    WHERE user_id = ? AND character_id = ?
-                ''', (user_id, character_id))
-                new_count = existing[0] + 1
-            else:
-                # Add new character to collection
-                cursor.execute('''
-                    INSERT INTO user_collections (user_id, character_id, group_id, count)
-                    VALUES (?, ?, ?, 1)
-                ''', (user_id, character_id, group_id))
-                new_count = 1
-            
-            conn.commit()
-            conn.close()
+            with self._transaction() as cursor:
+                new_count = self._upsert_collection(cursor, user_id, character_id, group_id)
+                self._bump_collection_stats(cursor, user_id, character_id, new_count == 1)
+            self._bump_collection_version(user_id)
             return new_count
     
-    def get_user_collection(self, user_id, limit=None, offset=0):
-        """Get user's character collection with counts"""
-        with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            query = '''
-                SELECT uc.id as collection_id, c.*, uc.count, uc.first_claimed_at, uc.last_claimed_at
-                FROM user_collections uc
-                JOIN characters c ON uc.character_id = c.id
-                WHERE uc.user_id = ?
-                ORDER BY uc.last_claimed_at DESC
-            '''
-            
-            if limit:
-                query += f" LIMIT {limit} OFFSET {offset}"
-            
-            cursor.execute(query, (user_id,))
-            characters = cursor.fetchall()
-            
-            conn.close()
-            return [dict(char) for char in characters]
+    def claim_drop(self, group_id, drop_id, user_id):
+        """Atomically claim an active drop for a user.
+        
+        Removes the drop row only if it is still there and adds the
+        character to the collection in the same transaction. Returns the
+        new count, or None if the drop was already caught or expired.
+        """
+        with self.lock:
+            # Losers of a race are turned away without touching the database
+            current = self._active_drops.get(group_id)
+            if not current or current['drop_id'] != drop_id:
+                return None
+            
+            with self._transaction() as cursor:
+                cursor.execute("DELETE FROM active_drops WHERE id = ? RETURNING character_id", (drop_id,))
+                row = cursor.fetchone()
+                if row:
+                    character_id = row[0]
+                    new_count = self._upsert_collection(cursor, user_id, character_id, group_id)
+                    self._bump_collection_stats(cursor, user_id, character_id, new_count == 1)
+            
+            self._active_drops.pop(group_id, None)
+            if not row:
+                return None
+            self._bump_collection_version(user_id)
+            return new_count
+    
+    def collection_version(self, user_id):
+        """Version of a user's collection as shown on its pages (in-memory)"""
+        return self._collection_versions.get(user_id, self._collection_version_floor)
+    
+    def _bump_collection_version(self, user_id):
+        self._collection_versions[user_id] = next(self._collection_version_counter)
+    
+    def _bump_all_collection_versions(self):
+        self._collection_version_floor = next(self._collection_version_counter)
+        self._collection_versions.clear()
+    
+    def _upsert_collection(self, cursor, user_id, character_id, group_id):
+        """Add one copy of a character to a collection; returns the new count (caller owns the transaction)"""
+        cursor.execute('''
+            INSERT INTO user_collections (user_id, character_id, group_id, count)
+            VALUES (?, ?, ?, 1)
+            ON CONFLICT (user_id, character_id) DO UPDATE SET
+                count = count + 1,
+                last_claimed_at = CURRENT_TIMESTAMP
+            RETURNING count
+        ''', (user_id, character_id, group_id))
+        return cursor.fetchone()[0]
+    
+    def _bump_collection_stats(self, cursor, user_id, character_id, first_copy):
+        """Count one more claim in user_collection_stats (caller owns the transaction)"""
+        cursor.execute('''
+            INSERT INTO user_collection_stats (user_id, rarity, unique_count, total_count)
+            SELECT ?, COALESCE(rarity, 'Common'), ?, 1 FROM characters WHERE id = ?
+            ON CONFLICT (user_id, rarity) DO UPDATE SET
+                unique_count = unique_count + excluded.unique_count,
+                total_count = total_count + 1
+        ''', (user_id, 1 if first_copy else 0, character_id))
+    
+    def _rebuild_collection_stats(self, cursor, user_id=None):
+        """Recompute user_collection_stats for one user, or everyone (caller owns the transaction)"""
+        if user_id is None:
+            cursor.execute("DELETE FROM user_collection_stats")
+            where, params = "", ()
+        else:
+            cursor.execute("DELETE FROM user_collection_stats WHERE user_id = ?", (user_id,))
+            where, params = "WHERE uc.user_id = ?", (user_id,)
+        
+        cursor.execute(f'''
+            INSERT INTO user_collection_stats (user_id, rarity, unique_count, total_count)
+            SELECT uc.user_id, COALESCE(c.rarity, 'Common'), COUNT(*), SUM(uc.count)
+            FROM user_collections uc
+            JOIN characters c ON uc.character_id = c.id
+            {where}
+            GROUP BY uc.user_id, COALESCE(c.rarity, 'Common')
+        ''', params)
+    
+    def rebuild_collection_stats(self, user_id=None):
+        """Rebuild the collection summary from scratch; returns the number of users covered"""
+        with self.lock:
+            with self._transaction() as cursor:
+                self._rebuild_collection_stats(cursor, user_id)
+                cursor.execute("SELECT COUNT(DISTINCT user_id) FROM user_collection_stats")
+                users = cursor.fetchone()[0]
+            
+            if user_id is None:
+                self._bump_all_collection_versions()
+            else:
+                self._bump_collection_version(user_id)
+            return users
+    
+    def get_user_collection_page(self, user_id, limit=5, after=None, before=None):
+        """Get one page of user's collection, newest claims first, by keyset.
+        
+        ``after`` is the (last_claimed_at, collection_id) of the previous
+        page's last row and ``before`` the one of the next page's first row,
+        so every page is an index seek regardless of how deep it is.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        query = '''
+            SELECT uc.id as collection_id, c.*, uc.count, uc.first_claimed_at, uc.last_claimed_at
+            FROM user_collections uc
+            JOIN characters c ON uc.character_id = c.id
+            WHERE uc.user_id = ?
+        '''
+        params = [user_id]
+        
+        if before:
+            # Walk backwards from the cursor, then restore newest-first order
+            query += " AND (uc.last_claimed_at, uc.id) > (?, ?) ORDER BY uc.last_claimed_at ASC, uc.id ASC LIMIT ?"
+            params += [before[0], before[1], limit]
+        elif after:
+            query += " AND (uc.last_claimed_at, uc.id) < (?, ?) ORDER BY uc.last_claimed_at DESC, uc.id DESC LIMIT ?"
+            params += [after[0], after[1], limit]
+        else:
+            query += " ORDER BY uc.last_claimed_at DESC, uc.id DESC LIMIT ?"
+            params.append(limit)
+        
+        cursor.execute(query, params)
+        characters = [dict(char) for char in cursor.fetchall()]
+        
+        if before:
+            characters.reverse()
+        return characters
     
     def get_collection_count(self, user_id):
-        """Get total count of user's collection (including duplicates)"""
-        with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT COUNT(*), SUM(count) FROM user_collections WHERE user_id = ?", (user_id,))
-            result = cursor.fetchone()
-            unique_count = result[0] if result[0] else 0
-            total_count = result[1] if result[1] else 0
-            
-            conn.close()
-            return {"unique": unique_count, "total": total_count}
+        """Get total count of user's collection (including duplicates) with a per-rarity breakdown"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT rarity, unique_count, total_count FROM user_collection_stats
+            WHERE user_id = ?
+        ''', (user_id,))
+        
+        unique_count = total_count = 0
+        by_rarity = {}
+        for rarity, unique, total in cursor.fetchall():
+            unique_count += unique
+            total_count += total
+            by_rarity[rarity] = {"unique": unique, "total": total}
+        
+        return {"unique": unique_count, "total": total_count, "rarity": by_rarity}
     
     def user_owns_character(self, user_id, character_id):
         """Check if user owns a character (always returns False to allow duplicates)"""
         return False  # Always allow duplicate catching
     
     def give_all_characters_to_user(self, user_id):
-        """Give all characters to a special user"""
+        """Give all characters to a special user; returns how many were newly added"""
+        # Nothing was added to the catalog since this user's last grant
+        catalog_version = self.catalog_version
+        if self._granted_catalog_versions.get(user_id) == catalog_version:
+            return 0
+        
         with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Get all characters
-            cursor.execute("SELECT id FROM characters")
-            characters = cursor.fetchall()
-            
-            for char in characters:
-                character_id = char[0]
-                # Check if user already has this character
+            with self._transaction() as cursor:
                 cursor.execute('''
-                    SELECT id FROM user_collections 
-                    WHERE user_id = ? AND character_id = ?
-                ''', (user_id, character_id))
+                    INSERT INTO user_collections (user_id, character_id, group_id, count)
+                    SELECT ?, c.id, -1, 1 FROM characters c
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM user_collections uc
+                        WHERE uc.user_id = ? AND uc.character_id = c.id
+                    )
+                ''', (user_id, user_id))
                 
-                if not cursor.fetchone():
-                    # Add character to user's collection
-                    cursor.execute('''
-                        INSERT INTO user_collections (user_id, character_id, group_id, count)
-                        VALUES (?, ?, -1, 1)
-                    ''', (user_id, character_id))
+                granted = cursor.rowcount
+                if granted:
+                    self._rebuild_collection_stats(cursor, user_id)
             
-            conn.commit()
-            conn.close()
+            if granted:
+                self._bump_collection_version(user_id)
+            self._granted_catalog_versions[user_id] = catalog_version
+            return granted
     
     # USER MANAGEMENT
+    def load_user_sets(self):
+        """Load banned and special user IDs into memory"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT user_id FROM banned_users")
+        self._banned_ids = {row[0] for row in cursor.fetchall()}
+        
+        cursor.execute("SELECT user_id FROM special_users")
+        self._special_ids = {row[0] for row in cursor.fetchall()}
+    
     def add_special_user(self, user_id, username=None):
         """Add a special user"""
         with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO special_users (user_id, username)
-                VALUES (?, ?)
-            ''', (user_id, username))
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO special_users (user_id, username)
+                    VALUES (?, ?)
+                ''', (user_id, username))
             
-            conn.commit()
-            conn.close()
+            self._special_ids.add(user_id)
+            # Special users' pages show ♾️ instead of counts
+            self._bump_collection_version(user_id)
     
     def remove_special_user(self, user_id):
         """Remove a special user"""
         with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self._transaction() as cursor:
+                cursor.execute("DELETE FROM special_users WHERE user_id = ?", (user_id,))
             
-            cursor.execute("DELETE FROM special_users WHERE user_id = ?", (user_id,))
-            
-            conn.commit()
-            conn.close()
+            self._special_ids.discard(user_id)
+            self._bump_collection_version(user_id)
     
     def is_special_user(self, user_id):
-        """Check if user is special"""
-        with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT user_id FROM special_users WHERE user_id = ?", (user_id,))
-            result = cursor.fetchone()
-            
-            conn.close()
-            return result is not None
+        """Check if user is special (in-memory, no database access)"""
+        return user_id in self._special_ids
     
     def get_special_users(self):
         """Get all special users"""
-        with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT * FROM special_users ORDER BY added_at DESC")
-            users = cursor.fetchall()
-            
-            conn.close()
-            return [dict(user) for user in users]
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT * FROM special_users ORDER BY added_at DESC")
+        users = cursor.fetchall()
+        
+        return [dict(user) for user in users]
     
     def ban_user(self, user_id, username=None, reason=None):
         """Ban a user"""
         with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO banned_users (user_id, username, reason)
-                VALUES (?, ?, ?)
-            ''', (user_id, username, reason))
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO banned_users (user_id, username, reason)
+                    VALUES (?, ?, ?)
+                ''', (user_id, username, reason))
             
-            conn.commit()
-            conn.close()
+            self._banned_ids.add(user_id)
     
     def unban_user(self, user_id):
         """Unban a user"""
         with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("DELETE FROM banned_users WHERE user_id = ?", (user_id,))
+            with self._transaction() as cursor:
+                cursor.execute("DELETE FROM banned_users WHERE user_id = ?", (user_id,))
             
-            conn.commit()
-            conn.close()
+            self._banned_ids.discard(user_id)
     
     def is_banned(self, user_id):
-        """Check if user is banned"""
-        with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT user_id FROM banned_users WHERE user_id = ?", (user_id,))
-            result = cursor.fetchone()
-            
-            conn.close()
-            return result is not None
+        """Check if user is banned (in-memory, no database access)"""
+        return user_id in self._banned_ids
     
     def get_banned_users(self):
         """Get all banned users"""
-        with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT * FROM banned_users ORDER BY banned_at DESC")
-            users = cursor.fetchall()
-            
-            conn.close()
-            return [dict(user) for user in users]
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT * FROM banned_users ORDER BY banned_at DESC")
+        users = cursor.fetchall()
+        
+        return [dict(user) for user in users]
     
     # DROP MANAGEMENT
-    def create_drop(self, group_id, character_id, message_id=None):
-        """Create an active drop"""
+    def _drop_record(self, row):
+        """Build the in-memory drop record from an active_drops + characters row"""
+        drop = dict(row)
+        # Name normalized and matcher prepared once per drop instead of once per guess
+        drop['matcher'] = CatchMatcher(drop['name'])
+        drop['normalized_name'] = drop['matcher'].name
+        return drop
+    
+    def load_active_drops(self):
+        """Load active drops from the table into the in-memory registry"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        # Characters columns come last so 'id'/'created_at' match the character
+        cursor.execute('''
+            SELECT ad.id AS drop_id, ad.group_id, ad.message_id, ad.created_at AS dropped_at,
+                   ad.expires_at, ad.character_id, c.*
+            FROM active_drops ad
+            JOIN characters c ON ad.character_id = c.id
+            ORDER BY ad.created_at, ad.id
+        ''')
+        
+        # Later rows win, so each group keeps its newest drop
+        self._active_drops = {row['group_id']: self._drop_record(row) for row in cursor.fetchall()}
+    
+    def create_drop(self, group_id, character_id, message_id=None, expires_at=None):
+        """Create an active drop (replacing any previous drop in the group)"""
         with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO active_drops (group_id, character_id, message_id)
-                VALUES (?, ?, ?)
-            ''', (group_id, character_id, message_id))
-            
-            drop_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            with self._transaction() as cursor:
+                cursor.execute("DELETE FROM active_drops WHERE group_id = ?", (group_id,))
+                cursor.execute('''
+                    INSERT INTO active_drops (group_id, character_id, message_id, expires_at)
+                    VALUES (?, ?, ?, ?)
+                ''', (group_id, character_id, message_id, expires_at))
+                
+                drop_id = cursor.lastrowid
+                cursor.execute('''
+                    SELECT ad.id AS drop_id, ad.group_id, ad.message_id, ad.created_at AS dropped_at,
+                           ad.expires_at, ad.character_id, c.*
+                    FROM active_drops ad
+                    JOIN characters c ON ad.character_id = c.id
+                    WHERE ad.id = ?
+                ''', (drop_id,))
+                row = cursor.fetchone()
+            
+            if row:
+                self._active_drops[group_id] = self._drop_record(row)
             return drop_id
     
     def get_active_drop(self, group_id):
-        """Get active drop for group"""
+        """Get active drop for group (in-memory, no database access)"""
+        drop = self._active_drops.get(group_id)
+        return dict(drop) if drop else None
+    
+    def get_active_drops(self):
+        """Get every active drop (in-memory snapshot)"""
+        return [dict(drop) for drop in list(self._active_drops.values())]
+    
+    def expire_drops(self, drops):
+        """Remove a batch of (drop_id, group_id) drops; newer drops in the same group are kept"""
         with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT ad.*, c.* FROM active_drops ad
-                JOIN characters c ON ad.character_id = c.id
-                WHERE ad.group_id = ?
-                ORDER BY ad.created_at DESC LIMIT 1
-            ''', (group_id,))
+            with self._transaction() as cursor:
+                cursor.executemany("DELETE FROM active_drops WHERE id = ?", [(drop_id,) for drop_id, _ in drops])
             
-            drop = cursor.fetchone()
-            conn.close()
-            return dict(drop) if drop else None
+            expired = 0
+            for drop_id, group_id in drops:
+                current = self._active_drops.get(group_id)
+                if current and current['drop_id'] == drop_id:
+                    del self._active_drops[group_id]
+                    expired += 1
+            return expired
     
     def remove_active_drop(self, group_id):
         """Remove active drop for group"""
         with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("DELETE FROM active_drops WHERE group_id = ?", (group_id,))
-            conn.commit()
-            conn.close()
+            with self._transaction() as cursor:
+                cursor.execute("DELETE FROM active_drops WHERE group_id = ?", (group_id,))
+            self._active_drops.pop(group_id, None)
     
     # DATABASE STATISTICS
     def get_total_character_count(self):
         """Get total number of characters in database"""
-        with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT COUNT(*) FROM characters")
-            result = cursor.fetchone()
-            
-            conn.close()
-            return result[0] if result else 0
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT COUNT(*) FROM characters")
+        result = cursor.fetchone()
+        
+        return result[0] if result else 0
     
     def get_character_count_by_gender(self, gender):
         """Get character count by gender"""
-        with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT COUNT(*) FROM characters WHERE gender = ?", (gender,))
-            result = cursor.fetchone()
-            
-            conn.close()
-            return result[0] if result else 0
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT COUNT(*) FROM characters WHERE gender = ?", (gender,))
+        result = cursor.fetchone()
+        
+        return result[0] if result else 0
     
     def get_total_user_count(self):
         """Get total number of users with collections"""
-        with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT COUNT(DISTINCT user_id) FROM user_collections")
-            result = cursor.fetchone()
-            
-            conn.close()
-            return result[0] if result else 0
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT COUNT(DISTINCT user_id) FROM user_collection_stats")
+        result = cursor.fetchone()
+        
+        return result[0] if result else 0
     
     def get_total_collection_count(self):
         """Get total number of character claims"""
-        with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT SUM(count) FROM user_collections")
-            result = cursor.fetchone()
-            
-            conn.close()
-            return result[0] if result and result[0] else 0
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT SUM(total_count) FROM user_collection_stats")
+        result = cursor.fetchone()
+        
+        return result[0] if result and result[0] else 0
     
     # TRADING MANAGEMENT
     def create_trade(self, from_user_id, to_user_id, character_id, group_id):
         """Create a trade offer"""
-        with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
+        with self.lock, self._transaction() as cursor:
             cursor.execute('''
                 INSERT INTO trades (from_user_id, to_user_id, character_id, group_id)
                 VALUES (?, ?, ?, ?)
             ''', (from_user_id, to_user_id, character_id, group_id))
             
-            trade_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            return trade_id
+            return cursor.lastrowid
     
     def get_trade(self, trade_id):
         """Get trade information"""
-        with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT t.*, c.name as character_name, c.series_name, c.image_url
-                FROM trades t
-                JOIN characters c ON t.character_id = c.id
-                WHERE t.id = ?
-            ''', (trade_id,))
-            
-            trade = cursor.fetchone()
-            conn.close()
-            return dict(trade) if trade else None
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT t.*, c.name as character_name, c.series_name, c.image_url
+            FROM trades t
+            JOIN characters c ON t.character_id = c.id
+            WHERE t.id = ?
+        ''', (trade_id,))
+        
+        trade = cursor.fetchone()
+        return dict(trade) if trade else None
     
     def accept_trade(self, trade_id):
         """Accept a trade"""
         with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Get trade details
-            cursor.execute("SELECT * FROM trades WHERE id = ? AND status = 'pending'", (trade_id,))
-            trade = cursor.fetchone()
-            
-            if not trade:
-                conn.close()
-                return False
-            
-            # Transfer character ownership
-            cursor.execute('''
-                UPDATE user_collections 
-                SET user_id = ? 
-                WHERE user_id = ? AND character_id = ?
-            ''', (trade['to_user_id'], trade['from_user_id'], trade['character_id']))
-            
-            # Update trade status
-            cursor.execute('''
-                UPDATE trades 
-                SET status = 'accepted', completed_at = CURRENT_TIMESTAMP 
-                WHERE id = ?
-            ''', (trade_id,))
-            
-            conn.commit()
-            conn.close()
+            with self._transaction() as cursor:
+                # Get trade details
+                cursor.execute("SELECT * FROM trades WHERE id = ? AND status = 'pending'", (trade_id,))
+                trade = cursor.fetchone()
+                
+                if not trade:
+                    return False
+                
+                # Transfer character ownership
+                cursor.execute('''
+                    UPDATE user_collections 
+                    SET user_id = ? 
+                    WHERE user_id = ? AND character_id = ?
+                ''', (trade['to_user_id'], trade['from_user_id'], trade['character_id']))
+                
+                self._rebuild_collection_stats(cursor, trade['from_user_id'])
+                self._rebuild_collection_stats(cursor, trade['to_user_id'])
+                
+                # Update trade status
+                cursor.execute('''
+                    UPDATE trades 
+                    SET status = 'accepted', completed_at = CURRENT_TIMESTAMP 
+                    WHERE id = ?
+                ''', (trade_id,))
+            
+            # The sender may no longer own every character; re-grant next time
+            self._granted_catalog_versions.pop(trade['from_user_id'], None)
+            self._bump_collection_version(trade['from_user_id'])
+            self._bump_collection_version(trade['to_user_id'])
             return True
     
     def reject_trade(self, trade_id):
         """Reject a trade"""
-        with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
+        with self.lock, self._transaction() as cursor:
             cursor.execute('''
                 UPDATE trades 
                 SET status = 'rejected', completed_at = CURRENT_TIMESTAMP 
                 WHERE id = ?
             ''', (trade_id,))
-            
-            conn.commit()
-            conn.close()
     
     def get_pending_trades(self, user_id):
         """Get pending trades for a user"""
-        with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT t.*, c.name as character_name, c.series_name
-                FROM trades t
-                JOIN characters c ON t.character_id = c.id
-                WHERE t.to_user_id = ? AND t.status = 'pending'
-                ORDER BY t.created_at DESC
-            ''', (user_id,))
-            
-            trades = cursor.fetchall()
-            conn.close()
-            return [dict(trade) for trade in trades]
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT t.*, c.name as character_name, c.series_name
+            FROM trades t
+            JOIN characters c ON t.character_id = c.id
+            WHERE t.to_user_id = ? AND t.status = 'pending'
+            ORDER BY t.created_at DESC
+        ''', (user_id,))
+        
+        trades = cursor.fetchall()
+        return [dict(trade) for trade in trades]
+
+class AsyncDatabase:
+    """Awaitable facade that runs Database methods on a bounded thread pool.
+    
+    Every public Database method is available as a coroutine, e.g.
+    ``await async_db.get_group(group_id)``. At most ``max_pending`` calls
+    may be queued or running; further callers wait on the event loop
+    instead of piling up work in the executor.
+    """
+    
+    def __init__(self, database, max_workers=DB_MAX_WORKERS, max_pending=DB_MAX_PENDING):
+        self.database = database
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+        self._max_pending = max_pending
+        self._slots = None
+    
+    def __getattr__(self, name):
+        method = getattr(self.database, name)
+        if name.startswith('_') or not callable(method):
+            raise AttributeError(name)
+        
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+        
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        # Cache the wrapper so later lookups skip __getattr__
+        setattr(self, name, call)
+        return call
+    
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking callable on the database thread pool"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._max_pending)
+        
+        submitted = time.perf_counter()
+        
+        def timed_call():
+            # Backpressure and executor queueing, before the method starts
+            db_queue_wait_seconds.labels(func.__name__).observe(time.perf_counter() - submitted)
+            return func(*args, **kwargs)
+        
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, timed_call)
+    
+    def shutdown(self):
+        """Wait for queued calls to finish and stop the worker threads"""
+        self._executor.shutdown(wait=True)
+
+# Record latency and lock wait of every Database call that can touch SQLite; the
+# connection getter runs inside them and the in-memory lookups would only add overhead
+instrument_methods(Database, exclude=(
+    'get_connection', 'peek_group', 'increment_message_count', 'collection_version',
+    'user_owns_character', 'is_special_user', 'is_banned', 'get_active_drop', 'get_active_drops',
+))
 
-# Create global database instance
-db = Database()
\ No newline at end of file
+# Create global database instances
+db = Database()
+async_db = AsyncDatabase(db)
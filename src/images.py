@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import time
+from urllib.parse import urlsplit
+import httpx
+from database import async_db
+from config import (
+    IMAGE_CHECK_CONCURRENCY, IMAGE_CHECK_TIMEOUT, IMAGE_CHECK_BATCH_SIZE,
+    IMAGE_CHECK_SWEEP_INTERVAL, IMAGE_MAX_BYTES
+)
+
+logger = logging.getLogger(__name__)
+
+# Telegram file links embed the bot token and expire within the hour
+TELEGRAM_FILE_URL_PREFIX = "https://api.telegram.org/file/"
+
+def redact_url(url):
+    """Scheme and host only, so logs never carry tokens or signed query strings"""
+    parts = urlsplit(url or '')
+    return f"{parts.scheme}://{parts.hostname}/…" if parts.hostname else "<invalid url>"
+
+class HttpxFetcher:
+    """Default fetcher: returns (status, content_type, size) for a picture URL.
+
+    Asks with HEAD first and only downloads (up to max_bytes + 1) when the
+    server refuses HEAD or does not say how large the picture is.
+    """
+
+    def __init__(self, timeout=IMAGE_CHECK_TIMEOUT, max_bytes=IMAGE_MAX_BYTES):
+        self._timeout = timeout
+        self._max_bytes = max_bytes
+        self._client = None
+
+    async def __call__(self, url):
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self._timeout, follow_redirects=True)
+
+        response = await self._client.head(url)
+        content_type = response.headers.get('content-type')
+        size = response.headers.get('content-length')
+        if response.status_code == 200 and size is not None:
+            return response.status_code, content_type, int(size)
+        if response.status_code not in (200, 403, 405, 501):
+            return response.status_code, content_type, None
+
+        # Some hosts (and CDNs) only answer GET properly
+        async with self._client.stream('GET', url) as response:
+            size = 0
+            if response.status_code == 200:
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > self._max_bytes:
+                        break
+            return response.status_code, response.headers.get('content-type'), size
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class ImageValidator:
+    """Checks character pictures in the background and marks the bad ones.
+
+    New pictures are checked right after /addchar; pictures that were
+    never checked or sent are swept on startup and then periodically.
+    At most `concurrency` fetches run at once. The result (content type,
+    size, checked_at and 'ok'/'broken') is stored on the character, and
+    send_character_photo never sends a picture marked broken.
+    """
+
+    def __init__(self, fetcher=None, concurrency=IMAGE_CHECK_CONCURRENCY, max_bytes=IMAGE_MAX_BYTES,
+                 batch_size=IMAGE_CHECK_BATCH_SIZE, sweep_interval=IMAGE_CHECK_SWEEP_INTERVAL):
+        # fetcher: async callable url -> (status, content_type, size)
+        self._fetcher = fetcher or HttpxFetcher(max_bytes=max_bytes)
+        self._concurrency = concurrency
+        self._max_bytes = max_bytes
+        self._batch_size = batch_size
+        self._sweep_interval = sweep_interval
+        self._semaphore = None
+        self._queue = None
+        self._tasks = set()
+        self.checked = 0
+        self.broken = 0
+
+    def _ensure_loop_state(self):
+        if self._queue is None:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+            self._queue = asyncio.Queue()
+
+    def classify(self, status, content_type, size):
+        """'ok', 'broken', or None when the failure may be temporary"""
+        if status >= 500 or status == 429:
+            return None
+        if status != 200:
+            return 'broken'
+        if not content_type or not content_type.split(';')[0].strip().lower().startswith('image/'):
+            return 'broken'
+        if not size or size > self._max_bytes:
+            return 'broken'
+        return 'ok'
+
+    async def check(self, character_id, url):
+        """Fetch one picture and store the verdict; returns 'ok', 'broken' or None"""
+        if url.startswith(TELEGRAM_FILE_URL_PREFIX):
+            return None
+        self._ensure_loop_state()
+        async with self._semaphore:
+            try:
+                status, content_type, size = await self._fetcher(url)
+            except Exception as e:
+                # Timeouts and connection errors are retried on the next sweep
+                logger.info(
+                    f"Image check for character {character_id} ({redact_url(url)}) failed, "
+                    f"will retry: {type(e).__name__}"
+                )
+                return None
+
+        verdict = self.classify(status, content_type, size)
+        if verdict is None:
+            return None
+
+        await async_db.record_image_check(character_id, verdict, content_type, size)
+        self.checked += 1
+        if verdict == 'broken':
+            self.broken += 1
+            logger.warning(
+                f"Image of character {character_id} is unusable "
+                f"(HTTP {status}, {content_type}, {size} bytes): {redact_url(url)}"
+            )
+        return verdict
+
+    def enqueue(self, character_id, url):
+        """Check a newly added picture as soon as a slot is free"""
+        self._ensure_loop_state()
+        self._queue.put_nowait((character_id, url))
+
+    async def sweep(self):
+        """Check every picture that was never checked or sent; returns how many were checked"""
+        checked = 0
+        after_id = 0
+        while True:
+            batch = await async_db.get_characters_needing_image_check(after_id, self._batch_size)
+            if not batch:
+                break
+            after_id = batch[-1]['id']
+            results = await asyncio.gather(*(self.check(row['id'], row['image_url']) for row in batch))
+            checked += sum(1 for verdict in results if verdict)
+        return checked
+
+    def _spawn(self, character_id, url):
+        task = asyncio.create_task(self.check(character_id, url))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def run(self):
+        """Sweep, then check queued pictures until the next sweep is due; runs until cancelled"""
+        self._ensure_loop_state()
+        next_sweep = 0
+        while True:
+            now = time.monotonic()
+            if now >= next_sweep:
+                try:
+                    checked = await self.sweep()
+                    if checked:
+                        logger.info(f"Checked {checked} character images ({self.broken} broken so far)")
+                except Exception as e:
+                    logger.error(f"Image sweep failed: {e}")
+                next_sweep = time.monotonic() + self._sweep_interval
+                continue
+
+            try:
+                character_id, url = await asyncio.wait_for(self._queue.get(), timeout=next_sweep - now)
+            except asyncio.TimeoutError:
+                continue
+            self._spawn(character_id, url)
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        close = getattr(self._fetcher, 'close', None)
+        if close:
+            await close()
@@ -0,0 +1,134 @@
+import csv
+import json
+import logging
+import os
+from database import db
+from config import VALID_GENDERS, VALID_RARITIES, IMPORT_CHUNK_SIZE, IMPORT_MAX_ERRORS
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'jsonl')
+
+# Column names accepted for each field; the first is the canonical one
+FIELD_ALIASES = {
+    'name': ('name',),
+    'series_name': ('series_name', 'series'),
+    'gender': ('gender',),
+    'rarity': ('rarity',),
+    'image_url': ('image_url', 'image'),
+}
+
+class ImportReport:
+    """Outcome of one import: counts plus the first few invalid rows"""
+
+    def __init__(self, max_errors=IMPORT_MAX_ERRORS):
+        self.rows = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors = []
+        self._max_errors = max_errors
+
+    def reject(self, line, reason):
+        self.invalid += 1
+        if len(self.errors) < self._max_errors:
+            self.errors.append((line, reason))
+
+    def summary(self):
+        text = (
+            f"Read {self.rows} rows: {self.imported} imported, "
+            f"{self.duplicates} already present, {self.invalid} invalid"
+        )
+        for line, reason in self.errors:
+            text += f"\n  line {line}: {reason}"
+        if self.invalid > len(self.errors):
+            text += f"\n  ... and {self.invalid - len(self.errors)} more"
+        return text
+
+def detect_format(filename):
+    """'csv' or 'jsonl' from a file name, or None"""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    return None
+
+def read_records(stream, fmt):
+    """Yield (line, record) from a text stream; record is a dict or an error string"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'jsonl':
+        for line, text in enumerate(stream, 1):
+            if not text.strip():
+                continue
+            try:
+                record = json.loads(text)
+            except ValueError as e:
+                yield line, f"invalid JSON ({e.msg})"
+                continue
+            yield line, record if isinstance(record, dict) else "not a JSON object"
+
+def _field(record, field):
+    for key in FIELD_ALIASES[field]:
+        value = record.get(key)
+        if value is not None:
+            return str(value).strip()
+    return ''
+
+def validate_record(record):
+    """Return a (name, series_name, image_url, gender, rarity) row or raise ValueError"""
+    name = _field(record, 'name')
+    series_name = _field(record, 'series_name')
+    if not name or not series_name:
+        raise ValueError("name and series are required")
+
+    # Same normalization as /addchar
+    gender = _field(record, 'gender').lower()
+    if gender not in VALID_GENDERS:
+        raise ValueError(f"gender must be one of {', '.join(VALID_GENDERS)}, got {gender!r}")
+    rarity = _field(record, 'rarity').title() or "Common"
+    if rarity not in VALID_RARITIES:
+        raise ValueError(f"unknown rarity {rarity!r}")
+
+    image_url = _field(record, 'image_url') or None
+    if image_url and not image_url.startswith(('http://', 'https://')):
+        raise ValueError("image_url must be an http(s) URL")
+    return name, series_name, image_url, gender, rarity
+
+def import_records(records, added_by, database=db, chunk_size=IMPORT_CHUNK_SIZE, report=None):
+    """Validate (line, record) pairs and insert them in chunked transactions"""
+    report = report or ImportReport()
+    chunk = []
+
+    def flush():
+        inserted = database.add_characters(chunk, added_by)
+        report.imported += inserted
+        report.duplicates += len(chunk) - inserted
+        chunk.clear()
+
+    for line, record in records:
+        report.rows += 1
+        if isinstance(record, str):
+            report.reject(line, record)
+            continue
+        try:
+            chunk.append(validate_record(record))
+        except ValueError as e:
+            report.reject(line, str(e))
+            continue
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+
+    logger.info(f"Character import by {added_by}: {report.summary()}")
+    return report
+
+def import_stream(stream, fmt, added_by, database=db, chunk_size=IMPORT_CHUNK_SIZE):
+    """Import a CSV or JSONL catalog from a text stream; returns an ImportReport"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown import format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    return import_records(read_records(stream, fmt), added_by, database, chunk_size)
@@ -1,13 +1,31 @@
 import logging
 import random
 import asyncio
-import difflib
+import functools
+import importlib.util
+import time
+import secrets
+import io
+import os
+import sqlite3
 from datetime import datetime, timedelta
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ChatMember, BotCommand
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
 from telegram.constants import ChatType
-from database import db
-from config import BOT_TOKEN, CATCH_TIMEOUT, VALID_GENDERS, TRADE_TIMEOUT, RARITY_LEVELS, VALID_RARITIES, DROP_TIMEOUT, SPECIAL_USERS, OWNER_USER_ID, BANNED_USERS
+from telegram.error import BadRequest
+from database import db, async_db
+from scheduler import DropExpiryScheduler
+from update_processor import PerChatUpdateProcessor
+from outbound import OutboundQueue, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from images import ImageValidator
+from importer import detect_format, import_stream
+from backup import backup_database, export_database, EXPORT_TABLES
+from cache import LRUCache, TTLCache
+from metrics import registry, timed_handler, start_metrics_server, handler_seconds, handler_errors, db_call_seconds, db_lock_wait_seconds
+from config import BOT_TOKEN, CATCH_TIMEOUT, VALID_GENDERS, TRADE_TIMEOUT, RARITY_LEVELS, VALID_RARITIES, DROP_TIMEOUT, SPECIAL_USERS, OWNER_USER_ID, BANNED_USERS, MESSAGE_COUNT_FLUSH_INTERVAL, MAX_CONCURRENT_UPDATES
+from config import COLLECTION_PAGE_CACHE_SIZE, SEARCH_MAX_RESULTS, SEARCH_PAGE_SIZE, SEARCH_SESSION_TTL, SEARCH_SESSION_LIMIT
+from config import WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET
+from config import METRICS_LISTEN, METRICS_PORT
 
 # Enable logging
 logging.basicConfig(
@@ -16,6 +34,32 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Only the update types the handlers use; Telegram does not send the rest
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
+# Single scheduler that expires every group's drop (rebuilt from the table on boot)
+drop_scheduler = DropExpiryScheduler(async_db.expire_drops)
+
+# Drops, catch announcements and collection pages are sent through this
+# queue so busy groups stay under Telegram's flood limits without blocking handlers
+outbound = OutboundQueue()
+
+# Checks character pictures in the background so drops never try dead links
+image_validator = ImageValidator()
+
+# Bots may upload documents up to 50 MB (larger exports stay on disk)
+TELEGRAM_UPLOAD_LIMIT = 50 * 1024 * 1024
+
+# Strong references to fire-and-forget tasks until they finish
+pending_tasks = set()
+
+def run_in_background(coro):
+    """Run a coroutine without awaiting it in the handler"""
+    task = asyncio.create_task(coro)
+    pending_tasks.add(task)
+    task.add_done_callback(pending_tasks.discard)
+    return task
+
 # MIDDLEWARE
 async def check_banned_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """Check if user is banned before processing any command"""
@@ -33,6 +77,7 @@ def is_owner(user_id):
 
 def owner_only(func):
     """Decorator to restrict commands to owner only"""
+    @functools.wraps(func)
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not OWNER_USER_ID:
             await update.message.reply_text("❌ Owner not set in configuration!")
@@ -49,9 +94,6 @@ def owner_only(func):
         await func(update, context)
     return wrapper
 
-# Global state for active drops
-active_drops = {}
-
 def create_mode_keyboard():
     """Create keyboard for switching modes"""
     keyboard = [
@@ -62,16 +104,42 @@ def create_mode_keyboard():
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def create_collection_keyboard(page=0, total_pages=1):
+COLLECTION_PAGE_SIZE = 5
+
+# (user_id, first_name, page, after, before, collection_version) -> (text, keyboard, rows)
+collection_page_cache = LRUCache(COLLECTION_PAGE_CACHE_SIZE)
+
+# Search sessions: token -> (query, ranked character IDs)
+search_sessions = TTLCache(SEARCH_SESSION_LIMIT, SEARCH_SESSION_TTL)
+
+def encode_collection_cursor(row):
+    """Encode a collection row's (last_claimed_at, id) keyset position for callback data"""
+    # '2025-07-19 12:34:56' -> '20250719123456' keeps the button under 64 bytes
+    timestamp = ''.join(ch for ch in str(row['last_claimed_at']) if ch.isdigit())
+    return f"{timestamp}_{row['collection_id']}"
+
+def decode_collection_cursor(timestamp, collection_id):
+    """Decode an encoded keyset position back to (last_claimed_at, id)"""
+    t = timestamp
+    last_claimed_at = f"{t[0:4]}-{t[4:6]}-{t[6:8]} {t[8:10]}:{t[10:12]}:{t[12:14]}"
+    return last_claimed_at, int(collection_id)
+
+def create_collection_keyboard(page=0, total_pages=1, first_row=None, last_row=None):
     """Create keyboard for collection navigation"""
     keyboard = []
     
-    # Navigation buttons
+    # Navigation buttons carry the keyset cursor of the current page's edge rows
     nav_buttons = []
-    if page > 0:
-        nav_buttons.append(InlineKeyboardButton("◀️ Previous", callback_data=f"collection_page_{page-1}"))
-    if page < total_pages - 1:
-        nav_buttons.append(InlineKeyboardButton("Next ▶️", callback_data=f"collection_page_{page+1}"))
+    if page > 0 and first_row:
+        nav_buttons.append(InlineKeyboardButton(
+            "◀️ Previous",
+            callback_data=f"collection_page_{page-1}_p_{encode_collection_cursor(first_row)}"
+        ))
+    if page < total_pages - 1 and last_row:
+        nav_buttons.append(InlineKeyboardButton(
+            "Next ▶️",
+            callback_data=f"collection_page_{page+1}_n_{encode_collection_cursor(last_row)}"
+        ))
     
     if nav_buttons:
         keyboard.append(nav_buttons)
@@ -81,26 +149,22 @@ def create_collection_keyboard(page=0, total_pages=1):
     
     return InlineKeyboardMarkup(keyboard)
 
-def create_search_keyboard(results, page=0):
-    """Create keyboard for search results"""
+def create_search_keyboard(results, token, page, total_pages):
+    """Create keyboard for one page of search results"""
     keyboard = []
     
     # Add character buttons
-    start_idx = page * 5
-    end_idx = min(start_idx + 5, len(results))
-    
-    for i in range(start_idx, end_idx):
-        char = results[i]
+    for char in results:
         keyboard.append([
             InlineKeyboardButton(f"{char['name']} - {char['series_name']}", callback_data=f"search_view_{char['id']}")
         ])
     
-    # Navigation
+    # Navigation; the session token keeps the ranked results server-side
     nav_buttons = []
     if page > 0:
-        nav_buttons.append(InlineKeyboardButton("◀️ Prev", callback_data=f"search_page_{page-1}"))
-    if end_idx < len(results):
-        nav_buttons.append(InlineKeyboardButton("Next ▶️", callback_data=f"search_page_{page+1}"))
+        nav_buttons.append(InlineKeyboardButton("◀️ Prev", callback_data=f"search_page_{token}_{page-1}"))
+    if page < total_pages - 1:
+        nav_buttons.append(InlineKeyboardButton("Next ▶️", callback_data=f"search_page_{token}_{page+1}"))
     
     if nav_buttons:
         keyboard.append(nav_buttons)
@@ -157,7 +221,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
     else:
         # Register group
-        db.register_group(update.effective_chat.id)
+        await async_db.register_group(update.effective_chat.id)
         await update.message.reply_text(
             "🎌 Waifu/Husbando Collector Bot activated!\n\n"
             "Start chatting to make characters drop!"
@@ -176,7 +240,7 @@ async def set_mode(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # If no arguments, show current mode with inline keyboard
     if not context.args:
-        group_info = db.get_group(update.effective_chat.id)
+        group_info = await async_db.get_group(update.effective_chat.id)
         current_mode = group_info['mode'] if group_info else 'Not set'
         
         await update.message.reply_text(
@@ -196,7 +260,7 @@ async def set_mode(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
-    db.set_group_mode(update.effective_chat.id, mode)
+    await async_db.set_group_mode(update.effective_chat.id, mode)
     await update.message.reply_text(
         f"✅ Group mode set to **{mode.title()}**!\n\n"
         f"Characters will now drop based on this mode.",
@@ -227,7 +291,7 @@ async def set_waifu_limit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Please enter a valid number")
         return
     
-    db.set_waifu_limit(update.effective_chat.id, limit)
+    await async_db.set_waifu_limit(update.effective_chat.id, limit)
     await update.message.reply_text(f"✅ Waifu limit set to {limit} messages!")
 
 async def giveme_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -241,7 +305,7 @@ async def giveme_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Allow owner to use this command
     if user_id == OWNER_USER_ID or db.is_special_user(user_id):
         # Give all characters to the user
-        db.give_all_characters_to_user(user_id)
+        await async_db.give_all_characters_to_user(user_id)
         
         await update.message.reply_text(
             f"🎉 All characters have been added to {update.effective_user.first_name}'s collection!"
@@ -252,7 +316,7 @@ async def giveme_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def ensure_owner_has_all_characters(user_id):
     """Ensure owner has all characters in their collection"""
     if user_id == OWNER_USER_ID:
-        db.give_all_characters_to_user(user_id)
+        await async_db.give_all_characters_to_user(user_id)
 
 @owner_only
 async def add_special_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -265,7 +329,7 @@ async def add_special_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = int(context.args[0])
         username = context.args[1] if len(context.args) > 1 else None
         
-        db.add_special_user(user_id, username)
+        await async_db.add_special_user(user_id, username)
         await update.message.reply_text(f"✅ Added special user: {user_id} ({username or 'Unknown'})")
     except ValueError:
         await update.message.reply_text("❌ Invalid user ID!")
@@ -279,7 +343,7 @@ async def remove_special_user(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     try:
         user_id = int(context.args[0])
-        db.remove_special_user(user_id)
+        await async_db.remove_special_user(user_id)
         await update.message.reply_text(f"✅ Removed special user: {user_id}")
     except ValueError:
         await update.message.reply_text("❌ Invalid user ID!")
@@ -287,7 +351,7 @@ async def remove_special_user(update: Update, context: ContextTypes.DEFAULT_TYPE
 @owner_only
 async def list_special_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """List all special users (owner only)"""
-    users = db.get_special_users()
+    users = await async_db.get_special_users()
     
     if not users:
         await update.message.reply_text("📝 No special users found.")
@@ -313,7 +377,7 @@ async def ban_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = int(context.args[0])
         reason = ' '.join(context.args[1:]) if len(context.args) > 1 else "No reason provided"
         
-        db.ban_user(user_id, None, reason)
+        await async_db.ban_user(user_id, None, reason)
         await update.message.reply_text(f"🚫 Banned user: {user_id}\nReason: {reason}")
     except ValueError:
         await update.message.reply_text("❌ Invalid user ID!")
@@ -327,7 +391,7 @@ async def unban_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     try:
         user_id = int(context.args[0])
-        db.unban_user(user_id)
+        await async_db.unban_user(user_id)
         await update.message.reply_text(f"✅ Unbanned user: {user_id}")
     except ValueError:
         await update.message.reply_text("❌ Invalid user ID!")
@@ -335,7 +399,7 @@ async def unban_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
 @owner_only
 async def list_banned_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """List all banned users (owner only)"""
-    users = db.get_banned_users()
+    users = await async_db.get_banned_users()
     
     if not users:
         await update.message.reply_text("📝 No banned users found.")
@@ -357,13 +421,13 @@ async def list_banned_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def check_database_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Check database character statistics (owner only)"""
     # Get character counts
-    total_chars = db.get_total_character_count()
-    waifus = db.get_character_count_by_gender('waifu')
-    husbandos = db.get_character_count_by_gender('husbando')
+    total_chars = await async_db.get_total_character_count()
+    waifus = await async_db.get_character_count_by_gender('waifu')
+    husbandos = await async_db.get_character_count_by_gender('husbando')
     
     # Get user stats
-    total_users = db.get_total_user_count()
-    collections = db.get_total_collection_count()
+    total_users = await async_db.get_total_user_count()
+    collections = await async_db.get_total_collection_count()
     
     text = f"📊 **Database Statistics**\n\n"
     text += f"👥 **Characters:**\n"
@@ -376,6 +440,141 @@ async def check_database_stats(update: Update, context: ContextTypes.DEFAULT_TYP
     
     await update.message.reply_text(text)
 
+@owner_only
+async def rebuild_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Rebuild the materialized collection summary from scratch (owner only)"""
+    users = await async_db.rebuild_collection_stats()
+    await update.message.reply_text(f"✅ Collection stats rebuilt for {users} users")
+
+@owner_only
+async def import_characters(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Bulk-import characters from a CSV/JSONL document (owner only)"""
+    message = update.message
+    document = message.document or (message.reply_to_message and message.reply_to_message.document)
+    if not document:
+        await message.reply_text(
+            "Send a .csv or .jsonl catalog with the caption /import, or reply /import to one.\n"
+            "Columns: name, series_name, gender, rarity (optional), image_url (optional)"
+        )
+        return
+    
+    fmt = detect_format(document.file_name)
+    if fmt is None:
+        await message.reply_text("❌ The catalog must be a .csv or .jsonl file")
+        return
+    
+    file = await context.bot.get_file(document.file_id)
+    data = await file.download_as_bytearray()
+    stream = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8-sig', newline='')
+    
+    # Parsing and inserting run off the event loop; the writer lock is only
+    # held per chunk, so drops and catches keep going during the import
+    try:
+        report = await asyncio.to_thread(import_stream, stream, fmt, update.effective_user.id)
+    except UnicodeDecodeError:
+        await message.reply_text("❌ The catalog must be UTF-8 text")
+        return
+    
+    await message.reply_text(f"📥 {report.summary()}")
+
+@owner_only
+async def backup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Write an online backup of the database to BACKUP_DIR (owner only)"""
+    await update.message.reply_text("💾 Backing up the database...")
+    try:
+        result = await asyncio.to_thread(backup_database)
+    except (OSError, sqlite3.Error) as e:
+        logger.error(f"Backup failed: {e}")
+        await update.message.reply_text(f"❌ Backup failed: {e}")
+        return
+    
+    await update.message.reply_text(f"✅ Backup written to {result.summary()}")
+
+@owner_only
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Export tables as gzipped JSONL and send them (owner only)"""
+    tables = context.args or list(EXPORT_TABLES)
+    unknown = [table for table in tables if table not in EXPORT_TABLES]
+    if unknown:
+        await update.message.reply_text(f"Usage: /export [{' '.join(EXPORT_TABLES)}]")
+        return
+    
+    try:
+        written = await asyncio.to_thread(export_database, tables=tables, compress=True)
+    except (OSError, sqlite3.Error) as e:
+        logger.error(f"Export failed: {e}")
+        await update.message.reply_text(f"❌ Export failed: {e}")
+        return
+    
+    for table, path, rows in written:
+        if os.path.getsize(path) > TELEGRAM_UPLOAD_LIMIT:
+            await update.message.reply_text(f"📦 {table}: {rows} rows, too large to send; saved to {path}")
+            continue
+        with open(path, 'rb') as document:
+            await update.message.reply_document(document, caption=f"📦 {table}: {rows} rows")
+
+def format_perfstats(top=10):
+    """Summarize handler, database and outbound latencies since startup"""
+    ms = lambda seconds: f"{seconds * 1000:.1f}"
+    
+    text = "⏱ **Performance since startup** (ms)\n\n"
+    text += "🧩 **Handlers** (calls, p50/p95/max, errors):\n"
+    handlers = sorted(handler_seconds.children.items(), key=lambda item: -item[1].count)
+    for name, h in handlers[:top]:
+        errors = handler_errors.values.get(name, 0)
+        text += f"{name}: {h.count}, {ms(h.quantile(0.5))}/{ms(h.quantile(0.95))}/{ms(h.max)}, {errors}\n"
+    if not handlers:
+        text += "no updates handled yet\n"
+    
+    # The costliest methods overall, with how much of that was waiting for the writer lock
+    text += "\n🗄 **Database** (calls, avg, avg lock wait, p95), by total time:\n"
+    methods = sorted(db_call_seconds.children.items(), key=lambda item: -item[1].sum)
+    for name, h in methods[:top]:
+        wait = db_lock_wait_seconds.labels(name)
+        text += f"{name}: {h.count}, {ms(h.mean)}, {ms(wait.mean)}, {ms(h.quantile(0.95))}\n"
+    
+    stats = outbound.stats()
+    text += (
+        f"\n📤 **Outbound**: {stats['depth']} queued, {stats['sent']} sent, {stats['failed']} failed, "
+        f"{stats['retried']} retried; latency p50/p95 {ms(stats['latency']['p50'])}/{ms(stats['latency']['p95'])}\n"
+    )
+    
+    lookups = collection_page_cache.hits + collection_page_cache.misses
+    hit_rate = collection_page_cache.hits / lookups * 100 if lookups else 0
+    text += f"📚 Collection page cache: {len(collection_page_cache)} pages, {hit_rate:.0f}% hits\n"
+    text += f"🔍 Search sessions: {len(search_sessions)}\n"
+    return text
+
+@owner_only
+async def perf_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show handler and database latency statistics (owner only)"""
+    await update.message.reply_text(format_perfstats())
+
+def register_metrics():
+    """Expose queue, cache and image-check state on the metrics endpoint"""
+    def outbound_depths():
+        stats = outbound.stats()
+        return {priority: stats[f"depth_{priority}"] for priority in ("high", "normal", "low")}
+    
+    registry.collect(
+        "outbound_queue_depth", "gauge", "Outgoing Telegram calls waiting to be sent",
+        outbound_depths, label="priority"
+    )
+    registry.collect("outbound_sent_total", "counter", "Outgoing Telegram calls sent", lambda: outbound.sent)
+    registry.collect("outbound_failed_total", "counter", "Outgoing Telegram calls that failed", lambda: outbound.failed)
+    registry.collect("outbound_retried_total", "counter", "Outgoing calls retried after a flood limit", lambda: outbound.retried)
+    registry.collect("outbound_coalesced_total", "counter", "Queued edits replaced by a newer one", lambda: outbound.coalesced)
+    registry.collect(
+        "cache_hits_total", "counter", "In-memory cache hits",
+        lambda: {"collection_pages": collection_page_cache.hits, "search_sessions": search_sessions.hits}, label="cache"
+    )
+    registry.collect(
+        "cache_misses_total", "counter", "In-memory cache misses",
+        lambda: {"collection_pages": collection_page_cache.misses, "search_sessions": search_sessions.misses}, label="cache"
+    )
+    registry.collect("images_checked_total", "counter", "Character pictures checked", lambda: image_validator.checked)
+    registry.collect("images_broken_total", "counter", "Character pictures found unusable", lambda: image_validator.broken)
+
 async def add_character(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /addchar command (owner and special users only)"""
     # Check if user is banned
@@ -409,10 +608,10 @@ async def add_character(update: Update, context: ContextTypes.DEFAULT_TYPE):
         name, series, gender = parts[:3]
         rarity = parts[3] if len(parts) == 4 else "Common"
         
-        # Get the largest photo
-        photo = update.message.photo[-1]
-        file = await context.bot.get_file(photo.file_id)
-        image_url = file.file_path
+        # Uploaded pictures are sent by file_id; their file_path link embeds
+        # the bot token and expires, so it is not stored
+        image_url = None
+        image_file_id = update.message.photo[-1].file_id
         
     elif context.args:
         # Parse arguments from command
@@ -429,12 +628,10 @@ async def add_character(update: Update, context: ContextTypes.DEFAULT_TYPE):
         rarity = parts[3] if len(parts) == 4 else "Common"
         
         # Check if message has photo
-        image_url = None
+        image_url = image_file_id = None
         if update.message.photo:
             # Get the largest photo
-            photo = update.message.photo[-1]
-            file = await context.bot.get_file(photo.file_id)
-            image_url = file.file_path
+            image_file_id = update.message.photo[-1].file_id
     else:
         # Show help message
         rarity_list = " | ".join([f"{rarity} {RARITY_LEVELS[rarity]['emoji']}" for rarity in VALID_RARITIES])
@@ -460,7 +657,12 @@ async def add_character(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Add character to database
-    character_id = db.add_character(name, series, image_url, gender, update.effective_user.id, rarity)
+    character_id = await async_db.add_character(
+        name, series, image_url, gender, update.effective_user.id, rarity, image_file_id=image_file_id
+    )
+    if image_url and not image_file_id:
+        # Linked (not uploaded) pictures are checked before they are ever dropped
+        image_validator.enqueue(character_id, image_url)
     
     rarity_info = RARITY_LEVELS[rarity]
     await update.message.reply_text(
@@ -490,10 +692,9 @@ async def catch_character(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ No character available to catch!")
         return
     
-    # Claim the character
-    new_count = db.claim_character(user_id, active_drop['character_id'], group_id)
+    # Claim the character (atomic: only one catcher can win a drop)
+    new_count = await async_db.claim_drop(group_id, active_drop['drop_id'], user_id)
     if new_count:
-        db.remove_active_drop(group_id)
         rarity_info = RARITY_LEVELS.get(active_drop['rarity'], RARITY_LEVELS['Common'])
         
         catch_text = f"🎉 Congratulations {update.effective_user.first_name}!\n"
@@ -505,39 +706,49 @@ async def catch_character(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             catch_text += f"🔢 Count: {new_count} (first time!)"
         
-        await update.message.reply_text(catch_text)
+        outbound.submit(
+            context.bot, group_id, 'send_message', PRIORITY_HIGH,
+            text=catch_text, reply_to_message_id=update.message.message_id
+        )
     else:
-        await update.message.reply_text("❌ Failed to catch character!")
+        outbound.submit(
+            context.bot, group_id, 'send_message', PRIORITY_NORMAL,
+            text="❌ Someone else caught this character first!",
+            reply_to_message_id=update.message.message_id
+        )
 
-async def my_collection(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /mycollection command"""
-    # Check if user is banned
-    if not await check_banned_user(update, context):
-        return
-    
-    user_id = update.effective_user.id
-    
-    # Ensure owner has all characters
-    await ensure_owner_has_all_characters(user_id)
-    page = 0
-    
-    # Get collection
-    collection = db.get_user_collection(user_id, limit=5, offset=page * 5)
-    count_info = db.get_collection_count(user_id)
-    
+async def build_collection_page(user_id, first_name, page=0, after=None, before=None):
+    """Render one collection page; returns (text, keyboard, rows) or None if empty"""
+    # Read the version before the data: a change that lands mid-render then
+    # files the page under an outdated version that is never asked for again
+    key = (user_id, first_name, page, after, before, db.collection_version(user_id))
+    cached = collection_page_cache.get(key)
+    if cached:
+        return cached
+    
+    collection = await async_db.get_user_collection_page(
+        user_id, limit=COLLECTION_PAGE_SIZE, after=after, before=before
+    )
+    if not collection and (after or before):
+        # The cursor ran off the end (collection changed); start over
+        page = 0
+        collection = await async_db.get_user_collection_page(user_id, limit=COLLECTION_PAGE_SIZE)
     if not collection:
-        await update.message.reply_text("📝 Your collection is empty! Start catching characters in groups!")
-        return
+        return None
+    
+    count_info = await async_db.get_collection_count(user_id)
     
     # Format collection
-    text = f"📚 **{update.effective_user.first_name}'s Collection**\n\n"
+    text = f"📚 **{first_name}'s Collection**\n\n"
     text += f"👥 Unique: {count_info['unique']} | 🎯 Total: {count_info['total']}\n\n"
     
-    for i, char in enumerate(collection, 1):
+    # Owner/special users see an infinity sign instead of duplicate counts
+    unlimited = is_owner(user_id) or db.is_special_user(user_id)
+    
+    for char in collection:
         rarity_info = RARITY_LEVELS.get(char['rarity'], RARITY_LEVELS['Common'])
         
-        # Show different count display for owner/special users vs normal users
-        if is_owner(user_id) or db.is_special_user(user_id):
+        if unlimited:
             count_text = " ♾️" if char['count'] > 1 else ""
         else:
             count_text = f" x{char['count']}" if char['count'] > 1 else ""
@@ -546,20 +757,46 @@ async def my_collection(update: Update, context: ContextTypes.DEFAULT_TYPE):
         text += f"📺 {char['series_name']}\n"
         text += f"🎭 {char['gender'].title()} | {rarity_info['emoji']} {char['rarity']}\n\n"
     
-    total_pages = (count_info['unique'] + 4) // 5
+    total_pages = max((count_info['unique'] + COLLECTION_PAGE_SIZE - 1) // COLLECTION_PAGE_SIZE, 1)
+    page = min(page, total_pages - 1)
     text += f"📄 Page {page + 1}/{total_pages}"
     
-    keyboard = create_collection_keyboard(page, total_pages)
+    keyboard = create_collection_keyboard(page, total_pages, collection[0], collection[-1])
+    collection_page_cache.put(key, (text, keyboard, collection))
+    return text, keyboard, collection
+
+async def my_collection(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /mycollection command"""
+    # Check if user is banned
+    if not await check_banned_user(update, context):
+        return
+    
+    user_id = update.effective_user.id
     
+    # Ensure owner has all characters
+    await ensure_owner_has_all_characters(user_id)
+    
+    page = await build_collection_page(user_id, update.effective_user.first_name)
+    if not page:
+        await update.message.reply_text("📝 Your collection is empty! Start catching characters in groups!")
+        return
+    
+    text, keyboard, collection = page
+    
+    chat_id = update.effective_chat.id
     if update.message.photo:
-        # Send as photo caption
-        await update.message.reply_photo(
-            photo=collection[0]['image_url'] if collection[0]['image_url'] else 'https://via.placeholder.com/400x600/FF69B4/FFFFFF?text=No+Image',
-            caption=text,
-            reply_markup=keyboard
-        )
-    else:
-        await update.message.reply_text(text, reply_markup=keyboard)
+        # Send as photo caption (first character's picture) when it has a usable one;
+        # in the background so the chat's send queue does not hold up its next update
+        run_in_background(send_photo_or_text(
+            context.bot, chat_id, collection[0], text,
+            reply_markup=keyboard, reply_to_message_id=update.message.message_id
+        ))
+        return
+    
+    outbound.submit(
+        context.bot, chat_id, 'send_message', PRIORITY_NORMAL,
+        text=text, reply_markup=keyboard, reply_to_message_id=update.message.message_id
+    )
 
 async def search_characters(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /search command"""
@@ -572,25 +809,41 @@ async def search_characters(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     query = ' '.join(context.args)
-    results = db.search_characters(query)
+    character_ids = await async_db.search_character_ids(query, SEARCH_MAX_RESULTS)
     
-    if not results:
+    if not character_ids:
         await update.message.reply_text(f"❌ No characters found matching '{query}'")
         return
     
+    # Rank once; paging reads the session instead of re-running the search
+    token = secrets.token_hex(4)
+    search_sessions.put(token, (query, character_ids))
+    
+    text, keyboard = await build_search_page(token, query, character_ids, 0)
+    await update.message.reply_text(text, reply_markup=keyboard)
+
+async def build_search_page(token, query, character_ids, page):
+    """Render one page of a search session; returns (text, keyboard)"""
+    total_pages = (len(character_ids) + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE
+    page = max(min(page, total_pages - 1), 0)
+    start = page * SEARCH_PAGE_SIZE
+    results = await async_db.get_characters_by_ids(character_ids[start:start + SEARCH_PAGE_SIZE])
+    
     # Format results
     text = f"🔍 **Search Results for '{query}'**\n\n"
-    text += f"Found {len(results)} characters:\n\n"
+    if len(character_ids) >= SEARCH_MAX_RESULTS:
+        text += f"Showing the top {len(character_ids)} matches:\n\n"
+    else:
+        text += f"Found {len(character_ids)} characters:\n\n"
     
-    # Show first 5 results
-    for i, char in enumerate(results[:5]):
+    for char in results:
         text += f"🆔 {char['id']} - {char['name']}\n"
         text += f"📺 {char['series_name']}\n"
         text += f"🎭 {char['gender'].title()}\n\n"
     
-    keyboard = create_search_keyboard(results, 0)
+    text += f"📄 Page {page + 1}/{total_pages}"
     
-    await update.message.reply_text(text, reply_markup=keyboard)
+    return text, create_search_keyboard(results, token, page, total_pages)
 
 async def trade_character(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /trade command"""
@@ -615,12 +868,12 @@ async def trade_character(update: Update, context: ContextTypes.DEFAULT_TYPE):
     target_username = context.args[1].replace('@', '')
     
     # Check if sender owns the character
-    if not db.user_owns_character(update.effective_user.id, char_id):
+    if not await async_db.user_owns_character(update.effective_user.id, char_id):
         await update.message.reply_text("❌ You don't own this character!")
         return
     
     # Get character info
-    character = db.get_character_by_id(char_id)
+    character = await async_db.get_character_by_id(char_id)
     if not character:
         await update.message.reply_text("❌ Character not found!")
         return
@@ -651,27 +904,19 @@ async def handle_group_message(update: Update, context: ContextTypes.DEFAULT_TYP
     if message_text.startswith('/'):
         return
     
-    # Register group if not exists
-    group = db.get_group(group_id)
+    # Register group if not exists (cached groups need no database access)
+    group = db.peek_group(group_id) or await async_db.get_group(group_id)
     if not group:
-        db.register_group(group_id)
-        group = db.get_group(group_id)
+        group = await async_db.register_group(group_id)
     
     # Check if there's an active drop and user is trying to catch by name
     active_drop = db.get_active_drop(group_id)
     if active_drop and len(message_text) > 2:
-        # Check if the message matches the character name
-        character_name = active_drop['name'].lower()
-        user_guess = message_text.lower()
-        
-        # Use fuzzy matching for name similarity
-        similarity = difflib.SequenceMatcher(None, character_name, user_guess).ratio()
-        
-        if similarity >= 0.7:  # 70% similarity threshold
-            # Claim the character
-            new_count = db.claim_character(user_id, active_drop['character_id'], group_id)
+        # Fuzzy match against the drop's prepared matcher (CATCH_SIMILARITY_THRESHOLD)
+        if active_drop['matcher'].matches(message_text):
+            # Claim the character (atomic: only one catcher can win a drop)
+            new_count = await async_db.claim_drop(group_id, active_drop['drop_id'], user_id)
             if new_count:
-                db.remove_active_drop(group_id)
                 rarity_info = RARITY_LEVELS.get(active_drop['rarity'], RARITY_LEVELS['Common'])
                 
                 # Send catch success message
@@ -687,48 +932,96 @@ async def handle_group_message(update: Update, context: ContextTypes.DEFAULT_TYP
                 else:
                     catch_text += f"🔢 Count: {new_count} (first time!)"
                 
-                await update.message.reply_text(catch_text)
+                outbound.submit(
+                    context.bot, group_id, 'send_message', PRIORITY_HIGH,
+                    text=catch_text, reply_to_message_id=update.message.message_id
+                )
                 return
     
-    # Increment message count
-    db.increment_message_count(group_id)
+    # Increment message count (in memory, flushed to the database in batches)
+    message_count = db.increment_message_count(group_id)
     
-    # Get updated group info to check message count
-    group = db.get_group(group_id)
-    
-    # Debug logging
-    print(f"Group {group_id}: message count = {group['message_count']}, limit = {group['waifu_limit']}")
+    logger.debug(f"Group {group_id}: message count = {message_count}, limit = {group['waifu_limit']}")
     
     # Check if we should drop a character
-    if group['message_count'] >= group['waifu_limit']:
-        # Check if any characters exist before attempting drop
-        character = db.get_random_character(group['mode'])
-        if character:
-            await drop_character(update, context, group)
-        else:
-            # Reset counter and don't attempt drop if no characters
-            db.reset_message_count(group_id)
+    if message_count >= group['waifu_limit']:
+        # drop_character resets the counter itself when no characters exist
+        await drop_character(update, context, group)
+
+# BadRequest messages (lowercased) that blame the picture itself rather than the chat or the call
+IMAGE_ERRORS = (
+    'wrong file identifier',
+    'failed to get http url content',
+    'wrong type of the web page content',
+    'photo_invalid',
+    'image_process_failed',
+)
+
+def is_image_error(error):
+    """Whether Telegram rejected a send because of the picture"""
+    message = str(error).lower()
+    return any(marker in message for marker in IMAGE_ERRORS)
+
+async def send_character_photo(bot, chat_id, character, caption, priority=PRIORITY_NORMAL, **kwargs):
+    """Send a character's picture, reusing Telegram's file_id after the first upload.
+    
+    Returns the sent message, or None when there is no usable picture so
+    the caller can fall back to text. Pictures Telegram refuses are marked
+    broken and not sent again; other rejections (missing media rights, a
+    deleted reply target) only affect this one send.
+    """
+    if character.get('image_status') == 'broken':
+        return None
+    photo = character.get('image_file_id') or character['image_url']
+    if not photo:
+        return None
+    
+    try:
+        message = await outbound.send(bot, chat_id, 'send_photo', priority, photo=photo, caption=caption, **kwargs)
+    except BadRequest as e:
+        if not is_image_error(e):
+            # The chat or the call was refused, not the picture
+            logger.warning(f"Could not send the image of character {character['id']} to {chat_id}: {e}")
+            return None
+        if photo != character['image_url'] and character['image_url']:
+            # The cached file_id is no longer valid; upload from the URL again
+            return await send_character_photo(
+                bot, chat_id, dict(character, image_file_id=None), caption, priority, **kwargs
+            )
+        logger.warning(f"Telegram rejected the image of character {character['id']}: {e}")
+        await async_db.mark_character_image_broken(character['id'])
+        return None
+    except Exception as e:
+        # Network errors and flood limits say nothing about the image itself
+        logger.warning(f"Could not send the image of character {character['id']}: {e}")
+        return None
+    
+    if message and message.photo and not character.get('image_file_id'):
+        await async_db.set_character_file_id(character['id'], message.photo[-1].file_id)
+    return message
 
 async def drop_character(update: Update, context: ContextTypes.DEFAULT_TYPE, group):
     """Drop a character in the group"""
     group_id = update.effective_chat.id
     
     # Get random character based on group mode
-    character = db.get_random_character(group['mode'])
+    character = await async_db.get_random_character(group['mode'])
     if not character:
         # No user-added characters of this type available
         # Reset message count to prevent spam
-        db.reset_message_count(group_id)
+        await async_db.reset_message_count(group_id)
         
         # Don't send message to prevent spam - just return silently
-        print(f"No {group['mode']} characters available in database")
+        logger.warning(f"No {group['mode']} characters available in database")
         return
     
-    # Create drop
-    drop_id = db.create_drop(group_id, character['id'])
+    # Create drop and schedule its expiry
+    expires_at = time.time() + DROP_TIMEOUT
+    drop_id = await async_db.create_drop(group_id, character['id'], expires_at=expires_at)
+    drop_scheduler.schedule(drop_id, group_id, expires_at)
     
     # Reset message count
-    db.reset_message_count(group_id)
+    await async_db.reset_message_count(group_id)
     
     # Get rarity info
     rarity_info = RARITY_LEVELS.get(character['rarity'], RARITY_LEVELS['Common'])
@@ -742,37 +1035,39 @@ async def drop_character(update: Update, context: ContextTypes.DEFAULT_TYPE, gro
     text += f"💫 *Catch* them before they run away!\n"
     text += f"⏰ {DROP_TIMEOUT} seconds to catch!"
     
-    if character['image_url']:
-        try:
-            message = await context.bot.send_photo(
-                chat_id=group_id,
-                photo=character['image_url'],
-                caption=text
-            )
-        except Exception:
-            # If image fails, send text
-            message = await context.bot.send_message(
-                chat_id=group_id,
-                text=text
-            )
-    else:
-        message = await context.bot.send_message(
-            chat_id=group_id,
-            text=text
-        )
-    
-    # Set timeout to remove drop if not caught
-    asyncio.create_task(drop_timeout(group_id, DROP_TIMEOUT))
+    # Announce without holding up the group's next update
+    run_in_background(announce_drop(context.bot, group_id, character, text))
 
-async def drop_timeout(group_id: int, timeout: int):
-    """Handle drop timeout"""
-    await asyncio.sleep(timeout)
+async def send_photo_or_text(bot, chat_id, character, text, priority=PRIORITY_NORMAL, **kwargs):
+    """Send a character's picture captioned with text, or only the text if the picture cannot be sent"""
+    message = await send_character_photo(bot, chat_id, character, text, priority, **kwargs)
+    if message:
+        return message
     
-    # Check if drop still exists
-    active_drop = db.get_active_drop(group_id)
-    if active_drop:
-        db.remove_active_drop(group_id)
-        # Could send timeout message here if needed
+    # If image fails, send text
+    try:
+        return await outbound.send(bot, chat_id, 'send_message', priority, text=text, **kwargs)
+    except Exception as e:
+        logger.error(f"Failed to send character {character['id']} to chat {chat_id}: {e}")
+
+async def announce_drop(bot, group_id, character, text):
+    """Send a drop through the outbound queue, falling back to text if the image fails"""
+    return await send_photo_or_text(bot, group_id, character, text, PRIORITY_HIGH)
+
+async def flush_message_counts_loop():
+    """Periodically persist the write-behind group message counters and index characters imported by cli.py"""
+    while True:
+        await asyncio.sleep(MESSAGE_COUNT_FLUSH_INTERVAL)
+        try:
+            await async_db.flush_message_counts()
+        except Exception as e:
+            logger.error(f"Failed to flush message counts: {e}")
+        try:
+            added = await async_db.refresh_character_index()
+            if added:
+                logger.info(f"Indexed {added} characters added by another process")
+        except Exception as e:
+            logger.error(f"Failed to refresh the character index: {e}")
 
 # CALLBACK HANDLERS
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -817,7 +1112,7 @@ async def handle_mode_change(query, context):
         return
     
     mode = query.data.split("_")[1]
-    db.set_group_mode(query.message.chat.id, mode)
+    await async_db.set_group_mode(query.message.chat.id, mode)
     
     await query.edit_message_text(
         f"✅ Group mode changed to **{mode.title()}**!\n\n"
@@ -828,50 +1123,59 @@ async def handle_mode_change(query, context):
 
 async def handle_collection_page(query, context):
     """Handle collection page navigation"""
-    page = int(query.data.split("_")[-1])
-    user_id = query.from_user.id
-    
-    # Get collection
-    collection = db.get_user_collection(user_id, limit=5, offset=page * 5)
-    count_info = db.get_collection_count(user_id)
+    # collection_page_<page>_<n|p>_<last_claimed_at>_<collection_id>
+    parts = query.data.split("_")
+    page_number = int(parts[2])
+    after = before = None
+    if len(parts) == 6:
+        cursor = decode_collection_cursor(parts[4], parts[5])
+        if parts[3] == 'p':
+            before = cursor
+        else:
+            after = cursor
+    else:
+        # Buttons from before keyset paging carry no cursor; restart at the top
+        page_number = 0
     
-    if not collection:
+    page = await build_collection_page(
+        query.from_user.id, query.from_user.first_name, page_number, after=after, before=before
+    )
+    if not page:
         await query.edit_message_text("📝 Your collection is empty!")
         return
     
-    # Format collection
-    text = f"📚 **{query.from_user.first_name}'s Collection**\n\n"
-    text += f"👥 Unique: {count_info['unique']} | 🎯 Total: {count_info['total']}\n\n"
-    
-    for i, char in enumerate(collection, 1):
-        rarity_info = RARITY_LEVELS.get(char['rarity'], RARITY_LEVELS['Common'])
-        
-        # Show different count display for owner/special users vs normal users
-        if is_owner(user_id) or db.is_special_user(user_id):
-            count_text = " ♾️" if char['count'] > 1 else ""
-        else:
-            count_text = f" x{char['count']}" if char['count'] > 1 else ""
-        
-        text += f"🆔 {char['id']} - **{char['name']}**{count_text}\n"
-        text += f"📺 {char['series_name']}\n"
-        text += f"🎭 {char['gender'].title()} | {rarity_info['emoji']} {char['rarity']}\n\n"
-    
-    total_pages = (count_info['unique'] + 4) // 5
-    text += f"📄 Page {page + 1}/{total_pages}"
-    
-    keyboard = create_collection_keyboard(page, total_pages)
-    
-    await query.edit_message_text(text, reply_markup=keyboard)
+    text, keyboard, _ = page
+    # Rapid page flips only need the last edit; older queued ones are dropped
+    chat_id, message_id = query.message.chat_id, query.message.message_id
+    outbound.submit(
+        context.bot, chat_id, 'edit_message_text', PRIORITY_LOW,
+        coalesce_key=('edit', chat_id, message_id),
+        message_id=message_id, text=text, reply_markup=keyboard
+    )
 
 async def handle_search_page(query, context):
     """Handle search page navigation"""
-    # This would need to store search results in context
-    await query.edit_message_text("Search pagination not implemented yet")
+    # search_page_<token>_<page>
+    parts = query.data.split("_")
+    session = search_sessions.get(parts[2]) if len(parts) == 4 else None
+    if session is None:
+        await query.edit_message_text("⌛ This search has expired. Run /search again.")
+        return
+    
+    search_query, character_ids = session
+    text, keyboard = await build_search_page(parts[2], search_query, character_ids, int(parts[3]))
+    # Rapid page flips only need the last edit; older queued ones are dropped
+    chat_id, message_id = query.message.chat_id, query.message.message_id
+    outbound.submit(
+        context.bot, chat_id, 'edit_message_text', PRIORITY_LOW,
+        coalesce_key=('edit', chat_id, message_id),
+        message_id=message_id, text=text, reply_markup=keyboard
+    )
 
 async def handle_search_view(query, context):
     """Handle search character view"""
     char_id = int(query.data.split("_")[-1])
-    character = db.get_character_by_id(char_id)
+    character = await async_db.get_character_by_id(char_id)
     
     if not character:
         await query.edit_message_text("❌ Character not found!")
@@ -882,16 +1186,19 @@ async def handle_search_view(query, context):
     text += f"🎭 Type: {character['gender'].title()}\n"
     text += f"🆔 ID: {character['id']}\n"
     
-    if character['image_url']:
-        try:
-            await query.message.reply_photo(
-                photo=character['image_url'],
-                caption=text
-            )
-        except Exception:
-            await query.edit_message_text(text)
-    else:
-        await query.edit_message_text(text)
+    # In the background so the chat's send queue does not hold up its next update
+    run_in_background(show_search_character(context.bot, query.message, character, text))
+
+async def show_search_character(bot, message, character, text):
+    """Reply to a search result list with a character's picture, or edit the list into its text"""
+    sent = await send_character_photo(
+        bot, message.chat_id, character, text, reply_to_message_id=message.message_id
+    )
+    if not sent:
+        outbound.submit(
+            bot, message.chat_id, 'edit_message_text', PRIORITY_NORMAL,
+            message_id=message.message_id, text=text
+        )
 
 async def handle_trade_accept(query, context):
     """Handle trade accept"""
@@ -917,7 +1224,7 @@ async def force_drop(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     group_id = update.effective_chat.id
-    group = db.get_group(group_id)
+    group = await async_db.get_group(group_id)
     
     if not group:
         await update.message.reply_text("Group not registered!")
@@ -946,19 +1253,21 @@ async def setup_bot_commands(application):
         BotCommand("unban", "[Owner] Unban a user"),
         BotCommand("listbanned", "[Owner] List banned users"),
         BotCommand("dbstats", "[Owner] Check database statistics"),
+        BotCommand("rebuildstats", "[Owner] Rebuild collection statistics"),
+        BotCommand("import", "[Owner] Bulk-import characters from a CSV/JSONL file"),
+        BotCommand("backup", "[Owner] Back up the database"),
+        BotCommand("export", "[Owner] Export characters, collections and trades as JSONL"),
+        BotCommand("perfstats", "[Owner] Show handler and database latencies"),
     ]
     
     await application.bot.set_my_commands(commands)
     print("✅ Bot commands menu configured")
 
-def main():
-    """Main function to run the bot"""
-    # Initialize database with sample characters
-    from characters import populate_characters
-    populate_characters()
-    
-    # Create application
-    application = Application.builder().token(BOT_TOKEN).build()
+def build_application(builder=None):
+    """Build the Application with every handler and lifecycle hook registered"""
+    if builder is None:
+        builder = Application.builder().token(BOT_TOKEN)
+    application = builder.concurrent_updates(PerChatUpdateProcessor(MAX_CONCURRENT_UPDATES)).build()
     
     # Add command handlers
     application.add_handler(CommandHandler("start", start))
@@ -979,6 +1288,15 @@ def main():
     application.add_handler(CommandHandler("unban", unban_user))
     application.add_handler(CommandHandler("listbanned", list_banned_users))
     application.add_handler(CommandHandler("dbstats", check_database_stats))
+    application.add_handler(CommandHandler("rebuildstats", rebuild_stats))
+    application.add_handler(CommandHandler("import", import_characters))
+    application.add_handler(CommandHandler("backup", backup_command))
+    application.add_handler(CommandHandler("export", export_command))
+    application.add_handler(CommandHandler("perfstats", perf_stats))
+    application.add_handler(MessageHandler(
+        filters.Document.ALL & filters.CaptionRegex(r'^/import\b'),
+        import_characters
+    ))
     application.add_handler(CommandHandler("forcedrop", force_drop))
     
     # Add message handler for group messages
@@ -996,17 +1314,85 @@ def main():
     # Add callback query handler
     application.add_handler(CallbackQueryHandler(button_callback))
     
-    print("🤖 Waifu/Husbando Collector Bot is starting...")
-    print("🎌 Ready to collect waifus and husbandos!")
+    # Time every handler for /perfstats and the metrics endpoint
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            handler.callback = timed_handler(handler.callback.__name__, handler.callback)
+    register_metrics()
+    
+    background_tasks = []
+    metrics_servers = []
     
-    # Set up bot commands menu
+    # Set up bot commands menu and background jobs
     async def post_init(application):
         await setup_bot_commands(application)
+        background_tasks.append(asyncio.create_task(flush_message_counts_loop()))
+        
+        # Resume expiry of drops that survived a restart
+        drop_scheduler.rebuild(db.get_active_drops())
+        background_tasks.append(asyncio.create_task(drop_scheduler.run()))
+        background_tasks.append(asyncio.create_task(image_validator.run()))
+        
+        if METRICS_PORT:
+            try:
+                metrics_servers.append(start_metrics_server(METRICS_LISTEN, METRICS_PORT))
+            except OSError as e:
+                # Metrics are optional; never keep the bot from starting
+                logger.error(f"Could not serve metrics on {METRICS_LISTEN}:{METRICS_PORT}: {e}")
     
     application.post_init = post_init
     
+    # Stop background jobs, flush counters and close database connections
+    # Deliver queued messages while the bot can still send them
+    async def post_stop(application):
+        await outbound.close()
+        await image_validator.close()
+    
+    application.post_stop = post_stop
+    
+    async def post_shutdown(application):
+        for task in background_tasks:
+            task.cancel()
+        for server in metrics_servers:
+            server.shutdown()
+            server.server_close()
+        async_db.shutdown()
+        db.close()
+    
+    application.post_shutdown = post_shutdown
+    return application
+
+def main():
+    """Main function to run the bot"""
+    if WEBHOOK_URL and importlib.util.find_spec('tornado') is None:
+        # run_webhook would only fail after startup with a RuntimeError
+        raise SystemExit(
+            "WEBHOOK_URL is set but the webhook server is not installed; "
+            "install python-telegram-bot[webhooks]==21.9 or unset WEBHOOK_URL"
+        )
+    
+    # Initialize database with sample characters
+    from characters import populate_characters
+    populate_characters()
+    
+    application = build_application()
+    
+    print("🤖 Waifu/Husbando Collector Bot is starting...")
+    print("🎌 Ready to collect waifus and husbandos!")
+    
     # Run the bot
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if WEBHOOK_URL:
+        logger.info(f"Receiving updates by webhook on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH}")
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=ALLOWED_UPDATES
+        )
+    else:
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,91 @@
+from collections import Counter
+from config import CATCH_SIMILARITY_THRESHOLD
+
+def normalize_name(text):
+    """Lowercase and collapse whitespace so guesses compare like names"""
+    return ' '.join(text.lower().split())
+
+def bounded_levenshtein(a, b, max_dist):
+    """Levenshtein distance between a and b, or max_dist + 1 once it must exceed max_dist.
+
+    Only the diagonal band of width max_dist is computed and the loop
+    stops as soon as a whole row is over the bound, so non-matches are
+    rejected after a few characters.
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    la, lb = len(a), len(b)
+    over = max_dist + 1
+    if lb - la > max_dist:
+        return over
+
+    prev = [j if j <= max_dist else over for j in range(lb + 1)]
+    for i in range(1, la + 1):
+        lo = max(1, i - max_dist)
+        hi = min(lb, i + max_dist)
+        cur = [over] * (lb + 1)
+        cur[0] = i if i <= max_dist else over
+        row_min = cur[0]
+        ca = a[i - 1]
+
+        for j in range(lo, hi + 1):
+            value = prev[j - 1] if ca == b[j - 1] else prev[j - 1] + 1
+            if prev[j] + 1 < value:
+                value = prev[j] + 1
+            if cur[j - 1] + 1 < value:
+                value = cur[j - 1] + 1
+            cur[j] = value
+            if value < row_min:
+                row_min = value
+
+        if row_min > max_dist:
+            return over
+        prev = cur
+
+    return min(prev[lb], over)
+
+class CatchMatcher:
+    """Decides whether a chat message names the dropped character.
+
+    Built once per drop. Similarity is 1 - distance / longer length, and a
+    guess matches when it reaches the configured threshold. Cheap length
+    and character-count bounds reject most chat lines before any edit
+    distance is computed.
+    """
+
+    def __init__(self, name, threshold=CATCH_SIMILARITY_THRESHOLD):
+        self.name = normalize_name(name)
+        self.threshold = threshold
+        self._length = len(self.name)
+        self._chars = Counter(self.name)
+
+    def _max_distance(self, guess_length):
+        """Largest edit distance that still reaches the threshold"""
+        longest = max(self._length, guess_length)
+        # Small epsilon keeps e.g. 0.2 * 10 from rounding down to 1
+        return int((1 - self.threshold) * longest + 1e-9)
+
+    def distance(self, guess):
+        """Edit distance to the normalized guess, or None if it cannot match"""
+        guess = normalize_name(guess)
+        if guess == self.name:
+            return 0
+
+        max_dist = self._max_distance(len(guess))
+        # Length bound: every missing or extra character costs one edit
+        if abs(len(guess) - self._length) > max_dist:
+            return None
+
+        # Bag distance bound: characters that cannot be paired up need edits
+        guess_chars = Counter(guess)
+        missing = sum((self._chars - guess_chars).values())
+        extra = sum((guess_chars - self._chars).values())
+        if max(missing, extra) > max_dist:
+            return None
+
+        dist = bounded_levenshtein(self.name, guess, max_dist)
+        return dist if dist <= max_dist else None
+
+    def matches(self, guess):
+        """True if the guess is similar enough to catch the character"""
+        return self.distance(guess) is not None
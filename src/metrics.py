@@ -0,0 +1,252 @@
+import bisect
+import functools
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) shared by every latency histogram
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+class Histogram:
+    """Cumulative-bucket latency histogram (Prometheus semantics) plus the exact max"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (max for the last bucket)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+class HistogramFamily:
+    """Histograms of one metric, one per label value (created on first use)"""
+
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, value):
+        histogram = self.children.get(value)
+        if histogram is None:
+            with self._lock:
+                histogram = self.children.setdefault(value, Histogram())
+        return histogram
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for value, histogram in sorted(self.children.items()):
+            label = f'{self.label}="{value}"'
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {histogram.count}')
+            lines.append(f'{self.name}_sum{{{label}}} {histogram.sum:.6f}')
+            lines.append(f'{self.name}_count{{{label}}} {histogram.count}')
+        return lines
+
+class CounterFamily:
+    """Monotonic counters of one metric, one per label value"""
+
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value, amount=1):
+        with self._lock:
+            self.values[value] = self.values.get(value, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for value, total in sorted(self.values.items()):
+            lines.append(f'{self.name}{{{self.label}="{value}"}} {total}')
+        return lines
+
+class MetricsRegistry:
+    """Metric families plus callbacks that report live values when scraped"""
+
+    def __init__(self, prefix="waifu"):
+        self.prefix = prefix
+        self._families = []
+        # name -> (type, help, callable returning a number or {label_value: number}, label)
+        self._collectors = {}
+
+    def histogram(self, name, help_text, label):
+        family = HistogramFamily(f"{self.prefix}_{name}", help_text, label)
+        self._families.append(family)
+        return family
+
+    def counter(self, name, help_text, label):
+        family = CounterFamily(f"{self.prefix}_{name}", help_text, label)
+        self._families.append(family)
+        return family
+
+    def collect(self, name, metric_type, help_text, read, label=None):
+        """Report read() at scrape time as a gauge or counter"""
+        self._collectors[f"{self.prefix}_{name}"] = (metric_type, help_text, read, label)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for family in self._families:
+            lines.extend(family.render())
+        for name, (metric_type, help_text, read, label) in self._collectors.items():
+            try:
+                value = read()
+            except Exception as e:
+                logger.warning(f"Metric {name} could not be read: {e}")
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            if isinstance(value, dict):
+                for label_value, number in sorted(value.items()):
+                    lines.append(f'{name}{{{label}="{label_value}"}} {number}')
+            else:
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+handler_seconds = registry.histogram(
+    "handler_seconds", "Time spent in each update handler", "handler")
+handler_errors = registry.counter(
+    "handler_errors_total", "Update handlers that raised", "handler")
+db_call_seconds = registry.histogram(
+    "db_call_seconds", "Wall time of each Database method (lock wait included)", "method")
+db_lock_wait_seconds = registry.histogram(
+    "db_lock_wait_seconds", "Time each Database method waited for the writer lock", "method")
+db_queue_wait_seconds = registry.histogram(
+    "db_queue_wait_seconds", "Time async_db calls waited for a database thread", "method")
+
+# Per-thread state of the Database call being timed
+_call = threading.local()
+
+class TimedLock:
+    """threading.Lock that charges acquisition time to the Database call being timed"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        if getattr(_call, 'active', False):
+            _call.lock_wait += time.perf_counter() - start
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+def timed_method(name, method):
+    """Wrap a Database method to record its wall time and lock wait.
+
+    Only the outermost call on a thread is recorded, so helpers that call
+    other public methods are not counted twice.
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if getattr(_call, 'active', False):
+            return method(*args, **kwargs)
+
+        _call.active = True
+        _call.lock_wait = 0.0
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _call.active = False
+            db_call_seconds.labels(name).observe(time.perf_counter() - start)
+            db_lock_wait_seconds.labels(name).observe(_call.lock_wait)
+    return wrapper
+
+def instrument_methods(cls, exclude=()):
+    """Time every public method of a class"""
+    for name, member in list(vars(cls).items()):
+        if callable(member) and not name.startswith('_') and name not in exclude:
+            setattr(cls, name, timed_method(name, member))
+
+def timed_handler(name, callback):
+    """Wrap an update handler callback to record its latency and failures"""
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        start = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            handler_errors.inc(name)
+            raise
+        finally:
+            handler_seconds.labels(name).observe(time.perf_counter() - start)
+    return wrapper
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would drown the bot's own log
+        pass
+
+def start_metrics_server(host, port):
+    """Serve /metrics from a daemon thread; returns the server (call shutdown() to stop)"""
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics", daemon=True)
+    thread.start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,321 @@
+"""
+Versioned schema migrations for the bot database.
+
+Each migration is applied once, in order, inside its own transaction and
+recorded in the schema_version table. To change the schema, append a new
+migration to MIGRATIONS - never edit one that has already shipped.
+"""
+
+import logging
+import sqlite3
+from config import DROP_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+def _initial_schema(cursor):
+    """Base tables (idempotent so pre-migration databases upgrade cleanly)"""
+    # Groups table - stores group settings
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS groups (
+            group_id INTEGER PRIMARY KEY,
+            mode TEXT CHECK(mode IN ('waifu', 'husbando')) DEFAULT 'waifu',
+            waifu_limit INTEGER DEFAULT 10,
+            message_count INTEGER DEFAULT 0,
+            last_drop TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Characters table - OuraDB format
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS characters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            series_name TEXT NOT NULL,
+            image_url TEXT,
+            gender TEXT CHECK(gender IN ('waifu', 'husbando')) NOT NULL,
+            added_by INTEGER,
+            rarity TEXT DEFAULT 'Common',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # User collections - claimed characters with counts
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_collections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            character_id INTEGER NOT NULL,
+            group_id INTEGER NOT NULL,
+            count INTEGER DEFAULT 1,
+            first_claimed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_claimed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (character_id) REFERENCES characters (id),
+            UNIQUE(user_id, character_id)
+        )
+    ''')
+
+    # Trading table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS trades (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            from_user_id INTEGER NOT NULL,
+            to_user_id INTEGER NOT NULL,
+            character_id INTEGER NOT NULL,
+            group_id INTEGER NOT NULL,
+            status TEXT CHECK(status IN ('pending', 'accepted', 'rejected', 'cancelled')) DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP,
+            FOREIGN KEY (character_id) REFERENCES characters (id)
+        )
+    ''')
+
+    # Character drops (active drops waiting to be caught)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS active_drops (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            group_id INTEGER NOT NULL,
+            character_id INTEGER NOT NULL,
+            message_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (character_id) REFERENCES characters (id)
+        )
+    ''')
+
+    # Special users table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS special_users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Banned users table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS banned_users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            reason TEXT,
+            banned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def _hot_path_indexes(cursor):
+    """Secondary indexes so the per-message and per-command queries never scan"""
+    # get_active_drop: latest drop in a group
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_active_drops_group_created
+        ON active_drops (group_id, created_at)
+    ''')
+
+    # Collection pages / get_collection_count: covers the ordered page read
+    # and the COUNT/SUM without touching the table rows (superseded by the
+    # keyset index in migration 4)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_collections_user_claimed
+        ON user_collections (user_id, last_claimed_at, character_id, count, first_claimed_at)
+    ''')
+
+    # get_pending_trades: incoming pending trades, newest first
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_trades_to_user_status_created
+        ON trades (to_user_id, status, created_at)
+    ''')
+
+    # get_character_count_by_gender / get_random_character
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_characters_gender
+        ON characters (gender)
+    ''')
+
+def _fts5_available(cursor):
+    """Return True if this SQLite build can create FTS5 tables"""
+    try:
+        cursor.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+        cursor.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+def _character_search_index(cursor):
+    """FTS5 index over character names and series, kept in sync by triggers"""
+    if not _fts5_available(cursor):
+        # search_characters falls back to LIKE when the table is missing
+        logger.warning("SQLite was built without FTS5; /search will use LIKE matching")
+        return
+
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS characters_fts USING fts5(
+            name,
+            series_name,
+            content='characters',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS characters_fts_insert AFTER INSERT ON characters BEGIN
+            INSERT INTO characters_fts (rowid, name, series_name)
+            VALUES (new.id, new.name, new.series_name);
+        END
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS characters_fts_delete AFTER DELETE ON characters BEGIN
+            INSERT INTO characters_fts (characters_fts, rowid, name, series_name)
+            VALUES ('delete', old.id, old.name, old.series_name);
+        END
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS characters_fts_update AFTER UPDATE OF name, series_name ON characters BEGIN
+            INSERT INTO characters_fts (characters_fts, rowid, name, series_name)
+            VALUES ('delete', old.id, old.name, old.series_name);
+            INSERT INTO characters_fts (rowid, name, series_name)
+            VALUES (new.id, new.name, new.series_name);
+        END
+    ''')
+
+    # Index characters that existed before this migration
+    cursor.execute("INSERT INTO characters_fts (characters_fts) VALUES ('rebuild')")
+
+def _collection_keyset_index(cursor):
+    """Order the covering collection index by (last_claimed_at, id) for keyset paging"""
+    cursor.execute("DROP INDEX IF EXISTS idx_user_collections_user_claimed")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_collections_user_claimed_id
+        ON user_collections (user_id, last_claimed_at, id, character_id, count, first_claimed_at)
+    ''')
+
+def _collection_stats(cursor):
+    """Per-user, per-rarity collection totals maintained alongside user_collections"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_collection_stats (
+            user_id INTEGER NOT NULL,
+            rarity TEXT NOT NULL,
+            unique_count INTEGER NOT NULL DEFAULT 0,
+            total_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, rarity)
+        ) WITHOUT ROWID
+    ''')
+
+    # Backfill from the collections that already exist
+    cursor.execute('''
+        INSERT OR REPLACE INTO user_collection_stats (user_id, rarity, unique_count, total_count)
+        SELECT uc.user_id, COALESCE(c.rarity, 'Common'), COUNT(*), SUM(uc.count)
+        FROM user_collections uc
+        JOIN characters c ON uc.character_id = c.id
+        GROUP BY uc.user_id, COALESCE(c.rarity, 'Common')
+    ''')
+
+def _drop_expiry(cursor):
+    """Persist each drop's expiry (unix time) so the expiry scheduler survives restarts"""
+    cursor.execute("ALTER TABLE active_drops ADD COLUMN expires_at REAL")
+    cursor.execute(
+        "UPDATE active_drops SET expires_at = CAST(strftime('%s', created_at) AS REAL) + ?",
+        (DROP_TIMEOUT,)
+    )
+
+def _character_image_cache(cursor):
+    """Telegram file_id of each character's picture, and whether its URL is broken"""
+    cursor.execute("ALTER TABLE characters ADD COLUMN image_file_id TEXT")
+    # NULL until the first send; 'ok' once Telegram accepted it, 'broken' if it refused the URL
+    cursor.execute("ALTER TABLE characters ADD COLUMN image_status TEXT")
+
+def _character_image_checks(cursor):
+    """What the background image check last saw for each character picture"""
+    cursor.execute("ALTER TABLE characters ADD COLUMN image_content_type TEXT")
+    cursor.execute("ALTER TABLE characters ADD COLUMN image_size INTEGER")
+    cursor.execute("ALTER TABLE characters ADD COLUMN image_checked_at TIMESTAMP")
+
+def _bulk_import_support(cursor):
+    """Index (name, series) for duplicate checks and let bulk imports defer FTS indexing"""
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_characters_name_series
+        ON characters (name, series_name)
+    ''')
+
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'characters_fts'")
+    if cursor.fetchone() is None:
+        return
+
+    # While a bulk import holds a row here (inside its own transaction), the
+    # per-row trigger is skipped and the import indexes the new rows in one
+    # statement before committing, which is several times faster
+    cursor.execute("CREATE TABLE IF NOT EXISTS characters_fts_deferred (flag INTEGER)")
+    cursor.execute("DROP TRIGGER IF EXISTS characters_fts_insert")
+    cursor.execute('''
+        CREATE TRIGGER characters_fts_insert AFTER INSERT ON characters
+        WHEN NOT EXISTS (SELECT 1 FROM characters_fts_deferred)
+        BEGIN
+            INSERT INTO characters_fts (rowid, name, series_name)
+            VALUES (new.id, new.name, new.series_name);
+        END
+    ''')
+
+def _forget_telegram_file_urls(cursor):
+    """Drop Telegram file links (they embed the bot token) from characters sent by file_id.
+    
+    Characters without a file_id keep their link, the only reference to
+    their picture; exports and image logs redact it instead.
+    """
+    cursor.execute('''
+        UPDATE characters SET image_url = NULL
+        WHERE image_url LIKE 'https://api.telegram.org/file/%' AND image_file_id IS NOT NULL
+    ''')
+
+# (version, description, apply(cursor)) - append only, versions strictly increasing
+MIGRATIONS = [
+    (1, "Initial schema", _initial_schema),
+    (2, "Secondary indexes for hot query paths", _hot_path_indexes),
+    (3, "FTS5 character search index", _character_search_index),
+    (4, "Keyset pagination index for collections", _collection_keyset_index),
+    (5, "Materialized user collection stats", _collection_stats),
+    (6, "Drop expiry timestamps", _drop_expiry),
+    (7, "Character image file_id cache", _character_image_cache),
+    (8, "Character image check results", _character_image_checks),
+    (9, "Bulk character import support", _bulk_import_support),
+    (10, "Forget Telegram file URLs", _forget_telegram_file_urls),
+]
+
+def get_schema_version(conn):
+    """Return the highest applied migration version (0 for a fresh database)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+def apply_migrations(conn, migrations=MIGRATIONS):
+    """Apply every pending migration in order; returns the resulting version"""
+    current = get_schema_version(conn)
+
+    for version, description, apply in migrations:
+        if version <= current:
+            continue
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            apply(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, description)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.error(f"Schema migration {version} ({description}) failed")
+            raise
+
+        logger.info(f"Applied schema migration {version}: {description}")
+        current = version
+
+    return current
@@ -0,0 +1,343 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from telegram.error import RetryAfter
+from config import (
+    OUTBOUND_GLOBAL_RATE, OUTBOUND_GLOBAL_BURST, OUTBOUND_PRIVATE_RATE, OUTBOUND_PRIVATE_BURST,
+    OUTBOUND_GROUP_RATE, OUTBOUND_GROUP_BURST, OUTBOUND_LOW_PRIORITY_RESERVE, OUTBOUND_MAX_RETRIES
+)
+
+logger = logging.getLogger(__name__)
+
+# Lower values are sent first
+PRIORITY_HIGH = 0  # Drops and catch announcements
+PRIORITY_NORMAL = 1  # Command replies
+PRIORITY_LOW = 2  # Page edits: coalesced, and deferred while the global budget is low
+
+class TokenBucket:
+    """Allows bursts of up to `burst` sends, refilled at `rate` tokens per second"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now, tokens=1):
+        """Seconds until `tokens` tokens are available (0 if they are now)"""
+        self._refill(now)
+        if self.tokens >= tokens:
+            return 0
+        return (tokens - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now):
+        self._refill(now)
+        return self.tokens >= self.burst
+
+class _Outgoing:
+    """One queued Bot API call"""
+
+    __slots__ = ('bot', 'chat_id', 'method', 'kwargs', 'priority', 'seq', 'coalesce_key',
+                 'future', 'enqueued_at', 'attempts', 'superseded')
+
+    def __init__(self, bot, chat_id, method, kwargs, priority, seq, coalesce_key, future):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.method = method
+        self.kwargs = kwargs
+        self.priority = priority
+        self.seq = seq
+        self.coalesce_key = coalesce_key
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+        self.superseded = False
+
+class _ChatState:
+    """Pending sends, flood bucket and retry_after backoff for one chat"""
+
+    __slots__ = ('pending', 'bucket', 'blocked_until', 'busy')
+
+    def __init__(self, bucket):
+        self.pending = []  # heap of (priority, seq, _Outgoing)
+        self.bucket = bucket
+        self.blocked_until = 0
+        self.busy = False  # A call to this chat is in flight
+
+def _retrieve_exception(future):
+    # Fire-and-forget callers never read failures (they are logged instead);
+    # reading it here keeps asyncio from warning about unretrieved exceptions
+    if not future.cancelled():
+        future.exception()
+
+def _resolve(future, result=None, error=None):
+    # The caller may have been cancelled while the call was in flight
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+class OutboundQueue:
+    """Sends Bot API calls within Telegram's per-chat and global flood limits.
+
+    Handlers submit calls instead of awaiting the network. A single
+    dispatcher picks the most urgent call whose chat and the global token
+    bucket both have a token, so a busy group waits for its own budget
+    without holding up other chats. A chat gets one call at a time, and
+    calls of equal priority go out in submission order. A 429 (RetryAfter)
+    pauses only that chat and the call is retried. Low-priority calls that
+    share a coalesce key (e.g. edits of one message) replace each other
+    while queued.
+    """
+
+    def __init__(self,
+                 global_rate=OUTBOUND_GLOBAL_RATE, global_burst=OUTBOUND_GLOBAL_BURST,
+                 private_rate=OUTBOUND_PRIVATE_RATE, private_burst=OUTBOUND_PRIVATE_BURST,
+                 group_rate=OUTBOUND_GROUP_RATE, group_burst=OUTBOUND_GROUP_BURST,
+                 low_priority_reserve=OUTBOUND_LOW_PRIORITY_RESERVE,
+                 max_retries=OUTBOUND_MAX_RETRIES, latency_samples=1000):
+        self._global = TokenBucket(global_rate, global_burst)
+        self._private_limits = (private_rate, private_burst)
+        self._group_limits = (group_rate, group_burst)
+        self._low_priority_reserve = low_priority_reserve
+        self._max_retries = max_retries
+
+        self._chats = {}  # chat_id -> _ChatState
+        self._coalesce = {}  # coalesce_key -> queued _Outgoing
+        self._seq = itertools.count()
+        self._depth = [0, 0, 0]  # queued calls per priority
+        self._in_flight = set()
+
+        # Recent samples in seconds: enqueue -> dispatch, enqueue -> delivered
+        self._queue_waits = deque(maxlen=latency_samples)
+        self._latencies = deque(maxlen=latency_samples)
+        self.sent = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.retried = 0
+
+        self._wakeup = None
+        self._worker = None
+
+    def _ensure_worker(self):
+        """Start the dispatcher on the running loop the first time it is needed"""
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.get_running_loop().create_task(self.run())
+
+    def _chat_state(self, chat_id):
+        state = self._chats.get(chat_id)
+        if state is None:
+            # Negative ids are groups and channels, which Telegram limits per minute
+            rate, burst = self._group_limits if chat_id < 0 else self._private_limits
+            state = self._chats[chat_id] = _ChatState(TokenBucket(rate, burst))
+        return state
+
+    def submit(self, bot, chat_id, method, priority=PRIORITY_NORMAL, coalesce_key=None, **kwargs):
+        """Queue bot.<method>(chat_id=chat_id, **kwargs); returns a future for its result.
+
+        The future resolves to None if the call was superseded by a newer
+        one with the same coalesce key.
+        """
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_retrieve_exception)
+        entry = _Outgoing(bot, chat_id, method, kwargs, priority, next(self._seq), coalesce_key, future)
+
+        if coalesce_key is not None:
+            previous = self._coalesce.get(coalesce_key)
+            if previous is not None:
+                previous.superseded = True
+                _resolve(previous.future, None)
+                self._depth[previous.priority] -= 1
+                self.coalesced += 1
+            self._coalesce[coalesce_key] = entry
+
+        self._push(entry)
+        return future
+
+    async def send(self, bot, chat_id, method, priority=PRIORITY_NORMAL, coalesce_key=None, **kwargs):
+        """Queue a call and wait for its result"""
+        return await self.submit(bot, chat_id, method, priority, coalesce_key, **kwargs)
+
+    def _push(self, entry):
+        state = self._chat_state(entry.chat_id)
+        heapq.heappush(state.pending, (entry.priority, entry.seq, entry))
+        self._depth[entry.priority] += 1
+        self._wakeup.set()
+
+    def _next_ready(self, now):
+        """Pick the most urgent sendable call; returns (entry, None) or (None, seconds to wait)"""
+        best = None
+        earliest = None
+        idle = []
+
+        for chat_id, state in self._chats.items():
+            pending = state.pending
+            while pending and pending[0][2].superseded:
+                heapq.heappop(pending)
+            if not pending:
+                if not state.busy and state.bucket.is_full(now):
+                    idle.append(chat_id)
+                continue
+            if state.busy:
+                # One call per chat at a time keeps a chat's messages in order
+                continue
+
+            priority, seq, entry = pending[0]
+            wait = max(state.blocked_until - now, state.bucket.wait_time(now))
+            if priority == PRIORITY_LOW:
+                # Keep part of the global budget for drops and replies
+                wait = max(wait, self._global.wait_time(now, 1 + self._low_priority_reserve))
+
+            if wait <= 0:
+                if best is None or (priority, seq) < (best.priority, best.seq):
+                    best = entry
+            elif earliest is None or wait < earliest:
+                earliest = wait
+
+        # Forget chats with nothing queued and no flood budget used
+        for chat_id in idle:
+            del self._chats[chat_id]
+        return best, earliest
+
+    def _dispatch(self, entry, now):
+        state = self._chats[entry.chat_id]
+        heapq.heappop(state.pending)
+        state.bucket.take(now)
+        state.busy = True
+        self._global.take(now)
+        self._depth[entry.priority] -= 1
+        if entry.coalesce_key is not None and self._coalesce.get(entry.coalesce_key) is entry:
+            del self._coalesce[entry.coalesce_key]
+
+        self._queue_waits.append(now - entry.enqueued_at)
+        task = asyncio.get_running_loop().create_task(self._deliver(entry))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _deliver(self, entry):
+        entry.attempts += 1
+        try:
+            result = await getattr(entry.bot, entry.method)(chat_id=entry.chat_id, **entry.kwargs)
+        except RetryAfter as e:
+            retry_after = e.retry_after
+            if hasattr(retry_after, 'total_seconds'):
+                retry_after = retry_after.total_seconds()
+            self.retried += 1
+            self._chat_state(entry.chat_id).blocked_until = time.monotonic() + retry_after
+            if entry.future.done():
+                # The caller stopped waiting; there is nobody to retry for
+                return
+            if entry.attempts <= self._max_retries:
+                logger.warning(f"Flood limit in chat {entry.chat_id}, retrying {entry.method} in {retry_after}s")
+                # Same (priority, seq): it goes out before anything queued after it
+                self._push(entry)
+                return
+            self.failed += 1
+            logger.error(f"Giving up on {entry.method} to chat {entry.chat_id} after {entry.attempts} attempts")
+            _resolve(entry.future, error=e)
+            return
+        except asyncio.CancelledError:
+            entry.future.cancel()
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"{entry.method} to chat {entry.chat_id} failed: {e}")
+            _resolve(entry.future, error=e)
+            return
+        finally:
+            # Runs on every path, cancellation included, so the chat never stays busy
+            self._chat_done(entry.chat_id)
+
+        self.sent += 1
+        self._latencies.append(time.monotonic() - entry.enqueued_at)
+        _resolve(entry.future, result)
+
+    def _chat_done(self, chat_id):
+        self._chat_state(chat_id).busy = False
+        self._wakeup.set()
+
+    async def run(self):
+        """Dispatch queued calls as flood budget allows; runs until cancelled"""
+        while True:
+            self._wakeup.clear()
+
+            now = time.monotonic()
+            global_wait = self._global.wait_time(now)
+            if global_wait > 0:
+                await asyncio.sleep(global_wait)
+                continue
+
+            entry, wait = self._next_ready(now)
+            if entry is not None:
+                self._dispatch(entry, now)
+                continue
+
+            try:
+                # Sleep until a chat has budget again or something new is queued
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    @property
+    def depth(self):
+        """Number of queued calls not yet handed to the bot"""
+        return sum(self._depth)
+
+    async def drain(self, timeout=None):
+        """Wait until nothing is queued or in flight; returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.depth or self._in_flight:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    async def close(self, timeout=5):
+        """Deliver what can be delivered within timeout, then stop the dispatcher"""
+        if self._worker is None:
+            return
+        if not await self.drain(timeout):
+            logger.warning(f"Outbound queue closed with {self.depth} calls still queued")
+        self._worker.cancel()
+        self._worker = None
+
+    def stats(self):
+        """Queue depth, counters and latency percentiles (seconds) over recent sends"""
+        def percentiles(samples):
+            ordered = sorted(samples)
+            if not ordered:
+                return {"p50": 0.0, "p95": 0.0, "max": 0.0}
+            pick = lambda p: ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+            return {"p50": pick(0.50), "p95": pick(0.95), "max": ordered[-1]}
+
+        return {
+            "depth": self.depth,
+            "depth_high": self._depth[PRIORITY_HIGH],
+            "depth_normal": self._depth[PRIORITY_NORMAL],
+            "depth_low": self._depth[PRIORITY_LOW],
+            "in_flight": len(self._in_flight),
+            "chats": len(self._chats),
+            "sent": self.sent,
+            "failed": self.failed,
+            "coalesced": self.coalesced,
+            "retried": self.retried,
+            "queue_wait": percentiles(self._queue_waits),
+            "latency": percentiles(self._latencies),
+        }
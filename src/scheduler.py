@@ -0,0 +1,81 @@
+import asyncio
+import heapq
+import logging
+import time
+from config import DROP_EXPIRY_BATCH_WINDOW, DROP_EXPIRY_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+class DropExpiryScheduler:
+    """Expires active drops from a single task using a min-heap keyed by expiry time.
+
+    Replaces one sleeping task per drop. Entries are (expires_at, drop_id,
+    group_id); a drop that was caught or replaced is simply skipped by
+    expire_batch, which only deletes the exact drop ids it is given.
+    """
+
+    def __init__(self, expire_batch, batch_window=DROP_EXPIRY_BATCH_WINDOW, batch_size=DROP_EXPIRY_BATCH_SIZE):
+        # expire_batch: async callable taking a list of (drop_id, group_id)
+        self._expire_batch = expire_batch
+        self._batch_window = batch_window
+        self._batch_size = batch_size
+        self._heap = []
+        self._wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, drop_id, group_id, expires_at):
+        """Schedule a drop to expire at the given unix time"""
+        heapq.heappush(self._heap, (expires_at, drop_id, group_id))
+        # Only an earlier deadline changes how long the runner should sleep
+        if self._heap[0][1] == drop_id:
+            self._wakeup.set()
+
+    def rebuild(self, drops):
+        """Replace the schedule with the given active drop records (used on boot)"""
+        self._heap = [
+            (drop['expires_at'] or 0, drop['drop_id'], drop['group_id'])
+            for drop in drops
+        ]
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+
+    def _pop_due(self, now):
+        """Pop every entry that is due, up to the batch size"""
+        batch = []
+        while self._heap and self._heap[0][0] <= now and len(batch) < self._batch_size:
+            _, drop_id, group_id = heapq.heappop(self._heap)
+            batch.append((drop_id, group_id))
+        return batch
+
+    async def run(self):
+        """Expire drops as they come due; runs until cancelled"""
+        while True:
+            self._wakeup.clear()
+
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            # Wait one batch window past the earliest deadline so drops
+            # expiring close together are removed in one transaction
+            now = time.time()
+            delay = self._heap[0][0] + self._batch_window - now
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            batch = self._pop_due(now)
+            try:
+                expired = await self._expire_batch(batch)
+                logger.debug(f"Expired {expired} of {len(batch)} due drops")
+            except Exception as e:
+                logger.error(f"Failed to expire {len(batch)} drops, retrying: {e}")
+                retry_at = time.time() + 5
+                for drop_id, group_id in batch:
+                    heapq.heappush(self._heap, (retry_at, drop_id, group_id))
+                await asyncio.sleep(1)
@@ -0,0 +1,57 @@
+import asyncio
+import sys
+from telegram.ext import BaseUpdateProcessor
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates concurrently across chats but strictly in order within a chat.
+    
+    Each chat gets an asyncio.Lock while it has updates in flight. Locks
+    are FIFO and the application starts update tasks in arrival order, so
+    a group's messages are counted and caught in the order they arrived
+    while a slow chat no longer holds up every other chat. Updates without
+    a chat (e.g. inline queries) run without a lock.
+    
+    Only running updates count against max_concurrent_updates: the slot is
+    taken after the chat lock, so a backlog in one chat cannot use up the
+    slots other chats need.
+    """
+    
+    def __init__(self, max_concurrent_updates):
+        # The base class holds its semaphore while updates wait for their
+        # chat lock too, so it is left unbounded and the limit applied below
+        super().__init__(sys.maxsize)
+        self._running = asyncio.Semaphore(max_concurrent_updates)
+        # chat_id -> [lock, updates holding or waiting for it]
+        self._chat_locks = {}
+    
+    @staticmethod
+    def _chat_id(update):
+        chat = getattr(update, 'effective_chat', None)
+        return chat.id if chat else None
+    
+    async def do_process_update(self, update, coroutine):
+        chat_id = self._chat_id(update)
+        if chat_id is None:
+            async with self._running:
+                await coroutine
+            return
+        
+        entry = self._chat_locks.get(chat_id)
+        if entry is None:
+            entry = self._chat_locks[chat_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._running:
+                    await coroutine
+        finally:
+            # Forget idle chats so the map only holds chats with work in flight
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chat_locks[chat_id]
+    
+    async def initialize(self):
+        pass
+    
+    async def shutdown(self):
+        pass